@@ -0,0 +1,82 @@
+"""
+Benchmark: cold-start cost of the web container (import of src.app) and of the first analysis.
+
+Runs `python -X importtime -c "import src.app"` in a fresh interpreter and reports
+the cumulative import time of the heavy dependencies, then times the lazy pieces
+(shared engine + Gemini SDK, templates) in a second fresh interpreter.
+
+Usage (from the project root):
+    python benchmarks/bench_imports.py [runs]    # default: 3 (best of)
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WATCH = (
+    "src.app", "flask", "linebot", "sqlalchemy", "numpy", "pandas",
+    "settrade_v2", "google.generativeai", "database", "line_templates",
+    "analyzer", "llm_service", "global_stock_helper", "thai_stock_helper",
+)
+
+LAZY_SCRIPT = r"""
+import time, sys
+sys.path.insert(0, 'src')
+t = time.perf_counter(); import src.app; t_app = time.perf_counter() - t
+import registry, line_templates
+t = time.perf_counter(); registry.get_engine(); t_engine = time.perf_counter() - t
+import llm_service
+t = time.perf_counter(); llm_service._load_genai(); registry.get_llm().ensure_model(); t_model = time.perf_counter() - t
+t = time.perf_counter(); n = line_templates.preload_templates(); t_tpl = time.perf_counter() - t
+print(f"{t_app:.4f} {t_engine:.4f} {t_model:.4f} {t_tpl:.4f} {n}")
+"""
+
+def _env():
+    # Keep the app from warming up in the background while it is being measured
+    return {**os.environ, "WARM_UP_ON_START": "false", "PYTHONDONTWRITEBYTECODE": "1"}
+
+def import_breakdown():
+    """ Cumulative import time (seconds) per watched module, -1 if it was not imported """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.app"],
+                          cwd=ROOT, env=_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"import src.app failed:\n{proc.stderr[-2000:]}")
+    seen = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name in WATCH and name not in seen:
+            seen[name] = int(cumulative) / 1e6
+    return {name: seen.get(name, -1.0) for name in WATCH}
+
+def lazy_timings():
+    proc = subprocess.run([sys.executable, "-c", LAZY_SCRIPT],
+                          cwd=ROOT, env=_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"lazy timing failed:\n{proc.stderr[-2000:]}")
+    app, engine, model, tpl, n = proc.stdout.split()[-5:]
+    return float(app), float(engine), float(model), float(tpl), int(n)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    best = None
+    for _ in range(runs):
+        run = import_breakdown()
+        best = run if best is None else {k: min(best[k], v) for k, v in run.items()}
+
+    print(f"Cold start: import src.app (best of {runs}, cumulative incl. children)")
+    for name in WATCH:
+        t = best[name]
+        print(f"  {name:<22} {'not imported' if t < 0 else f'{t * 1000:8.1f} ms'}")
+
+    app, engine, model, tpl, n = lazy_timings()
+    print("Deferred to first use:")
+    print(f"  {'import src.app':<22} {app * 1000:8.1f} ms (wall)")
+    print(f"  {'get_engine()':<22} {engine * 1000:8.1f} ms")
+    print(f"  {'ensure_model()':<22} {model * 1000:8.1f} ms (Gemini SDK import + configure if keyed)")
+    print(f"  {'preload_templates()':<22} {tpl * 1000:8.1f} ms ({n} templates)")
+
+if __name__ == "__main__":
+    main()
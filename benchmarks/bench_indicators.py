@@ -0,0 +1,58 @@
+"""
+Benchmark: vectorized indicator engine (indicators.py) vs the previous per-symbol pandas path.
+
+Dev only (pandas comes from requirements-dev.txt). Usage (from the project root):
+    python benchmarks/bench_indicators.py [n_symbols ...]    # default: 1000 10000
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import indicators
+
+BARS = 260
+
+def pandas_per_symbol(closes):
+    """ Previous implementation: one pd.Series per symbol, SMA 50/200 + rolling RSI 14 """
+    out = []
+    for row in closes:
+        series = pd.Series(row)
+        sma50 = series.rolling(window=50).mean().iloc[-1]
+        sma200 = series.rolling(window=200).mean().iloc[-1]
+        delta = series.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        rsi = (100 - (100 / (1 + gain / loss))).iloc[-1]
+        out.append((sma50, sma200, rsi))
+    return out
+
+def random_walks(n, bars=BARS, seed=42):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, bars)), axis=1))
+    highs = closes * (1 + rng.uniform(0, 0.02, (n, bars)))
+    lows = closes * (1 - rng.uniform(0, 0.02, (n, bars)))
+    return closes, highs, lows
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main(sizes):
+    for n in sizes:
+        closes, highs, lows = random_walks(n)
+        t_pd, ref = timed(pandas_per_symbol, closes)
+        t_np, latest = timed(indicators.compute, closes, highs, lows)
+
+        # Sanity check: SMA values must agree with pandas
+        ref_sma50 = np.array([r[0] for r in ref])
+        assert np.allclose(ref_sma50, latest['sma50']), "SMA50 mismatch"
+
+        print(f"{n:>6} symbols x {BARS} bars | pandas per-symbol (SMA50/200, RSI): {t_pd:7.3f}s | "
+              f"numpy batch (SMA, EMA, RSI, MACD, BB, ATR): {t_np:7.3f}s | {t_pd / t_np:5.1f}x")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000])
@@ -0,0 +1,77 @@
+from dataclasses import dataclass, field, fields
+import numpy as np
+
+# Typed analysis results. Values are stored raw (floats / None when unavailable);
+# all string formatting happens at render time (line_templates.py, llm_service.py).
+
+_EMPTY_HISTORY = np.empty(0, dtype=np.float64)
+_EMPTY_HISTORY.flags.writeable = False
+
+@dataclass(slots=True)
+class Technicals:
+    """ Latest technical values for one symbol (None = not enough data / not available) """
+    rsi: float | None = None
+    sma50: float | None = None
+    sma200: float | None = None
+    ema20: float | None = None
+    macd: float | None = None
+    macd_signal: float | None = None
+    macd_hist: float | None = None
+    bb_lower: float | None = None
+    bb_upper: float | None = None
+    atr: float | None = None
+    year_high: float | None = None
+    year_low: float | None = None
+    market_cap: float | None = None # Millions (Finnhub profile)
+
+    def update(self, values):
+        """ Set known fields from a mapping (e.g. indicators.summarize output); unknown keys are ignored """
+        for name, value in values.items():
+            if name in _TECHNICAL_FIELDS:
+                setattr(self, name, value)
+        return self
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+_TECHNICAL_FIELDS = frozenset(f.name for f in fields(Technicals))
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """ One analyzed symbol, ready to render """
+    symbol: str
+    signal: str = "WAIT"
+    reason: str = ""
+    news_summary: str = "-"
+    price: float = 0.0
+    pe_ratio: float = 0.0
+    div_yield: float = 0.0
+    technicals: Technicals = field(default_factory=Technicals)
+    history: np.ndarray = field(default_factory=lambda: _EMPTY_HISTORY) # float64 closes, oldest -> newest (often a read-only memmap view)
+    news: tuple = ()
+    partial: list = field(default_factory=list) # Parts cut off by the latency budget
+    ai_ok: bool = False # signal / reason / news_summary came from a real model answer
+
+    @property
+    def is_error(self):
+        return self.signal == "ERROR"
+
+    @classmethod
+    def error(cls, symbol, reason):
+        return cls(symbol=symbol, signal="ERROR", reason=reason)
+
+    @classmethod
+    def from_data(cls, symbol, data):
+        """ Build from a fetch_data dict (no AI fields yet) """
+        history = data.get('history')
+        return cls(
+            symbol=symbol,
+            price=data['price'],
+            pe_ratio=data['pe_ratio'] or 0.0,
+            div_yield=data['div_yield'] or 0.0,
+            technicals=data['technicals'],
+            history=np.asarray(history, dtype=np.float64) if history is not None and len(history) else _EMPTY_HISTORY,
+            news=tuple(data.get('news') or ()),
+            partial=list(data.get('partial') or ())
+        )
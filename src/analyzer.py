@@ -1,14 +1,88 @@
-import pandas as pd
-from llm_service import LLMService
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import Config
+from deadline import Deadline
+from rate_limiter import deadline_scope
+from llm_service import LLMService
+import indicators
+from analysis_result import AnalysisResult, Technicals
+import result_cache
+import change_detector
+import verdict_parser
+import signal_rules
+
+# Shared pool for the per-symbol provider fan-out in fetch_data (calls are rate limited per provider)
+_FANOUT_POOL = None
+_FANOUT_LOCK = threading.Lock()
+
+def _fanout_pool():
+    global _FANOUT_POOL
+    if _FANOUT_POOL is None:
+        with _FANOUT_LOCK:
+            if _FANOUT_POOL is None:
+                _FANOUT_POOL = ThreadPoolExecutor(max_workers=Config.FETCH_FANOUT_WORKERS, thread_name_prefix="fetch-fanout")
+    return _FANOUT_POOL
+
+def item_params(item):
+    """ Extract (symbol, strategy, goal, risk) from a Watchlist-like object or a plain string. """
+    # Handle both object (Watchlist) and string input
+    symbol = item.symbol if hasattr(item, 'symbol') else str(item)
+
+    # Strategy/Goal extraction (if available on item)
+    strategy = getattr(item, 'strategy', 'Value')
+    goal = getattr(item, 'goal', 'Medium')
+    risk = getattr(item, 'risk', 'Medium')
+    return symbol, strategy, goal, risk
+
+def parse_ai_output(ai_output):
+    """ Parse a model answer (JSON verdict or "SIGNAL | REASON | NEWS_SUMMARY") into (signal, reason, news_summary). """
+    verdict = verdict_parser.parse(ai_output)
+    return verdict.signal, verdict.reason, verdict.news_summary
+
+def _verdict_listener(symbol, on_verdict):
+    """ on_field adapter: fires on_verdict(symbol, signal, reason) once both fields have streamed in """
+    fields = {}
+    def on_field(key, value):
+        fields[key] = value
+        if key == verdict_parser.REASON_KEY:
+            verdict = verdict_parser.from_fields(fields, complete=False)
+            if verdict.ok:
+                on_verdict(symbol, verdict.signal, verdict.reason)
+    return on_field
 
 class AnalysisEngine:
     def __init__(self):
         self.llm = LLMService()
 
-    def fetch_data(self, symbol):
+    def prefetch_quotes(self, symbols, deadline=None):
+        """
+        Bulk-fetch Twelve Data quotes for the global (non .BK) symbols in one go.
+        Pass the result to fetch_data(quotes=...) to skip the per-symbol /quote call.
+        deadline: Optional Deadline / seconds. Rate-limit waits are bounded by it (leaving
+                  Config.DEADLINE_LLM_RESERVE); symbols of skipped chunks are left out of the
+                  result, and fetch_data asks for those per symbol.
+        """
+        from global_stock_helper import get_quotes
+        global_symbols = [s.upper().strip() for s in symbols if not s.upper().strip().endswith('.BK')]
+        if not global_symbols:
+            return {}
+        try:
+            with deadline_scope(Deadline.of(deadline), Config.DEADLINE_LLM_RESERVE):
+                return get_quotes(global_symbols)
+        except Exception as e:
+            print(f"[ANALYZER] Bulk Quote Error: {e}")
+            return {}
+
+    def fetch_data(self, symbol, quotes=None, compute_indicators=True, deadline=None):
         """
         Fetch stock data from Settrade (Thai) or TwelveData/Finnhub (Global).
+        quotes: Optional dict from prefetch_quotes (used instead of a per-symbol quote call;
+                a None entry means Twelve Data has no such symbol).
+        compute_indicators: False to skip RSI/SMA/etc. so a batch can run compute_indicators() once.
+        deadline: Optional Deadline / seconds. Optional parts (profile, news) are skipped when the
+                  budget is nearly spent, or cut off to leave Config.DEADLINE_LLM_RESERVE for the LLM;
+                  their names are listed in data['partial'].
         """
         try:
             from thai_stock_helper import get_thai_stock_data as get_thai_quote
@@ -19,217 +93,397 @@ class AnalysisEngine:
 
         symbol = symbol.upper().strip()
         is_thai = symbol.endswith('.BK')
-        
-        price = 0
-        pe = 0
-        yd = 0
-        market_cap = "N/A"
-        technicals = {"rsi": "N/A", "sma50": "N/A", "year_high": "-", "year_low": "-", "market_cap": "N/A"}
-        prices_list = []
-        news_items = []
+        deadline = Deadline.of(deadline)
 
         # Thai Stocks
         if is_thai:
             print(f"[ANALYZER] Thai Stock detected ({symbol}).")
             try:
-                thai_data = get_thai_quote(symbol)
-                if thai_data and thai_data.get('price', 0) > 0:
-                    price = thai_data['price']
-                    pe = thai_data.get('pe', 0)
-                    yd = thai_data.get('yield', 0)
-                    technicals['year_high'] = f"{thai_data.get('high', 0):.2f}"
-                    technicals['year_low'] = f"{thai_data.get('low', 0):.2f}"
-
-                    prices_list = thai_data.get('history', [])
-                    
-                    if prices_list and len(prices_list) >= 14:
-                        try:
-                            series = pd.Series(prices_list)
-                            
-                            # SMA 50
-                            if len(series) >= 50:
-                                sma50_val = series.rolling(window=50).mean().iloc[-1]
-                                technicals['sma50'] = f"{sma50_val:.2f}"
-                            
-                            # RSI 14
-                            delta = series.diff()
-                            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                            rs = gain / loss
-                            rsi_calc = 100 - (100 / (1 + rs))
-                            val_rsi = rsi_calc.iloc[-1]
-                            if not pd.isna(val_rsi):
-                                technicals['rsi'] = f"{val_rsi:.2f}"
-                        except Exception as e:
-                            print(f"[CALC ERROR] {e}")
-
-                else:
-                    return None
+                with deadline_scope(deadline):
+                    thai_data = get_thai_quote(symbol)
+                return self.assemble_thai(symbol, thai_data, compute_indicators)
             except Exception as e:
                 print(f"[ANALYZER] Settrade Error: {e}")
                 return None
 
-        # Global Stocks
-        else:
-            try:
-                quote = get_quote(symbol)
-                if quote and quote.get('c', 0) > 0:
-                    price = quote['c']
-                
-                # Profile (Fail silently for ETFs)
-                try:
-                    profile = get_company_profile(symbol) or {}
-                    pe = profile.get('pe', 0)
-                    cap = profile.get('marketCapitalization', 0)
-                    market_cap = f"{cap:,.2f} M" if cap else "N/A"
-                    yd = profile.get('dividendYield', 0) 
-                    technicals['market_cap'] = market_cap
-                except Exception as e: 
-                    print(f"[PROFILE ERROR] {symbol}: {e}")
-                
-                # Technicals (Fail silently if Rate Limited)
-                try:
-                    time.sleep(1) 
-                    tech_data = get_candles_and_indicators(symbol)
-                    if tech_data:
-                        prices_list = tech_data.get('history', [])
-                        technicals.update(tech_data.get('technicals', {}))
-                        if market_cap != "N/A": technicals['market_cap'] = market_cap
-                except Exception as e: 
-                    print(f"[TECH DATA ERROR] {symbol}: {e}")
-                
-                # News (Fail silently)
-                try:
-                    specific_news = get_market_news(symbol)
-                    s_items = [n['headline'] for n in specific_news[:3] if 'headline' in n] if specific_news else []
-                    macro_news = get_general_market_news()
-                    m_items = [f"[GLOBAL MACRO] {n.get('headline', '')}" for n in macro_news[:2]]
-                    news_items = s_items + m_items
-                except Exception as e: 
-                    print(f"[NEWS ERROR] {symbol}: {e}")
-
-                # Final Check: As long as we have a price, we continue
-                if price <= 0:
-                    print(f"[ANALYZER] No price for {symbol}, aborting.")
-                    return None
+        # Global Stocks: quote / profile / candles / news are independent -> run them concurrently
+        try:
+            def task(label, func, *args, reserve=0.0):
+                def run():
+                    try:
+                        # Rate-limit waits past the budget are skipped, not slept through
+                        with deadline_scope(deadline, reserve):
+                            return func(*args)
+                    except Exception as e:
+                        print(f"[{label} ERROR] {symbol}: {e}")
+                        return None
+                return _fanout_pool().submit(run)
 
-            except Exception as e:
-                print(f"[ANALYZER] Global Stock Critical Error: {e}")
+            if quotes is not None and symbol in quotes and quotes[symbol] is None:
+                print(f"[ANALYZER] {symbol}: not found on Twelve Data")
                 return None
 
+            required, optional = {}, {}
+            if quotes is None or symbol not in quotes: # Left out of the bulk answer (chunk failed): ask per symbol
+                required['quote'] = task("QUOTE", get_quote, symbol)
+            required['tech'] = task("TECH DATA", get_candles_and_indicators, symbol, compute_indicators) # Fail silently if Rate Limited
+
+            # Optional parts: skipped outright when the budget is nearly spent
+            partial = []
+            if deadline is None or deadline.remaining() > Config.DEADLINE_LLM_RESERVE:
+                reserve = Config.DEADLINE_LLM_RESERVE
+                optional['profile'] = task("PROFILE", get_company_profile, symbol, reserve=reserve) # Fail silently for ETFs
+                optional['news'] = task("NEWS", get_market_news, symbol, reserve=reserve)
+                optional['macro'] = task("NEWS", get_general_market_news, reserve=reserve)
+            else:
+                partial = ['profile', 'news', 'macro']
+
+            # Per-symbol deadline: whatever has not arrived by then is treated as missing.
+            # Optional parts must also leave the LLM reserve; required parts may use the whole budget.
+            limit = Config.FETCH_DEADLINE_SECONDS
+            started = time.monotonic()
+            wait(list(required.values()) + list(optional.values()),
+                 timeout=deadline.cap(limit, Config.DEADLINE_LLM_RESERVE) if deadline else limit)
+            required_left = (deadline.cap(limit) if deadline else limit) - (time.monotonic() - started)
+            wait(required.values(), timeout=max(0.0, required_left))
+
+            results = {}
+            for name, future in list(required.items()) + list(optional.items()):
+                if future.done():
+                    results[name] = future.result()
+                else:
+                    print(f"[ANALYZER] {symbol}: {name} missed the deadline")
+                    results[name] = None
+                    if name in optional:
+                        partial.append(name)
+
+            quote = quotes[symbol] if 'quote' not in required else results['quote']
+            data = self.assemble_global(
+                symbol, quote,
+                results.get('profile') or {},
+                results['tech'],
+                results.get('news') or [],
+                results.get('macro') or []
+            )
+            if data and partial:
+                data['partial'] = partial
+            return data
+
+        except Exception as e:
+            print(f"[ANALYZER] Global Stock Critical Error: {e}")
+            return None
+
+    def assemble_thai(self, symbol, thai_data, compute_indicators=True):
+        """ Build the fetch_data dict from a Settrade quote (+ history). Returns None without a price. """
+        if not thai_data or thai_data.get('price', 0) <= 0:
+            return None
+
+        technicals = Technicals()
+        price = thai_data['price']
+        pe = thai_data.get('pe', 0)
+        yd = thai_data.get('yield', 0)
+        # 52-week range from the candle store (falls back to the day's range)
+        technicals.year_high = thai_data.get('year_high') or thai_data.get('high') or None
+        technicals.year_low = thai_data.get('year_low') or thai_data.get('low') or None
+
+        prices_list = thai_data.get('history', [])
+        candles = thai_data.get('candles') or {"close": prices_list}
+        
+        if compute_indicators and prices_list is not None and len(prices_list) >= 14:
+            try:
+                technicals.update(candles.get('indicators') or indicators.summarize([candles['close']], [candles.get('high')], [candles.get('low')])[0])
+            except Exception as e:
+                print(f"[CALC ERROR] {e}")
+
+        return {
+            "price": price,
+            "pe_ratio": pe,
+            "div_yield": yd, 
+            "news": [],
+            "history": prices_list,
+            "candles": candles,
+            "technicals": technicals
+        }
+
+    def assemble_global(self, symbol, quote, profile, tech_data, specific_news, macro_news):
+        """
+        Build the fetch_data dict from the individual Twelve Data / Finnhub payloads.
+        Any payload except the quote may be missing. Returns None without a price.
+        """
+        price = 0
+        pe = 0
+        yd = 0
+        technicals = Technicals()
+        prices_list = []
+        news_items = []
+
+        if quote and quote.get('c', 0) > 0:
+            price = quote['c']
+
+        try:
+            profile = profile or {}
+            pe = profile.get('pe', 0)
+            technicals.market_cap = profile.get('marketCapitalization') or None
+            yd = profile.get('dividendYield', 0) 
+        except Exception as e: 
+            print(f"[PROFILE ERROR] {symbol}: {e}")
+
+        candles = None
+        if tech_data:
+            prices_list = tech_data.get('history', [])
+            candles = tech_data.get('candles')
+            technicals.update(tech_data.get('technicals', {}))
+
+        try:
+            s_items = [n['headline'] for n in specific_news[:3] if 'headline' in n] if specific_news else []
+            m_items = [f"[GLOBAL MACRO] {n.get('headline', '')}" for n in (macro_news or [])[:2]]
+            news_items = s_items + m_items
+        except Exception as e: 
+            print(f"[NEWS ERROR] {symbol}: {e}")
+
+        # Final Check: As long as we have a price, we continue
+        if price <= 0:
+            print(f"[ANALYZER] No price for {symbol}, aborting.")
+            return None
+
         return {
             "price": price,
             "pe_ratio": pe,
             "div_yield": yd, 
             "news": news_items,
             "history": prices_list,
+            "candles": candles,
             "technicals": technicals
         }
 
-    def analyze(self, symbol, strategy="Value", goal="Medium", risk="Medium"):
+    def compute_indicators(self, market_data):
+        """
+        Fill technical indicators for many fetched symbols: incremental state where the candle
+        store has it, one vectorized pass for the rest.
+        market_data: iterable of fetch_data dicts (None entries are skipped), updated in place.
+        """
+        batch = []
+        for d in market_data:
+            if not d or not d.get('candles') or len(d['candles'].get('close', [])) < 14:
+                continue
+            if d['candles'].get('indicators'):
+                d['technicals'].update(d['candles']['indicators']) # Incremental state (candle store)
+            else:
+                batch.append(d)
+        if not batch:
+            return
         try:
-            data = self.fetch_data(symbol)
+            summaries = indicators.summarize(
+                [d['candles']['close'] for d in batch],
+                [d['candles'].get('high') for d in batch],
+                [d['candles'].get('low') for d in batch]
+            )
+            for data, summary in zip(batch, summaries):
+                data['technicals'].update(summary)
+        except Exception as e:
+            print(f"[CALC ERROR] Batch indicators: {e}")
+
+    def _error_result(self, symbol, reason):
+        return AnalysisResult.error(symbol, reason)
+
+    def build_result(self, symbol, data):
+        """
+        Stage 2a: Turn fetched market data into an AnalysisResult (no AI fields yet).
+        Returns the ERROR result if data could not be fetched.
+        """
+        if not data:
+            return self._error_result(symbol, "ไม่สามารถดึงข้อมูลได้ (ตลาดปิดหรืออยู่นอกเวลาทำการ)")
+        return AnalysisResult.from_data(symbol, data)
+
+    def apply_ai(self, result, data, strategy="Value", goal="Medium", risk="Medium", deadline=None, on_verdict=None):
+        """
+        Stage 2b: AI Analysis (One-Shot: Signal + Reason + News Summary).
+        Fills signal/reason/news_summary on the result in place and returns it.
+        With a nearly spent deadline the LLM is skipped, the rule engine answers instead and
+        the result is marked partial; a failed / unusable LLM answer also falls back to the rules.
+        on_verdict(symbol, signal, reason): called as soon as both stream in (JSON mode),
+        before the news summary is finished.
+        """
+        if deadline is not None and deadline.remaining() < Config.DEADLINE_LLM_MIN:
+            print(f"[ANALYZER] {result.symbol}: no time left for AI, using rule-based signal")
+            result.partial.append('ai')
+            return self.apply_rules(result, strategy, goal, risk)
+
+        try:
+            ai_output = self.llm.analyze_stock_ai(
+                result.symbol, data['price'], data['pe_ratio'], data['div_yield'], 
+                data.get('news', []), strategy=strategy, goal=goal, technicals=data['technicals'],
+                timeout=self.llm.timeout_for(deadline),
+                on_field=_verdict_listener(result.symbol, on_verdict) if on_verdict else None
+            )
             
-            if not data:
-                return {
-                    "symbol": symbol,
-                    "metrics": {
-                        "Price": "N/A", "P/E": "-", "Yield": "-", "RSI": "-",
-                        "price": 0.0, "pe_ratio": 0.0, "div_yield": 0.0, "market_cap": "N/A",
-                        "technicals": {"rsi": "-", "sma50": "-", "year_high": "-", "year_low": "-"}
-                    },
-                    "signal": "ERROR",
-                    "reason": "ไม่สามารถดึงข้อมูลได้ (ตลาดปิดหรืออยู่นอกเวลาทำการ)",
-                    "news_summary": "-",
-                    "history": [],
-                    "news": [],
-                    "technicals": {}
-                }
-
-            result = {
-                "symbol": symbol,
-                "metrics": {
-                    "Price": f"{data['price']:,.2f}",
-                    "P/E": f"{data['pe_ratio']:.2f}" if data['pe_ratio'] else "N/A",
-                    "Yield": f"{data['div_yield']:.2f}%" if data['div_yield'] else "N/A",
-                    "RSI": data['technicals'].get('rsi', 'N/A'),
-                    
-                    "price": data['price'],
-                    "pe_ratio": data['pe_ratio'],
-                    "div_yield": data['div_yield'],
-                    "market_cap": data['technicals'].get('market_cap') if data['technicals'].get('market_cap') != "N/A" else None,
-                    "technicals": data['technicals']
-                },
-                "history": data['history'],
-                "news": data['news'],
-                "technicals": data['technicals']
-            }
+            return self.apply_ai_output(result, ai_output, strategy=strategy, goal=goal, risk=risk)
+        except Exception as e:
+            print(f"[AI ERROR] {e}")
+            return self.apply_rules(result, strategy, goal, risk)
+
+    def apply_rules(self, result, strategy="Value", goal="Medium", risk="Medium"):
+        """ Deterministic signal (signal_rules.py) from the result's own price / ratios / technicals """
+        rule = signal_rules.evaluate(result.price, result.pe_ratio, result.div_yield, result.technicals,
+                                     strategy=strategy, goal=goal, risk=risk)
+        result.signal = rule.signal
+        result.reason = f"[ระบบกฎ] {rule.reason}"
+        result.news_summary = "-" # Bubble falls back to the top headline
+        result.ai_ok = False
+        return result
+
+    def apply_ai_output(self, result, ai_output, strategy=None, goal="Medium", risk="Medium"):
+        """
+        Parse the raw LLM answer into signal/reason/news_summary on the result.
+        An answer cut off after the verdict keeps signal + reason and is flagged partial.
+        strategy: When given, a failed / unparseable answer is replaced by the rule-based signal.
+        """
+        try:
+            if not ai_output or str(ai_output).startswith(self.llm.FAILURE_PREFIXES):
+                verdict = verdict_parser.Verdict() # Our own error text: nothing to parse
+            else:
+                verdict = verdict_parser.parse(ai_output)
+            if not verdict.ok and strategy is not None:
+                print(f"[ANALYZER] {result.symbol}: AI answer unusable, using rule-based signal")
+                return self.apply_rules(result, strategy, goal, risk)
+
+            result.signal = verdict.signal
+            result.reason = verdict.reason
+            result.news_summary = verdict.news_summary
+            result.ai_ok = verdict.ok and verdict.complete and not self.llm.is_failure(ai_output)
+            if verdict.ok and not verdict.complete:
+                result.partial.append('news_summary')
             
-            result.update(result['metrics'])
+        except Exception as e:
+            print(f"[AI ERROR] {e}")
+            if strategy is not None:
+                return self.apply_rules(result, strategy, goal, risk)
+            result.signal = "WAIT"
+            result.reason = "AI ประมวลผลขัดข้อง"
+            result.news_summary = "-"
+
+        return result
+
+    def analyze_data(self, symbol, data, strategy="Value", goal="Medium", risk="Medium", deadline=None, on_verdict=None, fast=None,
+                     change_detection=False):
+        """
+        Stage 2 (LLM): Build result from already-fetched data and run the AI step.
+        The AI verdict is reused from result_cache when another request already analyzed
+        the same inputs with the same settings.
+        fast: Rule-based signal only, no LLM (defaults to Config.SIGNAL_FAST_MODE).
+        change_detection: Also reuse the last verdict for these settings while the inputs have not
+                          materially changed (change_detector). Scheduled runs only: the snapshot
+                          can be up to CHANGE_MAX_AGE old, too stale for a live report.
+        """
+        try:
+            result = self.build_result(symbol, data)
+            if result.is_error:
+                return result
+            if Config.SIGNAL_FAST_MODE if fast is None else fast:
+                return self.apply_rules(result, strategy, goal, risk)
+
+            key = result_cache.make_key(symbol, strategy, goal, risk, data)
+            cached = result_cache.lookup(key)
+            if cached:
+                print(f"[RESULT CACHE] Hit {symbol} ({strategy}/{goal}/{risk})")
+                result.signal, result.reason, result.news_summary = cached
+                result.ai_ok = True
+                return result
+            reused = change_detector.lookup(symbol, strategy, goal, risk, data) if change_detection else None
+            if reused:
+                result.signal, result.reason, result.news_summary = reused
+                result.ai_ok = True
+                return result
+
+            result = self.apply_ai(result, data, strategy=strategy, goal=goal, risk=risk, deadline=Deadline.of(deadline),
+                                   on_verdict=on_verdict)
+            if result.ai_ok:
+                result_cache.store(key, result)
+                if change_detection:
+                    change_detector.record(symbol, strategy, goal, risk, data, result)
+            return result
+        except Exception as e:
+            err_msg = f"{type(e).__name__}: {str(e)}"
+            print(f"[CRITICAL ANALYZE ERROR] {err_msg}")
+            return self._error_result(symbol, f"Error: {err_msg[:100]}")
 
-            # AI Analysis (One-Shot: Signal + Reason + News Summary)
+    def analyze_data_batch(self, entries, deadline=None, fast=None, change_detection=False):
+        """
+        Stage 2 (LLM) for many symbols at once: like analyze_data, but every entry that
+        misses result_cache (and change_detector, with change_detection) goes to Gemini through one
+        batched prompt per chunk (LLMService.analyze_stocks_batch) instead of one request per symbol.
+        entries: List of (symbol, data, strategy, goal, risk).
+        deadline: One budget for the whole batch (the request is shared).
+        fast: Rule-based signals only, no LLM (defaults to Config.SIGNAL_FAST_MODE).
+        Returns: List of AnalysisResult in input order.
+        """
+        deadline = Deadline.of(deadline)
+        fast = Config.SIGNAL_FAST_MODE if fast is None else fast
+        results, pending = [], []
+        for symbol, data, strategy, goal, risk in entries:
             try:
-                ai_output = self.llm.analyze_stock_ai(
-                    symbol, data['price'], data['pe_ratio'], data['div_yield'], 
-                    data.get('news', []), strategy=strategy, goal=goal, technicals=data['technicals']
-                )
-                
-                import re
-                # Robust Regex Parsing for "SIGNAL | REASON | NEWS_SUMMARY"
-                # Matches: (BUY/SELL...) | (Text) | (Text)
-                pattern = r"(BUY|SELL|HOLD|WAIT)\s*\|\s*(.*?)\s*\|\s*(.*)"
-                match = re.search(pattern, ai_output, re.DOTALL | re.IGNORECASE)
-                
-                found_signal = "WAIT"
-                reason_text = "รอการวิเคราะห์เพิ่มเติม"
-                news_summary_text = "ไม่มีข่าวสำคัญในช่วงนี้"
-
-                valid_signals = ["BUY", "SELL", "HOLD", "WAIT"]
-
-                if match:
-                    # Regex Success
-                    found_signal = match.group(1).upper()
-                    reason_text = match.group(2).strip()
-                    news_summary_text = match.group(3).strip()
-                else:
-                    # Fallback: Manual Split (Handle cases where | might be missing or format slightly off)
-                    parts = [p.strip() for p in ai_output.split('|')]
-                    if len(parts) >= 1:
-                        # Attempt to find signal in first part
-                        sig_candidate = parts[0].upper()
-                        for vs in valid_signals:
-                            if vs in sig_candidate:
-                                found_signal = vs
-                                break
-                    if len(parts) >= 2: reason_text = parts[1]
-                    if len(parts) >= 3: news_summary_text = parts[2]
-
-                result['signal'] = found_signal
-                result['reason'] = reason_text
-                result['news_summary'] = news_summary_text
-                
+                result = self.build_result(symbol, data)
+                key = None
+                if fast and not result.is_error:
+                    self.apply_rules(result, strategy, goal, risk)
+                elif not result.is_error:
+                    key = result_cache.make_key(symbol, strategy, goal, risk, data)
+                    cached = result_cache.lookup(key)
+                    if cached:
+                        print(f"[RESULT CACHE] Hit {symbol} ({strategy}/{goal}/{risk})")
+                    elif change_detection:
+                        cached = change_detector.lookup(symbol, strategy, goal, risk, data)
+                    if cached:
+                        result.signal, result.reason, result.news_summary = cached
+                        result.ai_ok = True
+                    else:
+                        pending.append((len(results), data, strategy, goal, risk, key))
+                results.append(result)
             except Exception as e:
-                print(f"[AI ERROR] {e}")
-                result['signal'] = "WAIT"
-                result['reason'] = "AI ประมวลผลขัดข้อง"
-                result['news_summary'] = "-"
+                err_msg = f"{type(e).__name__}: {str(e)}"
+                print(f"[CRITICAL ANALYZE ERROR] {err_msg}")
+                results.append(self._error_result(symbol, f"Error: {err_msg[:100]}"))
 
-            return result
+        if not pending:
+            return results
+        if deadline is not None and deadline.remaining() < Config.DEADLINE_LLM_MIN:
+            for index, _, strategy, goal, risk, _ in pending:
+                self.apply_ai(results[index], None, strategy=strategy, goal=goal, risk=risk, deadline=deadline) # Rules + partial
+            return results
 
+        items = [{
+            'symbol': results[index].symbol, 'price': data['price'], 'pe_ratio': data['pe_ratio'],
+            'div_yield': data['div_yield'], 'news_list': data.get('news', []),
+            'strategy': strategy, 'goal': goal, 'technicals': data['technicals'],
+        } for index, data, strategy, goal, _, _ in pending]
+        try:
+            outputs = self.llm.analyze_stocks_batch(items, deadline=deadline)
+        except Exception as e:
+            print(f"[AI ERROR] {e}")
+            outputs = [None] * len(items)
+
+        for (index, data, strategy, goal, risk, key), ai_output in zip(pending, outputs):
+            result = self.apply_ai_output(results[index], ai_output, strategy=strategy, goal=goal, risk=risk)
+            if result.ai_ok:
+                result_cache.store(key, result)
+                if change_detection:
+                    change_detector.record(result.symbol, strategy, goal, risk, data, result)
+        return results
+
+    def analyze(self, symbol, strategy="Value", goal="Medium", risk="Medium", quotes=None, deadline=None, on_verdict=None, fast=None):
+        """
+        Fetch + AI for one symbol.
+        deadline: Optional latency budget (Deadline or seconds, starts now). Optional data and the
+                  LLM are cut off as it runs out; the result's 'partial' lists what was skipped.
+        on_verdict: Optional early callback, see apply_ai.
+        fast: Rule-based signal only, no LLM (see analyze_data).
+        """
+        deadline = Deadline.of(deadline)
+        try:
+            data = self.fetch_data(symbol, quotes=quotes, deadline=deadline)
         except Exception as e:
             err_msg = f"{type(e).__name__}: {str(e)}"
             print(f"[CRITICAL ANALYZE ERROR] {err_msg}")
-            return {
-                "symbol": symbol,
-                "metrics": {
-                    "Price": "N/A", "P/E": "-", "Yield": "-", "RSI": "-",
-                    "price": 0.0, "pe_ratio": 0.0, "div_yield": 0.0, "market_cap": "N/A",
-                    "technicals": {"rsi": "-", "sma50": "-", "year_high": "-", "year_low": "-"}
-                },
-                "signal": "ERROR",
-                "reason": f"Error: {err_msg[:100]}",
-                "news_summary": "-",
-                "history": [],
-                "news": [],
-                "technicals": {}
-            }
+            return self._error_result(symbol, f"Error: {err_msg[:100]}")
+
+        return self.analyze_data(symbol, data, strategy=strategy, goal=goal, risk=risk, deadline=deadline, on_verdict=on_verdict, fast=fast)
@@ -18,23 +18,20 @@ from line_templates import (
     get_scheduler_flex, get_analysis_flex
 )
 
-from analyzer import AnalysisEngine
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Verify line_ux directory
-print(f"[INIT] BASE_DIR: {Config.BASE_DIR}")
-ux_dir = os.path.join(Config.BASE_DIR, 'line_ux')
-if os.path.exists(ux_dir):
-    print(f"[INIT] Found 'line_ux'")
-else:
-    print(f"[INIT] CRITICAL: 'line_ux' directory NOT FOUND at {ux_dir}")
+# The analysis engine / Gemini SDK are loaded on first use (registry.get_engine),
+# optionally warmed in the background so the first report does not pay for it.
+if Config.WARM_UP_ON_START:
+    import threading
+    from registry import warm_up
+    threading.Thread(target=warm_up, daemon=True).start()
 
 line_bot_api = LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
-analyzer = AnalysisEngine()
 
 USER_STATES = {}
 _db_initialized = False
@@ -79,15 +76,17 @@ def get_or_create_user(line_user_id):
         db.commit()
     return user, db
 
-from thai_stock_helper import get_thai_stock_data as get_thai_quote
-from global_stock_helper import get_quote as get_quote_finnhub
-
-def check_stock_exists(symbol):
+def check_stock_exists(symbol, quotes=None):
     """
     Check stock existence: Try Finnhub First -> Fallback to Settrade (Thai)
+    quotes: Optional dict from get_quotes (bulk prefetch) used instead of a per-symbol quote call.
     """
     try:
-        quote = get_quote_finnhub(symbol)
+        if quotes is not None and symbol in quotes: # None: Twelve Data has no such symbol, go straight to Settrade
+            quote = quotes[symbol]
+        else:
+            from global_stock_helper import get_quote as get_quote_finnhub # Provider stack loaded on first lookup
+            quote = get_quote_finnhub(symbol)
         if quote and quote['c'] > 0:
              return symbol, quote['c']
     except Exception as e:
@@ -95,6 +94,7 @@ def check_stock_exists(symbol):
 
     print(f"[Check Stock] Falling back to Settrade for {symbol}")
     try:
+        from thai_stock_helper import get_thai_stock_data as get_thai_quote # Settrade SDK loaded on first Thai lookup
         thai_data = get_thai_quote(symbol)
         if thai_data and thai_data.get('price', 0) > 0:
             if not symbol.upper().endswith(".BK"):
@@ -135,13 +135,31 @@ def handle_message(event):
         
         # Open DB once for checking
         user, db = get_or_create_user(user_id)
+
+        # Quote lookups run on the webhook thread: rate-limit waits are bounded by the webhook budget
+        from deadline import Deadline
+        from rate_limiter import deadline_scope
+        lookups = {}
+        with deadline_scope(Deadline(Config.WEBHOOK_DEADLINE_SECONDS)):
+            # Bulk Quote (1 request for all typed symbols)
+            candidates = [s.upper() for s in potential_stocks if 2 <= len(s) <= 10]
+            try:
+                from global_stock_helper import get_quotes
+                quotes = get_quotes(candidates)
+            except Exception as e:
+                print(f"[Check Stock Bulk Quote Error] {e}")
+                quotes = None
+
+            for symbol in candidates:
+                if symbol not in lookups:
+                    lookups[symbol] = check_stock_exists(symbol, quotes=quotes)
         
         for raw_symbol in potential_stocks:
             symbol = raw_symbol.upper()
             if len(symbol) < 2 or len(symbol) > 10:
                 continue
                 
-            found_symbol, price = check_stock_exists(symbol)
+            found_symbol, price = lookups[symbol]
                 
             if found_symbol and price:
                 # Check DB for duplicate
@@ -453,8 +471,23 @@ def handle_postback(event):
                         except Exception as e:
                             print(f"[PUSH ERROR] {e}")
 
-                    # Call Service
-                    process_stock_list(final_items, callback_func=on_result)
+                    def on_verdict(symbol, signal, reason):
+                        # Early heads-up while the news summary / bubble are still being generated
+                        short_reason = reason if len(reason) <= 100 else reason[:97] + "..."
+                        try:
+                            line_bot_api.push_message(u_id, TextSendMessage(text=f"⚡ {symbol}: {signal} - {short_reason}"))
+                        except Exception as e:
+                            print(f"[PUSH ERROR] {e}")
+
+                    # Call Service (interactive: bounded per-symbol latency, partial bubbles if needed)
+                    process_stock_list(final_items, callback_func=on_result, deadline=Config.REPORT_DEADLINE_SECONDS,
+                                       on_verdict=on_verdict if Config.EARLY_VERDICT_PUSH else None)
+
+                    # Hit / miss counts are kept in metrics (cache.hits / cache.misses); only dump them when debugging
+                    if Config.DEBUG:
+                        import result_cache, llm_cache
+                        print(f"[RESULT CACHE] {result_cache.stats()}")
+                        print(f"[LLM CACHE] {llm_cache.stats()}")
 
                 # Start Thread
                 bg_thread = threading.Thread(target=run_analysis_safe, args=(user.id, safe_items, user_settings_snapshot))
@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database import User, Watchlist
+
+class UserJob:
+    """ One user's share of an hourly batch: who to push to, and which analyses make up their carousel. """
+    def __init__(self, schedule_id, user_id, line_user_id, keys):
+        self.schedule_id = schedule_id
+        self.user_id = user_id
+        self.line_user_id = line_user_id
+        self.keys = keys # Ordered list of (symbol, strategy, goal, risk)
+
+class BatchPlan:
+    """
+    Plan for one hour's schedules, deduplicated across users:
+    - symbols: union of all watched symbols (market data fetched once each)
+    - analyses: distinct (symbol, strategy, goal, risk) tuples (LLM called once each)
+    - jobs: per-user fan-out of those tuples
+    """
+    def __init__(self):
+        self.jobs = []
+        self.symbols = []
+        self.analyses = []
+
+    @property
+    def total_rows(self):
+        return sum(len(job.keys) for job in self.jobs)
+
+    def for_job(self, job):
+        """ Plan covering only one user's job (per-user fallback when the shared run fails) """
+        plan = BatchPlan()
+        plan.jobs = [job]
+        plan.analyses = list(dict.fromkeys(job.keys))
+        plan.symbols = list(dict.fromkeys(key[0] for key in job.keys))
+        return plan
+
+def plan_batch(db, schedules):
+    """ Build a BatchPlan from the schedules due this hour. """
+    plan = BatchPlan()
+    seen_symbols = set()
+    seen_analyses = set()
+
+    for sched in schedules:
+        user = db.query(User).filter(User.id == sched.user_id).first()
+        if not user: continue
+
+        watchlist = db.query(Watchlist).filter(Watchlist.user_id == user.id).all()
+        if not watchlist:
+            print(f"User {user.id} has no watchlist.")
+            continue
+
+        # Deduplicate Watchlist (Keep unique symbols only) and resolve settings against user globals
+        keys = []
+        user_symbols = set()
+        for item in watchlist:
+            if item.symbol in user_symbols: continue
+            user_symbols.add(item.symbol)
+
+            key = (
+                item.symbol,
+                item.strategy or user.core_strategy or 'Value',
+                item.goal or user.investment_goal or 'Medium',
+                item.risk or user.risk_appetite or 'Medium'
+            )
+            keys.append(key)
+
+            if item.symbol not in seen_symbols:
+                seen_symbols.add(item.symbol)
+                plan.symbols.append(item.symbol)
+            if key not in seen_analyses:
+                seen_analyses.add(key)
+                plan.analyses.append(key)
+
+        plan.jobs.append(UserJob(sched.id, user.id, user.line_user_id, keys))
+
+    return plan
+
+def run_batch(plan, analyzer, render_func, deadline=None):
+    """
+    Execute a BatchPlan:
+    1. Fetch market data once per unique symbol (indicators computed for the whole batch at once).
+    2. Run LLM analysis once per unique (symbol, strategy, goal, risk), several per Gemini
+       request when Config.LLM_BATCH_ENABLED (AnalysisEngine.analyze_data_batch).
+    3. Render once per analysis and fan the bubbles out to each user's carousel.
+    deadline: Optional budget in seconds, applied to the bulk quote prefetch, each symbol's fetch and each analysis.
+
+    Returns:
+        Dict of schedule_id -> list of Flex Bubbles (in the user's watchlist order).
+    """
+    print(f"[BATCH] {len(plan.jobs)} users, {plan.total_rows} watchlist rows -> "
+          f"{len(plan.symbols)} unique symbols, {len(plan.analyses)} unique analyses")
+
+    def fetch(symbol):
+        try:
+            return analyzer.fetch_data(symbol, quotes=quotes, compute_indicators=False, deadline=deadline)
+        except Exception as e:
+            print(f"[BATCH FETCH ERROR] {symbol}: {e}")
+            return None
+
+    def render(result):
+        try:
+            return render_func(result)
+        except Exception as e:
+            print(f"[BATCH RENDER ERROR] {result.symbol}: {e}")
+            return None
+
+    def analyze(key):
+        symbol, strategy, goal, risk = key
+        try:
+            return render(analyzer.analyze_data(symbol, market_data.get(symbol), strategy=strategy, goal=goal, risk=risk, deadline=deadline,
+                                                change_detection=True))
+        except Exception as e:
+            print(f"[BATCH ANALYZE ERROR] {symbol}: {e}")
+            return None
+
+    def analyze_group(keys):
+        entries = [(symbol, market_data.get(symbol), strategy, goal, risk) for symbol, strategy, goal, risk in keys]
+        try:
+            return [render(result) for result in analyzer.analyze_data_batch(entries, deadline=deadline, change_detection=True)]
+        except Exception as e:
+            # One bad symbol must not empty the whole group: analyze its members one by one
+            print(f"[BATCH ANALYZE ERROR] Group of {len(keys)} failed ({e}), analyzing one by one")
+            return [analyze(key) for key in keys]
+
+    # 1. Market data (once per symbol, quotes in bulk)
+    quotes = analyzer.prefetch_quotes(plan.symbols, deadline=deadline)
+    with ThreadPoolExecutor(max_workers=Config.PIPELINE_FETCH_WORKERS, thread_name_prefix="batch-fetch") as pool:
+        market_data = dict(zip(plan.symbols, pool.map(fetch, plan.symbols)))
+    # Indicators for every symbol in one vectorized pass
+    analyzer.compute_indicators(market_data.values())
+
+    # 2 + 3. LLM + Render (once per distinct analysis tuple)
+    with ThreadPoolExecutor(max_workers=Config.PIPELINE_LLM_WORKERS, thread_name_prefix="batch-llm") as pool:
+        if Config.LLM_BATCH_ENABLED:
+            size = max(1, Config.LLM_BATCH_MAX_SYMBOLS)
+            groups = [plan.analyses[i:i + size] for i in range(0, len(plan.analyses), size)]
+            bubbles = dict(zip(plan.analyses, (b for group in pool.map(analyze_group, groups) for b in group)))
+        else:
+            bubbles = dict(zip(plan.analyses, pool.map(analyze, plan.analyses)))
+
+    # 4. Fan out
+    results = {}
+    for job in plan.jobs:
+        results[job.schedule_id] = [bubbles[key] for key in job.keys if bubbles.get(key)]
+    return results
@@ -0,0 +1,199 @@
+import datetime
+import numpy as np
+try:
+    import price_columns
+    from indicator_state import IndicatorState
+except ImportError:
+    from src import price_columns
+    from src.indicator_state import IndicatorState
+try:
+    from config import Config
+    from database import SessionLocal
+    from init_cache_db import OHLCVCandle, CandleSyncState
+except ImportError:
+    from src.config import Config
+    from src.database import SessionLocal
+    from src.init_cache_db import OHLCVCandle, CandleSyncState
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+def _bars_since(last_bar):
+    """ Weekdays between the last stored daily bar and today (upper bound on missing bars) """
+    try:
+        day = datetime.date.fromisoformat(last_bar[:10])
+    except (TypeError, ValueError):
+        return None
+    today = datetime.date.today()
+    count = 0
+    while day < today:
+        day += datetime.timedelta(days=1)
+        if day.weekday() < 5:
+            count += 1
+    return count
+
+def _sync_id(state):
+    """ Identifies the stored window a set of column files mirrors """
+    return f"{state.last_bar}@{state.synced_at.isoformat()}" if state and state.synced_at else None
+
+def _append_tail(symbol, interval, bars, previous_bar, previous_sync, sync_id, lookback):
+    """
+    Append a fetched tail to the column files of the previous sync (the first fetched bar
+    replaces the stored last bar when they are the same bar) and return the new views.
+    Returns None when the columns cannot be extended (missing, another sync, or the tail
+    does not start at the last stored bar); the caller then rebuilds from the database.
+    """
+    if not previous_sync or not previous_bar or bars[0]['time'] < previous_bar:
+        return None
+    try:
+        old = price_columns.open_columns(symbol, interval, FIELDS, sync_id=previous_sync)
+        if old is None:
+            return None
+        keep = len(old['close']) - (1 if bars[0]['time'] == previous_bar else 0)
+        columns = {
+            f: np.concatenate([old[f][:keep], np.array([float(bar.get(f) or 0) for bar in bars], dtype=price_columns.DTYPE)])[-lookback:]
+            for f in FIELDS
+        }
+        price_columns.write_columns(symbol, interval, columns, sync_id)
+        return price_columns.open_columns(symbol, interval, sync_id=sync_id)
+    except OSError as e:
+        print(f"[CANDLE STORE] Column append failed for {symbol}: {e}")
+        return None
+
+def get_history(symbol, interval, fetch_tail, lookback=None):
+    """
+    Incremental OHLCV history for (symbol, interval).
+
+    fetch_tail(n) must return up to the n newest bars from the provider, oldest -> newest,
+    as dicts with 'time' (ISO date) + open/high/low/close/volume.
+    Only the tail since the last stored bar is requested (plus that bar itself, which may
+    have been partial intraday). Within Config.CANDLE_REFRESH_SECONDS of the last sync
+    no provider call is made at all.
+
+    The stored window is mirrored to memory-mapped column files (price_columns.py);
+    when those already match the last sync, the database rows are not read at all, and a
+    fetched tail is appended to them. The window is only rebuilt from the database when
+    the columns or the indicator checkpoint are missing or out of step.
+
+    Returns:
+        Dict of read-only float64 array views {'high', 'low', 'close'} oldest -> newest
+        (at most `lookback` bars) plus 'indicators' (latest values from the incremental
+        indicator state, when its checkpoint is in step), or None if nothing is stored
+        and the fetch failed.
+    """
+    lookback = lookback or Config.CANDLE_LOOKBACK
+    session = SessionLocal()
+    try:
+        state = session.get(CandleSyncState, (symbol, interval))
+        now = datetime.datetime.utcnow()
+        changed = False
+        fresh = state and state.synced_at and (now - state.synced_at).total_seconds() < Config.CANDLE_REFRESH_SECONDS
+        previous_bar = state.last_bar if state else None
+        previous_sync = _sync_id(state)
+        views = None
+
+        if not fresh:
+            missing = lookback
+            if state and state.last_bar:
+                since = _bars_since(state.last_bar)
+                if since is not None:
+                    missing = min(lookback, since + 1)
+
+            bars = []
+            try:
+                bars = fetch_tail(missing) or []
+            except Exception as e:
+                print(f"[CANDLE STORE] Fetch failed for {symbol}: {e}")
+
+            if bars:
+                changed = True
+                print(f"[CANDLE STORE] {symbol} {interval}: stored {len(bars)} bar(s) (requested {missing})")
+                # Replace the overlapping tail (last stored bar may have been partial)
+                session.query(OHLCVCandle).filter(
+                    OHLCVCandle.symbol == symbol,
+                    OHLCVCandle.interval == interval,
+                    OHLCVCandle.bar_time >= bars[0]['time']
+                ).delete(synchronize_session=False)
+                for bar in bars:
+                    session.add(OHLCVCandle(
+                        symbol=symbol, interval=interval, bar_time=bar['time'],
+                        **{f: float(bar.get(f) or 0) for f in FIELDS}
+                    ))
+
+                if not state:
+                    state = CandleSyncState(symbol=symbol, interval=interval)
+                    session.add(state)
+                state.last_bar = bars[-1]['time']
+                state.synced_at = now
+                session.commit()
+
+                # O(1) per new bar: fold the tail into the checkpointed indicator state
+                ind_state = IndicatorState.load(symbol, interval)
+                if ind_state and ind_state.extend(bars):
+                    try:
+                        ind_state.save(symbol, interval)
+                    except OSError as e:
+                        print(f"[CANDLE STORE] Indicator checkpoint failed for {symbol}: {e}")
+
+                views = _append_tail(symbol, interval, bars, previous_bar, previous_sync, _sync_id(state), lookback)
+            elif not state:
+                return None
+
+        # Fast path: column files already mirror this sync (zero-copy, no row loading)
+        sync_id = _sync_id(state)
+        if not changed and sync_id:
+            views = price_columns.open_columns(symbol, interval, sync_id=sync_id)
+        if views is not None:
+            ind_state = IndicatorState.load(symbol, interval)
+            if ind_state and ind_state.last_time == state.last_bar:
+                views['indicators'] = ind_state.summary()
+                return views
+            if not changed:
+                return views # Checkpoint missing: serve prices only, like before the checkpoint existed
+
+        rows = session.query(OHLCVCandle).filter(
+            OHLCVCandle.symbol == symbol,
+            OHLCVCandle.interval == interval
+        ).order_by(OHLCVCandle.bar_time.desc()).limit(lookback).all()
+        if not rows:
+            return None
+        rows.reverse() # Oldest -> Newest
+
+        columns = {f: [getattr(r, f) for r in rows] for f in FIELDS}
+        views = None
+        try:
+            price_columns.write_columns(symbol, interval, columns, sync_id)
+            views = price_columns.open_columns(symbol, interval, sync_id=sync_id)
+        except OSError as e:
+            print(f"[CANDLE STORE] Column write failed for {symbol}: {e}")
+        if views is None:
+            views = {f: np.asarray(columns[f], dtype=price_columns.DTYPE) for f in ("high", "low", "close")}
+
+        # Indicator state: rebuilt from the stored window only when missing or out of step
+        ind_state = IndicatorState.load(symbol, interval)
+        if not ind_state or ind_state.last_time != rows[-1].bar_time:
+            ind_state = IndicatorState.from_rows(rows)
+            try:
+                ind_state.save(symbol, interval)
+            except OSError as e:
+                print(f"[CANDLE STORE] Indicator checkpoint failed for {symbol}: {e}")
+        views['indicators'] = ind_state.summary()
+        return views
+
+    except Exception as e:
+        session.rollback()
+        print(f"[CANDLE STORE ERROR] {symbol}: {e}")
+        return None
+    finally:
+        session.close()
+
+def prune(keep_days=None):
+    """ Drop bars older than keep_days (default: 2x the lookback window in calendar days) """
+    keep_days = keep_days or int(Config.CANDLE_LOOKBACK * 7 / 5 * 2)
+    cutoff = (datetime.date.today() - datetime.timedelta(days=keep_days)).isoformat()
+    session = SessionLocal()
+    try:
+        deleted = session.query(OHLCVCandle).filter(OHLCVCandle.bar_time < cutoff).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    finally:
+        session.close()
@@ -0,0 +1,126 @@
+import bisect
+import datetime
+import json
+try:
+    from config import Config
+    from ttl_cache import TTLCache
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src.ttl_cache import TTLCache
+    from src import metrics
+
+# Change detection: per (symbol, strategy, goal, risk) snapshot of the inputs the LLM last saw
+# and the verdict it gave. Before the next LLM call the fresh inputs are compared with the
+# snapshot; unless something moved materially (price, RSI band, new headlines, age) the
+# previous signal / reason / news summary are reused and the call is skipped.
+# The snapshot is only replaced by a new LLM answer, so small moves cannot add up unnoticed.
+# In-process LRU in front of a shared DB table (analysis_snapshots), like llm_cache.py.
+# Counters: change.reused, change.changed{reason=...}.
+
+_CACHE = TTLCache("snapshots", maxsize=Config.CHANGE_SNAPSHOT_SIZE, ttl=Config.CHANGE_MAX_AGE)
+
+def _snapshot_key(symbol, strategy, goal, risk):
+    return f"{symbol}|{strategy}|{goal}|{risk}"
+
+def _rsi_band(rsi):
+    """ Index of the RSI band (CHANGE_RSI_BANDS edges), None if RSI is unknown """
+    return None if rsi is None else bisect.bisect_right(Config.CHANGE_RSI_BANDS, float(rsi))
+
+def inputs_of(data):
+    """ The inputs the materiality check looks at, from a fetch_data dict """
+    return {
+        "price": float(data.get('price') or 0),
+        "rsi": data['technicals'].get('rsi'),
+        "news": sorted(set(data.get('news') or [])),
+    }
+
+def material_change(previous, current):
+    """
+    Why the inputs changed materially since the snapshot ('price' / 'rsi' / 'news'),
+    or None if the previous verdict still applies.
+    """
+    old_price, new_price = previous.get("price") or 0, current["price"]
+    if old_price <= 0 or new_price <= 0 or abs(new_price - old_price) / old_price >= Config.CHANGE_PRICE_DELTA:
+        return "price"
+    if _rsi_band(previous.get("rsi")) != _rsi_band(current["rsi"]):
+        return "rsi"
+    new_headlines = set(current["news"]) - set(previous.get("news") or ())
+    if len(new_headlines) >= Config.CHANGE_NEW_HEADLINES:
+        return "news"
+    return None
+
+def _db_read(key):
+    from database import SessionLocal
+    from init_cache_db import AnalysisSnapshot
+    session = SessionLocal()
+    try:
+        row = session.get(AnalysisSnapshot, key)
+        if row and (datetime.datetime.utcnow() - row.updated_at).total_seconds() < Config.CHANGE_MAX_AGE:
+            return json.loads(row.payload)
+        return None
+    except Exception as e:
+        print(f"[CHANGE DETECTION] DB read failed ({key}): {e}")
+        return None
+    finally:
+        session.close()
+
+def _db_write(key, snapshot):
+    from database import SessionLocal
+    from init_cache_db import AnalysisSnapshot
+    session = SessionLocal()
+    try:
+        row = session.get(AnalysisSnapshot, key)
+        if not row:
+            row = AnalysisSnapshot(snapshot_key=key)
+            session.add(row)
+        row.payload = json.dumps(snapshot, ensure_ascii=False)
+        row.updated_at = datetime.datetime.utcnow()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"[CHANGE DETECTION] DB write failed ({key}): {e}")
+    finally:
+        session.close()
+
+def _load(key):
+    snapshot = _CACHE.get(key)
+    if snapshot is None and Config.CHANGE_DB_TIER:
+        snapshot = _db_read(key)
+        if snapshot is not None:
+            metrics.incr("cache.db_hits", cache="snapshots")
+            _CACHE.set(key, snapshot)
+    return snapshot
+
+def lookup(symbol, strategy, goal, risk, data):
+    """ Previous (signal, reason, news_summary) if the inputs have not materially changed, else None """
+    if not Config.CHANGE_DETECTION_ENABLED:
+        return None
+    snapshot = _load(_snapshot_key(symbol, strategy, goal, risk))
+    if snapshot is None:
+        return None # Never analyzed (or older than CHANGE_MAX_AGE)
+    reason = material_change(snapshot["inputs"], inputs_of(data))
+    if reason:
+        metrics.incr("change.changed", reason=reason)
+        return None
+    metrics.incr("change.reused")
+    print(f"[CHANGE DETECTION] {symbol} ({strategy}/{goal}/{risk}): no material change, reusing last verdict")
+    return tuple(snapshot["verdict"])
+
+def record(symbol, strategy, goal, risk, data, result):
+    """ Snapshot the inputs and verdict of a fresh, complete LLM answer """
+    if not Config.CHANGE_DETECTION_ENABLED or result.is_error or result.partial or not result.ai_ok:
+        return
+    key = _snapshot_key(symbol, strategy, goal, risk)
+    snapshot = {"inputs": inputs_of(data), "verdict": [result.signal, result.reason, result.news_summary]}
+    _CACHE.set(key, snapshot)
+    if Config.CHANGE_DB_TIER:
+        _db_write(key, snapshot)
+
+def saved_calls():
+    """ LLM analyses skipped so far in this process (diff two readings for one run) """
+    return int(metrics.counter("change.reused"))
+
+def stats():
+    changed = {reason: int(metrics.counter("change.changed", reason=reason)) for reason in ("price", "rsi", "news")}
+    return {"size": len(_CACHE), "reused": saved_calls(), "changed": changed}
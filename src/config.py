@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -25,12 +26,13 @@ class Config:
         # Fallback to Local SQLite
         db_path = os.path.join(BASE_DIR, 'app.db')
         DATABASE_URL = f"sqlite:///{db_path}"
-        print(f"[CONFIG] Warning: DATABASE_URL not found. Using Local SQLite: {DATABASE_URL}")
 
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
-    print(f"[CONFIG] DB Configured: {SQLALCHEMY_DATABASE_URI.split('@')[-1]}")
+
+    # One line at import (SQLite fallback is the local-dev case)
+    print(f"[CONFIG] DB Configured: {SQLALCHEMY_DATABASE_URI.split('@')[-1]}"
+          + ("" if 'postgres' in DATABASE_URL else " (Warning: DATABASE_URL not found, using local SQLite)"))
 
     # Line API
     LINE_CHANNEL_ACCESS_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN', 'YOUR_ACCESS_TOKEN')
@@ -46,11 +48,125 @@ class Config:
     SETTRADE_BROKER_ID = os.getenv('SETTRADE_BROKER_ID', 'SANDBOX')
     SETTRADE_APP_CODE = os.getenv('SETTRADE_APP_CODE', 'SANDBOX')
     SETTRADE_IS_SANDBOX = os.getenv('SETTRADE_IS_SANDBOX', 'true').lower() == 'true'
+    SETTRADE_MAX_INFLIGHT = int(os.getenv('SETTRADE_MAX_INFLIGHT', '4'))  # Concurrent SDK requests per process
+    SETTRADE_TOKEN_REFRESH_MARGIN = int(os.getenv('SETTRADE_TOKEN_REFRESH_MARGIN', '300'))  # Refresh token this many seconds before expiry
+    SETTRADE_LOGIN_RETRY_SECONDS = int(os.getenv('SETTRADE_LOGIN_RETRY_SECONDS', '30'))  # Back off after a failed login
 
     # LLM Settings
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
     GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-flash-latest')
 
+    # Provider Rate Limits (Token Buckets, see rate_limiter.py)
+    TWELVE_DATA_CREDITS_PER_MINUTE = float(os.getenv('TWELVE_DATA_CREDITS_PER_MINUTE', '8'))  # Free tier: 8/min
+    FINNHUB_CALLS_PER_SECOND = float(os.getenv('FINNHUB_CALLS_PER_SECOND', '30'))
+    SETTRADE_CALLS_PER_SECOND = float(os.getenv('SETTRADE_CALLS_PER_SECOND', '10'))
+    GEMINI_RPM = float(os.getenv('GEMINI_RPM', '15'))
+    TWELVE_DATA_BATCH_SIZE = int(os.getenv('TWELVE_DATA_BATCH_SIZE', '8'))  # Symbols per bulk /quote request
+
+    # Provider HTTP Transport (pooled sessions + retries, see provider_transport.py)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+    HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))  # Seconds, doubled per retry (jittered)
+    HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '8'))
+    FINNHUB_TIMEOUT = float(os.getenv('FINNHUB_TIMEOUT', '3'))
+    TWELVE_DATA_TIMEOUT = float(os.getenv('TWELVE_DATA_TIMEOUT', '15'))
+    TWELVE_DATA_QUOTE_TIMEOUT = float(os.getenv('TWELVE_DATA_QUOTE_TIMEOUT', '5'))
+    SETTRADE_TIMEOUT = float(os.getenv('SETTRADE_TIMEOUT', '10'))
+
+    # Watchlist Pipeline (fetch -> LLM -> render, see services.py)
+    PIPELINE_ENABLED = os.getenv('PIPELINE_ENABLED', 'true').lower() == 'true'
+    PIPELINE_FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', '3'))
+    PIPELINE_LLM_WORKERS = int(os.getenv('PIPELINE_LLM_WORKERS', '2'))
+    PIPELINE_RENDER_WORKERS = int(os.getenv('PIPELINE_RENDER_WORKERS', '1'))
+
+    # Per-symbol fetch fan-out (quote / profile / candles / news in parallel, see analyzer.py)
+    FETCH_FANOUT_WORKERS = int(os.getenv('FETCH_FANOUT_WORKERS', '16'))
+    FETCH_DEADLINE_SECONDS = float(os.getenv('FETCH_DEADLINE_SECONDS', '20'))  # Late parts are dropped, not awaited
+
+    # Latency Budgets per symbol (see deadline.py)
+    EARLY_VERDICT_PUSH = os.getenv('EARLY_VERDICT_PUSH', 'false').lower() == 'true'  # Push signal + reason as soon as they stream in: one extra LINE push per symbol (doubles push quota), may arrive out of bubble order
+    REPORT_DEADLINE_SECONDS = float(os.getenv('REPORT_DEADLINE_SECONDS', '25'))  # Interactive get_report; rate-limit waits past it are skipped (see README, Latency Budgets)
+    WORKER_DEADLINE_SECONDS = float(os.getenv('WORKER_DEADLINE_SECONDS', '90'))  # Scheduled worker batches
+    WEBHOOK_DEADLINE_SECONDS = float(os.getenv('WEBHOOK_DEADLINE_SECONDS', '8'))  # Quote lookups on the LINE webhook thread (ADD_STOCK)
+    DEADLINE_LLM_RESERVE = float(os.getenv('DEADLINE_LLM_RESERVE', '10'))  # Kept for Gemini + render; optional fetches are cut to leave it
+    DEADLINE_LLM_MIN = float(os.getenv('DEADLINE_LLM_MIN', '3'))  # Below this, skip Gemini and return market data only
+    GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+
+    # Gemini Response Cache (prompt hash -> response, see llm_cache.py)
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '2000'))
+    LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(72 * 3600)))  # Covers a weekend of closed-market reports
+    LLM_CACHE_DB_TIER = os.getenv('LLM_CACHE_DB_TIER', 'true').lower() == 'true'  # Share / persist across web app + worker restarts
+
+    # Gemini Executor (see llm_executor.py)
+    LLM_MAX_INFLIGHT = int(os.getenv('LLM_MAX_INFLIGHT', str(max(2, int(GEMINI_RPM // 3)))))  # ~RPM x typical latency / 60s
+    LLM_TIMEOUT_GRACE = float(os.getenv('LLM_TIMEOUT_GRACE', '2'))  # Hard deadline = request timeout + grace
+    LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'  # Duplicate slow calls (costs extra RPM)
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))  # Latency samples before p95 is trusted
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '2'))
+
+    # Change Detection (see change_detector.py): reuse the last verdict unless the inputs moved materially
+    CHANGE_DETECTION_ENABLED = os.getenv('CHANGE_DETECTION_ENABLED', 'true').lower() == 'true'
+    CHANGE_PRICE_DELTA = float(os.getenv('CHANGE_PRICE_DELTA', '0.015'))  # 1.5% price move since the last LLM answer
+    CHANGE_RSI_BANDS = sorted(float(x) for x in os.getenv('CHANGE_RSI_BANDS', '30,70').split(',') if x.strip())  # Crossing an edge is material
+    CHANGE_NEW_HEADLINES = int(os.getenv('CHANGE_NEW_HEADLINES', '1'))  # Headlines not seen last time
+    CHANGE_MAX_AGE = int(os.getenv('CHANGE_MAX_AGE', str(72 * 3600)))  # Re-ask at least this often (covers a weekend of daily reports)
+    CHANGE_SNAPSHOT_SIZE = int(os.getenv('CHANGE_SNAPSHOT_SIZE', '5000'))
+    CHANGE_DB_TIER = os.getenv('CHANGE_DB_TIER', 'true').lower() == 'true'  # Snapshots survive worker restarts
+
+    # Prompt Compaction / Token Accounting (see prompt_builder.py, llm.prompt_tokens metrics)
+    LLM_PROMPT_MAX_HEADLINES = int(os.getenv('LLM_PROMPT_MAX_HEADLINES', '3'))
+    LLM_PROMPT_HEADLINE_CHARS = int(os.getenv('LLM_PROMPT_HEADLINE_CHARS', '160'))  # Longer headlines are cut
+    LLM_PROMPT_TOKEN_WARN = int(os.getenv('LLM_PROMPT_TOKEN_WARN', '1500'))  # Log prompts larger than this
+    LLM_SYSTEM_INSTRUCTION = os.getenv('LLM_SYSTEM_INSTRUCTION', 'true').lower() == 'true'  # Static rules as system instruction
+    LLM_CONTEXT_CACHE = os.getenv('LLM_CONTEXT_CACHE', 'false').lower() == 'true'  # Explicit Gemini context cache for the instruction
+    LLM_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('LLM_CONTEXT_CACHE_MIN_TOKENS', '1024'))  # API minimum; shorter instructions stay uncached
+    LLM_CONTEXT_CACHE_TTL = int(os.getenv('LLM_CONTEXT_CACHE_TTL', '3600'))
+
+    # Rule-Based Signals (see signal_rules.py): fast mode skips Gemini entirely for instant reports
+    SIGNAL_FAST_MODE = os.getenv('SIGNAL_FAST_MODE', 'false').lower() == 'true'
+
+    # Structured Output: schema-constrained JSON verdicts, parsed while streaming (see verdict_parser.py)
+    LLM_JSON_MODE = os.getenv('LLM_JSON_MODE', 'true').lower() == 'true'
+
+    # Batched Gemini Analysis (several symbols per request, see LLMService.analyze_stocks_batch)
+    # Used by the worker (batch_planner.run_batch); interactive reports stay on the per-symbol pipeline
+    LLM_BATCH_ENABLED = os.getenv('LLM_BATCH_ENABLED', 'true').lower() == 'true'
+    LLM_BATCH_MAX_SYMBOLS = int(os.getenv('LLM_BATCH_MAX_SYMBOLS', '10'))
+    LLM_BATCH_MAX_PROMPT_TOKENS = int(os.getenv('LLM_BATCH_MAX_PROMPT_TOKENS', '6000'))  # Estimated, chunks are split above this
+    LLM_BATCH_MAX_OUTPUT_TOKENS = int(os.getenv('LLM_BATCH_MAX_OUTPUT_TOKENS', '6000'))
+    LLM_BATCH_OUTPUT_TOKENS_PER_SYMBOL = int(os.getenv('LLM_BATCH_OUTPUT_TOKENS_PER_SYMBOL', '300'))  # Thai reason + news summary
+
+    # Analysis Result Cache (AI verdict per symbol/settings/input fingerprint, see result_cache.py)
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '5000'))
+    RESULT_CACHE_TTL_OPEN = int(os.getenv('RESULT_CACHE_TTL_OPEN', '300'))  # While the symbol's market trades
+    RESULT_CACHE_TTL_CLOSED = int(os.getenv('RESULT_CACHE_TTL_CLOSED', str(6 * 3600)))  # Market closed: inputs barely move
+    RESULT_CACHE_PRICE_TOLERANCE = float(os.getenv('RESULT_CACHE_PRICE_TOLERANCE', '0.002'))  # 0.2% price move still hits
+
+    # Candle Store (incremental OHLCV history, see candle_store.py)
+    CANDLE_LOOKBACK = int(os.getenv('CANDLE_LOOKBACK', '260'))  # Bars kept for indicators (~52 weeks)
+    CANDLE_REFRESH_SECONDS = int(os.getenv('CANDLE_REFRESH_SECONDS', '900'))  # Skip provider calls if synced recently
+    PRICE_COLUMNS_DIR = os.getenv('PRICE_COLUMNS_DIR', os.path.join(tempfile.gettempdir(), 'price_columns'))  # mmap float64 files; a cache rebuilt from the DB. In-memory on Cloud Run (counts against the memory limit)
+
+    # News Cache (see news_cache.py)
+    NEWS_CACHE_TTL_GENERAL = int(os.getenv('NEWS_CACHE_TTL_GENERAL', '900'))  # Macro news, seconds
+    NEWS_CACHE_TTL_SYMBOL = int(os.getenv('NEWS_CACHE_TTL_SYMBOL', '1800'))  # Company news, seconds
+    NEWS_CACHE_MAX_SYMBOLS = int(os.getenv('NEWS_CACHE_MAX_SYMBOLS', '2000'))
+    NEWS_CACHE_DB_TIER = os.getenv('NEWS_CACHE_DB_TIER', 'false').lower() == 'true'
+
+    # Company Profile Cache (per-field freshness, seconds, see profile_cache.py)
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '2000'))
+    PROFILE_TTL_PE = int(os.getenv('PROFILE_TTL_PE', str(24 * 3600)))
+    PROFILE_TTL_MARKET_CAP = int(os.getenv('PROFILE_TTL_MARKET_CAP', str(24 * 3600)))
+    PROFILE_TTL_YIELD = int(os.getenv('PROFILE_TTL_YIELD', str(7 * 24 * 3600)))
+    PROFILE_TTL_NAME = int(os.getenv('PROFILE_TTL_NAME', str(30 * 24 * 3600)))
+    PROFILE_MISSING_TTL = int(os.getenv('PROFILE_MISSING_TTL', str(7 * 24 * 3600)))  # Known-missing fields (ETFs)
+    PROFILE_STALE_MAX = int(os.getenv('PROFILE_STALE_MAX', str(30 * 24 * 3600)))  # Serve stale + refresh in background
+
+    # Cold Start (see registry.py)
+    WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'true').lower() == 'true'  # Load engine / Gemini SDK in a background thread at boot
+
     # App Settings
     SCHEDULER_TIMEZONE = 'Asia/Bangkok'
     DEBUG = False
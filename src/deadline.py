@@ -0,0 +1,27 @@
+import time
+
+class Deadline:
+    """
+    Latency budget for one analysis (monotonic clock).
+    Stages ask how much is left and skip / cut off optional work when it runs low.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def of(cls, value):
+        """ Accept a Deadline, a number of seconds, or None (no budget) """
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(float(value))
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, seconds, reserve=0.0):
+        """ min(seconds, time left minus a reserve for later stages), never negative """
+        return max(0.0, min(seconds, self.remaining() - reserve))
@@ -1,47 +1,54 @@
-import requests
-import requests
 try:
     from src.config import Config
 except ImportError:
     from config import Config
+try:
+    from provider_transport import get_transport
+except ImportError:
+    from src.provider_transport import get_transport
+try:
+    import candle_store
+    import indicators
+    import news_cache
+except ImportError:
+    from src import candle_store
+    from src import indicators
+    from src import news_cache
 import time
 import datetime
 
 # --- CONFIGS ---
 FINNHUB_KEY = Config.FINNHUB_API_KEY
-FINNHUB_URL = "https://finnhub.io/api/v1"
-
 TWELVE_KEY = Config.TWELVE_DATA_API_KEY
-TWELVE_URL = "https://api.twelvedata.com"
 
 # --- HELPER FUNCTIONS ---
 
-def _get_finnhub(endpoint, params={}):
+def _get_finnhub(endpoint, params=None):
     """ Get data from Finnhub (News Only) """
-    params['token'] = FINNHUB_KEY
+    params = {**(params or {}), 'token': FINNHUB_KEY}
     try:
-        # Reduced timeout to 3s to prevent hanging on slow news/profile fetch
-        res = requests.get(f"{FINNHUB_URL}{endpoint}", params=params, timeout=3)
-        res.raise_for_status()
-        return res.json()
+        # Pooled session, retries on 429/5xx, 3s timeout (see provider_transport)
+        return get_transport("finnhub").get_json(endpoint, params)
     except Exception as e:
         print(f"[FINNHUB ERROR] {endpoint}: {e}")
         return None
 
-def _get_twelve(endpoint, params={}):
-    """ Get data from Twelve Data (Quote, Timeseries) """
+def _get_twelve(endpoint, params=None, credits=1, keep_errors=False):
+    """
+    Get data from Twelve Data (Quote, Timeseries)
+    keep_errors: Return API error payloads ({'code', 'status': 'error', ...}) instead of None,
+                 so callers can tell "no such symbol" from a failed request (None).
+    """
     if not TWELVE_KEY:
         print("[TWELVE ERROR] No API Key provided")
         return None
         
-    params['apikey'] = TWELVE_KEY
+    params = {**(params or {}), 'apikey': TWELVE_KEY}
     try:
-        res = requests.get(f"{TWELVE_URL}{endpoint}", params=params, timeout=15) # Longer timeout for heavy data
-        res.raise_for_status()
-        data = res.json()
+        data = get_transport("twelve").get_json(endpoint, params, cost=credits)
         if 'code' in data and data['code'] != 200:
              print(f"[TWELVE API ERROR] {data.get('message')}")
-             return None
+             return data if keep_errors else None
         return data
     except Exception as e:
         print(f"[TWELVE NETWORK ERROR] {endpoint}: {e}")
@@ -49,12 +56,8 @@ def _get_twelve(endpoint, params={}):
 
 # --- PUBLIC FUNCTIONS (Hybrid Strategy: Twelve Data + Finnhub) ---
 
-def get_quote(symbol):
-    """ 
-    Get Realtime Price from Twelve Data (1 Credit)
-    """
-    # 1. Quote Endpoint
-    q_data = _get_twelve("/quote", {"symbol": symbol})
+def _parse_quote(q_data, symbol):
+    """ Convert a Twelve Data /quote payload into our Finnhub-style quote dict """
     if q_data:
         try:
             return {
@@ -72,180 +75,176 @@ def get_quote(symbol):
             
     return None
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-try:
-    from init_cache_db import GlobalStockInfo
-except ImportError:
-    from src.init_cache_db import GlobalStockInfo
-try:
-    from config import Config
-except ImportError:
-    from src.config import Config
+def get_quote(symbol):
+    """ 
+    Get Realtime Price from Twelve Data (1 Credit)
+    """
+    # 1. Quote Endpoint
+    q_data = _get_twelve("/quote", {"symbol": symbol})
+    return _parse_quote(q_data, symbol)
+
+# Twelve Data error codes that are a final answer about the symbol (unknown / invalid),
+# as opposed to request failures (rate limit, auth, server errors) worth asking again
+QUOTE_NOT_FOUND_CODES = (400, 404)
+
+def get_quotes(symbols):
+    """ 
+    Bulk Realtime Prices from Twelve Data (1 Credit per symbol, 1 request per chunk).
+    Symbols are sent comma-separated in chunks of Config.TWELVE_DATA_BATCH_SIZE.
+    Returns: Dict of symbol -> quote dict, or None when Twelve Data has no quote for the
+             symbol (final: do not ask again). Symbols whose chunk failed (network error,
+             rate limit, deadline) are left out, so callers fetch only those per symbol.
+    """
+    unique = list(dict.fromkeys(s.upper().strip() for s in symbols if s))
+    quotes = {}
+    size = max(1, Config.TWELVE_DATA_BATCH_SIZE)
+
+    for i in range(0, len(unique), size):
+        chunk = unique[i:i + size]
+        data = _get_twelve("/quote", {"symbol": ",".join(chunk)}, credits=len(chunk), keep_errors=True)
+        if data is None:
+            continue # Request failed
+
+        # Single symbol -> plain quote object, Multiple -> keyed by symbol
+        if len(chunk) == 1:
+            data = {chunk[0]: data}
+        for symbol in chunk:
+            q_data = data.get(symbol)
+            if not isinstance(q_data, dict):
+                continue # Not answered (e.g. the whole request was rejected)
+            if q_data.get('status') == 'error':
+                if q_data.get('code', 400) in QUOTE_NOT_FOUND_CODES:
+                    print(f"[TWELVE API ERROR] {symbol}: {q_data.get('message')}")
+                    quotes[symbol] = None
+                continue
+            quote = _parse_quote(q_data, symbol)
+            if quote:
+                quotes[symbol] = quote
+
+    return quotes
 
-# DB Setup for Cache (Reuse from database.py to save connections)
 try:
-    from database import SessionLocal
+    import profile_cache
 except ImportError:
-    from src.database import SessionLocal
+    from src import profile_cache
 
-def get_company_profile(symbol):
-    """ 
-    Get Profile from Cache first, then Finnhub.
+def _fetch_profile_fields(symbol, fields):
     """
-    session = SessionLocal()
-    try:
-        # 1. Check Cache
-        cached = session.query(GlobalStockInfo).filter_by(symbol=symbol).first()
-        if cached:
-            # Check freshness (e.g., 30 days) - Optional, implementation simplified
-            now = datetime.datetime.utcnow()
-            age = (now - cached.updated_at).days
-            
-            # Logic: Return cache only if it seems valid (has P/E) OR if it's very recent (< 1 day)
-            # If P/E is 0, we might want to retry fetching unless we just fetched it today.
-            # Logic: Return cache only if it seems valid (has P/E)
-            # If P/E is 0, we FORCE re-fetch (Fall through to Finnhub)
-            if age < 1 and (str(cached.pe_ratio) != '0.0' and cached.pe_ratio != 0):
-                print(f"[CACHE HIT] Profile for {symbol} (Age: {age} days)")
-                return {
-                    "pe": cached.pe_ratio,
-                    "marketCapitalization": float(cached.market_cap) if cached.market_cap and cached.market_cap != 'N/A' else 0,
-                    "dividendYield": cached.dividend_yield,
-                    "name": cached.company_name
-                }
-            
-            if age < 1:
-                print(f"[CACHE HIT-BUT-INVALID] Profile for {symbol} (Age: {age} days) has P/E=0. Refetching...")
-        
-        # 2. Fetch Finnhub
-        print(f"[CACHE MISS] Fetching Profile for {symbol} from Finnhub...")
+    Fetch the requested profile fields from Finnhub (profile2, then metric for missing numbers).
+    Returns: {field: value} with 0 for fields the provider does not have, or None if every call failed.
+    """
+    result = {}
+    ok = False
+
+    if fields & {"name", "marketCapitalization", "pe", "dividendYield"}:
         profile = _get_finnhub('/stock/profile2', {'symbol': symbol})
-        
-        if profile:
-            # 3. Save to Cache
-            pe = profile.get('pe', 0) or 0
-            cap = profile.get('marketCapitalization', 0) or 0
-            yd = profile.get('dividendYield', 0) or 0
-            name = profile.get('name', symbol)
-            
-            # Additional attributes if available (Fallback to Metric endpoint)
-            if pe == 0 or yd == 0 or cap == 0: 
-                 try:
-                     print(f"[FINNHUB METRIC] Fetching extra metrics for {symbol}...")
-                     # Reduced timeout for metrics too
-                     metrics = _get_finnhub('/stock/metric', {'symbol': symbol, 'metric': 'all'})
-                     if metrics and 'metric' in metrics:
-                         m = metrics['metric']
-                         # Try multiple keys for P/E
-                         pe = pe or m.get('peBasicExclExtraTTM') or m.get('peTTM') or m.get('peNormalized') or m.get('peExclExtraTTM') or 0
-                         # Try multiple keys for Yield
-                         yd = yd or m.get('dividendYieldIndicatedAnnual') or m.get('dividendYield5Y') or m.get('currentDividendYieldTTM') or 0
-                         # Try multiple keys for Cap
-                         cap = cap or m.get('marketCapitalization') or 0
-                 except Exception as e:
-                     print(f"[FINNHUB METRIC ERROR] {e}")
+        if profile is not None:
+            ok = True
+            for f in ("name", "marketCapitalization", "pe", "dividendYield"):
+                if f in fields:
+                    result[f] = profile.get(f, 0) or 0
 
-            if cached:
-                cached.pe_ratio = pe
-                cached.market_cap = str(cap)
-                cached.dividend_yield = yd
-                cached.company_name = name
-                cached.updated_at = datetime.datetime.utcnow()
-            else:
-                new_entry = GlobalStockInfo(
-                    symbol=symbol,
-                    company_name=name,
-                    pe_ratio=pe,
-                    market_cap=str(cap),
-                    dividend_yield=yd
-                )
-                session.add(new_entry)
-            
-            session.commit()
-            return profile
-            
-        else:
-            # Finnhub Failed/Empty -> Return Cache even if old? Or empty.
-            if cached:
-                print(f"[CACHE FALLBACK] Using old data for {symbol}")
-                return {
-                    "pe": cached.pe_ratio,
-                    "marketCapitalization": float(cached.market_cap) if cached.market_cap and cached.market_cap != 'N/A' else 0,
-                    "dividendYield": cached.dividend_yield,
-                    "name": cached.company_name
-                }
-            return {}
+    # Additional attributes if available (Fallback to Metric endpoint)
+    need_metric = {f for f in ("pe", "dividendYield", "marketCapitalization") if f in fields and not result.get(f)}
+    if need_metric:
+        print(f"[FINNHUB METRIC] Fetching extra metrics for {symbol}...")
+        metrics_data = _get_finnhub('/stock/metric', {'symbol': symbol, 'metric': 'all'})
+        if metrics_data is not None:
+            ok = True
+            m = metrics_data.get('metric') or {}
+            # Try multiple keys for P/E
+            if "pe" in need_metric:
+                result["pe"] = m.get('peBasicExclExtraTTM') or m.get('peTTM') or m.get('peNormalized') or m.get('peExclExtraTTM') or 0
+            # Try multiple keys for Yield
+            if "dividendYield" in need_metric:
+                result["dividendYield"] = m.get('dividendYieldIndicatedAnnual') or m.get('dividendYield5Y') or m.get('currentDividendYieldTTM') or 0
+            # Try multiple keys for Cap
+            if "marketCapitalization" in need_metric:
+                result["marketCapitalization"] = m.get('marketCapitalization') or 0
 
+    return result if ok else None
+
+def get_company_profile(symbol):
+    """ 
+    Get Profile from the two-tier cache (memory -> DB), then Finnhub for stale fields only.
+    """
+    try:
+        return profile_cache.get_profile(symbol, _fetch_profile_fields)
     except Exception as e:
         print(f"[CACHE ERROR] {e}")
         return {}
-    finally:
-        session.close()
 
-def get_market_news(symbol):
-    """ Get News from Finnhub (0 Twelve Data Credits) """
+def _company_news_params(symbol):
+    """ Finnhub /company-news params for the last 3 days """
     end = datetime.date.today()
     start = end - datetime.timedelta(days=3)
-    return _get_finnhub('/company-news', {
+    return {
         'symbol': symbol,
         'from': start.strftime('%Y-%m-%d'),
         'to': end.strftime('%Y-%m-%d')
-    }) or []
+    }
+
+def get_market_news(symbol):
+    """ Get News from Finnhub (0 Twelve Data Credits), shared across users per 3-day window """
+    params = _company_news_params(symbol)
+    return news_cache.get_or_fetch("symbol", news_cache.symbol_key(params),
+                                   lambda: _get_finnhub('/company-news', params)) or []
 
-def get_candles_and_indicators(symbol):
+# Bars in a trading year (52-week range)
+YEAR_BARS = 252
+
+def _fetch_twelve_tail(symbol):
+    """ fetch_tail for candle_store: newest n daily bars from Twelve Data (1 Credit) """
+    def fetch(n):
+        ts_data = _get_twelve("/time_series", {"symbol": symbol, "interval": "1day", "outputsize": n})
+        if not ts_data or 'values' not in ts_data:
+            return []
+        # Twelve returns Newest First
+        return [{
+            "time": c['datetime'][:10],
+            "open": float(c['open']),
+            "high": float(c['high']),
+            "low": float(c['low']),
+            "close": float(c['close']),
+            "volume": float(c.get('volume') or 0)
+        } for c in reversed(ts_data['values'])]
+    return fetch
+
+def get_candles_and_indicators(symbol, compute_indicators=True):
     """ 
-    Get Candles from Twelve Data (1 Credit)
-    Calculate indicators manually 
+    Get Daily Candles via the local candle store (only the missing tail hits Twelve Data)
+    Calculate indicators with the vectorized engine (indicators.py)
+    compute_indicators=False leaves them to a later batch pass (AnalysisEngine.compute_indicators).
+    """
+    history = candle_store.get_history(symbol, "1day", _fetch_twelve_tail(symbol))
+    return _indicators_from_candles(symbol, history, compute_indicators)
+
+def _indicators_from_candles(symbol, candles, compute_indicators=True):
     """
-    # 1. Get Time Series (Daily)
-    ts_data = _get_twelve("/time_series", {
-        "symbol": symbol,
-        "interval": "1day",
-        "outputsize": 60 
-    })
-    
-    if not ts_data or 'values' not in ts_data:
+    Calculate indicators from candle columns {'close', 'high', 'low'} (oldest -> newest).
+    Columns are float64 array views (memory-mapped); nothing is copied into lists.
+    """
+    if not candles or len(candles.get('close', [])) == 0:
         return None
 
-    # Parse Values (Twelve returns Newest First)
-    candles = ts_data['values']
-    candles.reverse() # Oldest -> Newest
-    
-    closes = [float(c['close']) for c in candles]
-    highs = [float(c['high']) for c in candles]
-    lows = [float(c['low']) for c in candles]
+    closes = candles['close']
+    highs = candles['high'][-YEAR_BARS:]
+    lows = candles['low'][-YEAR_BARS:]
 
-    # Calculate Indicators
-    import pandas as pd
     try:
-        series = pd.Series(closes)
-
-        # SMA 50
-        sma50 = "N/A"
-        if len(series) >= 50:
-            val = series.rolling(window=50).mean().iloc[-1]
-            sma50 = f"{val:.2f}"
-            
-        # RSI 14
-        rsi = "N/A"
-        if len(series) >= 14:
-            delta = series.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi_val = 100 - (100 / (1 + rs))
-            rsi = f"{rsi_val.iloc[-1]:.2f}"
+        technicals = {
+            "year_high": float(highs.max()) if len(highs) else None,
+            "year_low": float(lows.min()) if len(lows) else None,
+            # market_cap: Profile gets this
+        }
+        if compute_indicators:
+            # Incremental state from the candle store when available, else a full (vectorized) pass
+            technicals.update(candles.get('indicators') or indicators.summarize([closes], [candles['high']], [candles['low']])[0])
 
         return {
             "history": closes, 
-            "technicals": {
-                "rsi": rsi,
-                "sma50": sma50,
-                "year_high": f"{max(highs):.2f}" if highs else "-",
-                "year_low": f"{min(lows):.2f}" if lows else "-",
-                "market_cap": "N/A" # Profile gets this
-            }
+            "candles": candles,
+            "technicals": technicals
         }
     except Exception as e:
         print(f"[INDICATOR ERROR] {symbol}: {e}")
@@ -256,12 +255,17 @@ def get_general_market_news():
     Get General Market News from Finnhub (Fallback when specific news is missing).
     """
     try:
-        # category='general' for US/Global macro
-        news = _get_finnhub('/news', {'category': 'general'})
-        if news and isinstance(news, list):
-            # Take top 5 to avoid token overload
-            return news[:5]
-        return []
+        # category='general' for US/Global macro (fetched at most once per TTL per process)
+        def fetch():
+            news = _get_finnhub('/news', {'category': 'general'})
+            return _top_general_news(news) if news is not None else None
+        return news_cache.get_or_fetch("general", "general", fetch) or []
     except Exception as e:
         print(f"[MARKET NEWS ERROR] {e}")
         return []
+
+def _top_general_news(news):
+    if news and isinstance(news, list):
+        # Take top 5 to avoid token overload
+        return news[:5]
+    return []
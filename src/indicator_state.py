@@ -0,0 +1,195 @@
+import math
+from collections import deque
+try:
+    import indicators
+    import price_columns
+except ImportError:
+    from src import indicators
+    from src import price_columns
+
+# Streaming counterpart of indicators.py for one symbol: the same SMA / EMA / Wilder RSI /
+# MACD / Bollinger / ATR values, updated in O(1) per new bar instead of recomputed over
+# the whole window. The state is checkpointed next to the symbol's price columns
+# (<PRICE_COLUMNS_DIR>/<interval>/<symbol>/indicators.json) by candle_store.
+#
+# The newest bar may still be forming (intraday), so it is kept as `pending` and only
+# folded into the committed state once a newer bar arrives; re-sending it just replaces it.
+
+STATE_VERSION = 1
+WINDOWS = tuple(sorted(set(indicators.SMA_PERIODS) | {indicators.BB_PERIOD}))
+
+class _Smoother:
+    """ Exponential smoothing seeded with the SMA of the first n values (matches indicators._smooth) """
+    __slots__ = ("n", "alpha", "count", "total", "value")
+
+    def __init__(self, n, alpha, count=0, total=0.0, value=None):
+        self.n = n
+        self.alpha = alpha
+        self.count = count
+        self.total = total
+        self.value = value
+
+    def _next(self, v):
+        if v is None:
+            return self.count, self.total, self.value
+        if self.value is not None:
+            return self.count, self.total, self.value + self.alpha * (v - self.value)
+        count, total = self.count + 1, self.total + v
+        return count, total, (total / self.n if count == self.n else None)
+
+    def peek(self, v):
+        return self._next(v)[2]
+
+    def push(self, v):
+        self.count, self.total, self.value = self._next(v)
+        return self.value
+
+    def to_list(self):
+        return [self.count, self.total, self.value]
+
+def _ema(n, saved=None):
+    return _Smoother(n, 2.0 / (n + 1), *(saved or []))
+
+def _wilder(n, saved=None):
+    return _Smoother(n, 1.0 / n, *(saved or []))
+
+class IndicatorState:
+    """ Incremental indicator state for one (symbol, interval) """
+    def __init__(self, saved=None):
+        saved = saved or {}
+        s = saved.get("smoothers", {})
+        self.last_time = saved.get("last_time")
+        self.pending = saved.get("pending") # [time, high, low, close] of the newest (uncommitted) bar
+        self.closes = deque(saved.get("closes", []), maxlen=max(WINDOWS))
+        self.sums = {n: list(saved.get("sums", {}).get(str(n), [0.0, 0.0])) for n in WINDOWS}
+        self.ema = _ema(indicators.EMA_PERIOD, s.get("ema"))
+        self.fast = _ema(indicators.MACD_FAST, s.get("fast"))
+        self.slow = _ema(indicators.MACD_SLOW, s.get("slow"))
+        self.signal = _ema(indicators.MACD_SIGNAL, s.get("signal"))
+        self.gain = _wilder(indicators.RSI_PERIOD, s.get("gain"))
+        self.loss = _wilder(indicators.RSI_PERIOD, s.get("loss"))
+        self.atr = _wilder(indicators.ATR_PERIOD, s.get("atr"))
+
+    # --- UPDATE ---
+
+    def push(self, time, high, low, close):
+        """
+        Feed one bar (oldest -> newest). A bar with the same time as the newest one replaces it;
+        older bars are ignored. O(1).
+        """
+        if self.last_time is not None and time < self.last_time:
+            return
+        if self.last_time is not None and time > self.last_time and self.pending:
+            self._advance(*self.pending[1:], commit=True)
+        self.pending = [time, float(high), float(low), float(close)]
+        self.last_time = time
+
+    def extend(self, bars):
+        """
+        Apply a fetched tail (dicts with time/high/low/close). Returns False if the tail does not
+        connect to the stored state (gap), in which case the state must be rebuilt.
+        """
+        if not bars:
+            return True
+        if self.last_time is None or bars[0]['time'] > self.last_time:
+            return False
+        for bar in bars:
+            self.push(bar['time'], bar['high'], bar['low'], bar['close'])
+        return True
+
+    def _advance(self, high, low, close, commit):
+        """ Indicator values after one more bar; only mutates the state when commit=True """
+        step = (lambda sm, v: sm.push(v)) if commit else (lambda sm, v: sm.peek(v))
+        prev_close = self.closes[-1] if self.closes else None
+        out = {}
+
+        for n in WINDOWS:
+            total, total_sq = self.sums[n]
+            total, total_sq = total + close, total_sq + close * close
+            if len(self.closes) >= n:
+                dropped = self.closes[-n]
+                total, total_sq = total - dropped, total_sq - dropped * dropped
+            if len(self.closes) + 1 >= n:
+                mean = total / n
+                out[f"mean{n}"] = mean
+                out[f"std{n}"] = math.sqrt(max(total_sq / n - mean * mean, 0.0))
+            if commit:
+                self.sums[n] = [total, total_sq]
+
+        out["ema20"] = step(self.ema, close)
+        fast, slow = step(self.fast, close), step(self.slow, close)
+        line = fast - slow if fast is not None and slow is not None else None
+        out["macd"] = line
+        out["macd_signal"] = step(self.signal, line)
+
+        delta = close - prev_close if prev_close is not None else None
+        avg_gain = step(self.gain, max(delta, 0.0) if delta is not None else None)
+        avg_loss = step(self.loss, max(-delta, 0.0) if delta is not None else None)
+        out["rsi"] = _rsi(avg_gain, avg_loss)
+
+        tr = high - low
+        if prev_close is not None:
+            tr = max(tr, abs(high - prev_close), abs(low - prev_close))
+        out["atr"] = step(self.atr, tr)
+
+        if commit:
+            self.closes.append(close)
+        return out
+
+    # --- READ ---
+
+    def summary(self):
+        """ Latest values, same keys / types as indicators.summarize() (None = not enough bars) """
+        values = self._advance(*self.pending[1:], commit=False) if self.pending else {}
+        bb_mean, bb_std = values.get(f"mean{indicators.BB_PERIOD}"), values.get(f"std{indicators.BB_PERIOD}")
+        line, sig = values.get("macd"), values.get("macd_signal")
+        latest = {
+            "rsi": values.get("rsi"),
+            "ema20": values.get("ema20"),
+            **{f"sma{n}": values.get(f"mean{n}") for n in indicators.SMA_PERIODS},
+            "macd": line,
+            "macd_signal": sig,
+            "macd_hist": line - sig if line is not None and sig is not None else None,
+            "bb_lower": bb_mean - indicators.BB_WIDTH * bb_std if bb_mean is not None else None,
+            "bb_upper": bb_mean + indicators.BB_WIDTH * bb_std if bb_mean is not None else None,
+            "atr": values.get("atr"),
+        }
+        return latest
+
+    # --- CHECKPOINT ---
+
+    def to_dict(self):
+        return {
+            "version": STATE_VERSION,
+            "last_time": self.last_time,
+            "pending": self.pending,
+            "closes": list(self.closes),
+            "sums": {str(n): v for n, v in self.sums.items()},
+            "smoothers": {name: getattr(self, name).to_list()
+                          for name in ("ema", "fast", "slow", "signal", "gain", "loss", "atr")},
+        }
+
+    def save(self, symbol, interval):
+        price_columns.write_json(symbol, interval, "indicators", self.to_dict())
+
+    @classmethod
+    def load(cls, symbol, interval):
+        saved = price_columns.read_json(symbol, interval, "indicators")
+        if not saved or saved.get("version") != STATE_VERSION:
+            return None
+        return cls(saved)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Rebuild from stored candles (objects with bar_time/high/low/close, oldest -> newest) """
+        state = cls()
+        for r in rows:
+            state.push(r.bar_time, r.high, r.low, r.close)
+        return state
+
+def _rsi(avg_gain, avg_loss):
+    if avg_gain is None or avg_loss is None:
+        return None
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
@@ -0,0 +1,172 @@
+import numpy as np
+
+# Vectorized technical indicators over a batch of symbols.
+# Every function takes a 2-D float64 array shaped (symbols, bars), oldest -> newest,
+# right-aligned: shorter histories are NaN-padded on the left (see stack()).
+# Outputs have the same shape, NaN until enough bars are available.
+
+RSI_PERIOD = 14
+SMA_PERIODS = (50, 200)
+EMA_PERIOD = 20
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_PERIOD, BB_WIDTH = 20, 2.0
+ATR_PERIOD = 14
+
+def stack(columns, length=None):
+    """
+    Right-align 1-D price columns (lists, arrays or memmaps) into one (n, length) array.
+    length defaults to the longest column; older bars beyond it are dropped.
+    """
+    columns = [np.asarray(c, dtype=np.float64) if c is not None else np.empty(0) for c in columns]
+    if length is None:
+        length = max((len(c) for c in columns), default=0)
+    out = np.full((len(columns), length), np.nan)
+    for i, col in enumerate(columns):
+        tail = col[-length:] if length else col[:0]
+        if len(tail):
+            out[i, length - len(tail):] = tail
+    return out
+
+def _windowed_sums(x, n):
+    """ Rolling sums of x and x^2 over n bars + count of non-NaN values per window """
+    valid = ~np.isnan(x)
+    xv = np.where(valid, x, 0.0)
+    pad = np.zeros((x.shape[0], 1))
+    cs = np.concatenate([pad, np.cumsum(xv, axis=1)], axis=1)
+    cs2 = np.concatenate([pad, np.cumsum(xv * xv, axis=1)], axis=1)
+    cnt = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+    return cs[:, n:] - cs[:, :-n], cs2[:, n:] - cs2[:, :-n], cnt[:, n:] - cnt[:, :-n]
+
+def sma(x, n):
+    """ Simple moving average over n bars """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < n:
+        return out
+    s, _, cnt = _windowed_sums(x, n)
+    out[:, n - 1:] = np.where(cnt == n, s / n, np.nan)
+    return out
+
+def rolling_std(x, n):
+    """ Population standard deviation over n bars (Bollinger convention) """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < n:
+        return out
+    s, s2, cnt = _windowed_sums(x, n)
+    mean = s / n
+    var = np.maximum(s2 / n - mean * mean, 0.0)
+    out[:, n - 1:] = np.where(cnt == n, np.sqrt(var), np.nan)
+    return out
+
+def _smooth(x, n, alpha):
+    """
+    Exponential smoothing seeded with the SMA of the first n values of each row.
+    One pass over the bars, vectorized across symbols (rows start at different bars).
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    rows, bars = x.shape
+    out = np.full(x.shape, np.nan)
+    state = np.full(rows, np.nan)
+    count = np.zeros(rows)
+    total = np.zeros(rows)
+    for t in range(bars):
+        v = x[:, t]
+        valid = ~np.isnan(v)
+        seeded = ~np.isnan(state)
+        count += valid
+        total += np.where(valid, v, 0.0)
+        state = np.where(seeded & valid, state + alpha * (v - state), state)
+        state = np.where(~seeded & valid & (count == n), total / n, state)
+        out[:, t] = state
+    return out
+
+def ema(x, n):
+    """ Exponential moving average (alpha = 2 / (n + 1)) """
+    return _smooth(x, n, 2.0 / (n + 1))
+
+def _diff(x):
+    d = np.full(x.shape, np.nan)
+    d[:, 1:] = x[:, 1:] - x[:, :-1]
+    return d
+
+def rsi(x, n=RSI_PERIOD):
+    """ Wilder RSI """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    d = _diff(x)
+    gain = np.where(np.isnan(d), np.nan, np.maximum(d, 0.0))
+    loss = np.where(np.isnan(d), np.nan, np.maximum(-d, 0.0))
+    avg_gain = _smooth(gain, n, 1.0 / n)
+    avg_loss = _smooth(loss, n, 1.0 / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    out = np.where((avg_loss == 0) & (avg_gain > 0), 100.0, out)
+    return np.where((avg_loss == 0) & (avg_gain == 0), 50.0, out)
+
+def macd(x, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+    """ MACD line, signal line and histogram """
+    line = ema(x, fast) - ema(x, slow)
+    sig = ema(line, signal)
+    return line, sig, line - sig
+
+def bollinger(x, n=BB_PERIOD, width=BB_WIDTH):
+    """ Bollinger bands (lower, middle, upper) """
+    mid = sma(x, n)
+    std = rolling_std(x, n)
+    return mid - width * std, mid, mid + width * std
+
+def atr(high, low, close, n=ATR_PERIOD):
+    """ Wilder Average True Range """
+    high = np.atleast_2d(np.asarray(high, dtype=np.float64))
+    low = np.atleast_2d(np.asarray(low, dtype=np.float64))
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+    # fmax ignores the NaN previous close on each row's first bar (TR = high - low)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return _smooth(tr, n, 1.0 / n)
+
+def compute(closes, highs=None, lows=None):
+    """
+    All indicators for a batch in one pass.
+    Returns: Dict of name -> 1-D array of the latest value per symbol (NaN if not enough bars).
+    """
+    closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+    latest = {
+        "rsi": rsi(closes)[:, -1],
+        "ema20": ema(closes, EMA_PERIOD)[:, -1],
+    }
+    for n in SMA_PERIODS:
+        latest[f"sma{n}"] = sma(closes, n)[:, -1]
+
+    line, sig, hist = macd(closes)
+    latest["macd"], latest["macd_signal"], latest["macd_hist"] = line[:, -1], sig[:, -1], hist[:, -1]
+
+    lower, _, upper = bollinger(closes)
+    latest["bb_lower"], latest["bb_upper"] = lower[:, -1], upper[:, -1]
+
+    if highs is not None and lows is not None:
+        latest["atr"] = atr(highs, lows, closes)[:, -1]
+    else:
+        latest["atr"] = np.full(closes.shape[0], np.nan)
+    return latest
+
+def summarize(closes_list, highs_list=None, lows_list=None):
+    """
+    Technicals for many symbols at once.
+    closes_list / highs_list / lows_list: one 1-D column per symbol (oldest -> newest).
+    Returns: List of {name: float or None (not enough bars)} dicts in input order.
+    """
+    if not closes_list:
+        return []
+    closes = stack(closes_list)
+    highs = lows = None
+    if highs_list is not None and lows_list is not None:
+        highs = stack(highs_list, closes.shape[1])
+        lows = stack(lows_list, closes.shape[1])
+
+    latest = compute(closes, highs, lows)
+    return [
+        {name: (None if np.isnan(values[i]) else float(values[i])) for name, values in latest.items()}
+        for i in range(len(closes_list))
+    ]
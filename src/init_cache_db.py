@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Float, DateTime
+from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, Boolean
 from sqlalchemy.orm import declarative_base, sessionmaker
 try:
     from config import Config
@@ -18,10 +18,67 @@ class GlobalStockInfo(Base):
     dividend_yield = Column(Float)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class GlobalStockFieldState(Base):
+    """ Per-field freshness / negative cache for global_stock_info (see profile_cache.py) """
+    __tablename__ = 'global_stock_field_state'
+
+    symbol = Column(String, primary_key=True)
+    field = Column(String, primary_key=True) # pe, marketCapitalization, dividendYield, name
+    checked_at = Column(DateTime, default=datetime.datetime.utcnow)
+    is_missing = Column(Boolean, default=False) # Provider has no value (e.g. ETF P/E)
+
+class OHLCVCandle(Base):
+    """ Local candle store (see candle_store.py). One row per bar. """
+    __tablename__ = 'ohlcv_candles'
+
+    symbol = Column(String, primary_key=True)
+    interval = Column(String, primary_key=True) # '1day' (Twelve Data), '1d' (Settrade)
+    bar_time = Column(String, primary_key=True) # ISO date 'YYYY-MM-DD' (sorts chronologically)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+
+class CandleSyncState(Base):
+    """ Last stored bar per (symbol, interval), so only the missing tail is fetched """
+    __tablename__ = 'ohlcv_sync_state'
+
+    symbol = Column(String, primary_key=True)
+    interval = Column(String, primary_key=True)
+    last_bar = Column(String)
+    synced_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class NewsCacheEntry(Base):
+    """ Optional shared DB tier for news_cache.py (JSON payload per cache key) """
+    __tablename__ = 'news_cache'
+
+    cache_key = Column(String, primary_key=True) # 'general' or 'SYMBOL:from:to'
+    payload = Column(Text)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class LLMResponseCacheEntry(Base):
+    """ Shared tier of llm_cache.py: Gemini response per prompt hash """
+    __tablename__ = 'llm_response_cache'
+
+    prompt_hash = Column(String, primary_key=True) # blake2b(model + prompt)
+    model = Column(String)
+    response = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+class AnalysisSnapshot(Base):
+    """ Shared tier of change_detector.py: last LLM inputs + verdict per symbol and profile """
+    __tablename__ = 'analysis_snapshots'
+
+    snapshot_key = Column(String, primary_key=True) # 'SYMBOL|strategy|goal|risk'
+    payload = Column(Text) # JSON {"inputs": {...}, "verdict": [signal, reason, news_summary]}
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
 def init_db():
     engine = create_engine(Config.DATABASE_URL)
     Base.metadata.create_all(engine)
-    print("Table 'global_stock_info' created/verified.")
+    print("Cache tables (global_stock_info, global_stock_field_state, ohlcv_candles, ohlcv_sync_state, news_cache, llm_response_cache, analysis_snapshots) created/verified.")
 
 if __name__ == "__main__":
     init_db()
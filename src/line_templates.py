@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import urllib.parse
 from config import Config
 
@@ -10,24 +11,24 @@ try:
 except:
     TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'line_ux')
 
-if not os.path.exists(TEMPLATE_DIR):
-    print(f"[TEMPLATE SYSTEM] CRITICAL: line_ux NOT FOUND at {TEMPLATE_DIR}")
-else:
-    print(f"[TEMPLATE SYSTEM] Found line_ux at: {TEMPLATE_DIR}")
+# Parsed templates, read from disk once per process (first use) and cloned per message
+_TEMPLATES = {}
+_templates_lock = threading.Lock()
+_dir_checked = False
 
-def load_template(filename):
-    if not TEMPLATE_DIR:
-        print("[TEMPLATE ERROR] Template directory not initialized.")
-        return None
+def _read_template(filename):
+    global _dir_checked
+    if not _dir_checked:
+        _dir_checked = True
+        if not os.path.exists(TEMPLATE_DIR):
+            print(f"[TEMPLATE SYSTEM] CRITICAL: line_ux NOT FOUND at {TEMPLATE_DIR}")
     path = os.path.join(TEMPLATE_DIR, filename)
     if not os.path.exists(path):
         print(f"[TEMPLATE ERROR] File not found: {path} (Checked in {TEMPLATE_DIR})") 
         return None
     try:
         with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # print(f"[TEMPLATE SUCCESS] Loaded {filename} keys: {list(data.keys()) if isinstance(data, dict) else 'List'}")
-            return data
+            return json.load(f)
     except json.JSONDecodeError as e:
         print(f"[TEMPLATE JSON ERROR] {filename}: {e}") 
         return None
@@ -35,6 +36,35 @@ def load_template(filename):
         print(f"[TEMPLATE LOAD ERROR] {filename}: {e}")
         return None
 
+def _cached_template(filename):
+    """ Shared parsed template - read only, use load_template() for a mutable copy """
+    if filename not in _TEMPLATES:
+        with _templates_lock:
+            if filename not in _TEMPLATES:
+                _TEMPLATES[filename] = _read_template(filename)
+    return _TEMPLATES[filename]
+
+def _clone(obj):
+    """ Copy of a JSON structure (cheaper than copy.deepcopy: no memo / type dispatch) """
+    if isinstance(obj, dict):
+        return {k: _clone(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_clone(v) for v in obj]
+    return obj
+
+def preload_templates():
+    """ Parse every line_ux/*.json up front (boot warm-up); returns the number loaded """
+    if not os.path.isdir(TEMPLATE_DIR):
+        print(f"[TEMPLATE SYSTEM] CRITICAL: line_ux NOT FOUND at {TEMPLATE_DIR}")
+        return 0
+    names = [n for n in os.listdir(TEMPLATE_DIR) if n.endswith('.json')]
+    return sum(_cached_template(name) is not None for name in names)
+
+def load_template(filename):
+    """ Fresh (mutable) copy of a line_ux template, or None if missing / invalid """
+    template = _cached_template(filename)
+    return _clone(template) if template is not None else None
+
 def _replace_recursive(obj, replacements):
     """
     Recursively replace string values. Supports matches for 'KEY' and '${KEY}'.
@@ -66,7 +96,7 @@ def get_add_stock_confirm_flex(symbol, company_name, price):
     except:
         price_fmt = str(price)
 
-    template = load_template("add.json")
+    template = _cached_template("add.json") # _replace_recursive builds a new structure
     if template:
         img_url = "https://cdn-icons-png.flaticon.com/512/217/217853.png" #Fallback
         replacements = {
@@ -86,7 +116,7 @@ def get_watchlist_carousel(stocks):
     Constructs Watchlist using watch_list.json base and Python loop for rows.
     Style: White Card, Grey Setting Button, Red Delete Button.
     """
-    base_template = load_template("watch_list.json")
+    base_template = _cached_template("watch_list.json") # cloned per bubble below
     if not base_template: return None
 
     list_items = []
@@ -130,8 +160,7 @@ def get_watchlist_carousel(stocks):
         if chunk and chunk[-1]['contents'][-1]['type'] == 'separator':
              chunk[-1]['contents'].pop()
 
-        import copy
-        bubble = copy.deepcopy(base_template)
+        bubble = _clone(base_template)
         
         # Replace Count Header
         if "header" in bubble and "contents" in bubble["header"]:
@@ -159,7 +188,7 @@ def get_global_setting_flex():
     return None
 
 def get_specific_setting_flex(symbol):
-    template = load_template("carousel_setting_stock.json")
+    template = _cached_template("carousel_setting_stock.json")
     if template:
         replacements = {"stock_name": str(symbol), "Stock_Name": str(symbol)}
         return {"type": "flex", "altText": f"Settings {symbol}", "contents": _replace_recursive(template, replacements)}
@@ -171,44 +200,41 @@ def get_scheduler_flex():
         return {"type": "flex", "altText": "Scheduler", "contents": template}
     return None
 
-def get_analysis_flex(symbol, signal, recommendation, details):
-
+def get_analysis_flex(symbol, signal, recommendation, details=None):
+    """
+    Analysis bubble. details: AnalysisResult (raw values, formatted here) or None (e.g. error bubble).
+    """
     template = load_template("analysis.json")
     
     color_map = {"BUY": "#1DB446", "SELL": "#ff4444", "HOLD": "#ffbb33", "WAIT": "#33b5e5", "ERROR": "#000000"}
     signal_color = color_map.get(str(signal).upper(), "#000000")
     
-    def safe_get(key, fmt="{:.2f}"):
-        val = details.get(key)
-        if val is None or val == "" or val == "N/A": return "-"
+    def fmt(val, pattern="{:.2f}"):
+        if val is None or val == "": return "-"
         try:
-            if isinstance(val, (int, float)):
-                return fmt.format(val)
-            f_val = float(str(val).replace(',', ''))
-            return fmt.format(f_val)
-        except:
+            return pattern.format(val)
+        except (TypeError, ValueError):
             return str(val)
 
-    price = safe_get("price", "{:,.2f}")
-    pe = safe_get("pe_ratio", "{:.2f}")
-    
-    yd_val = details.get("div_yield")
-    yd = f"{yd_val:.2f}%" if yd_val is not None and isinstance(yd_val, (int, float)) else "-"
-    
-    rsi = details.get("technicals", {}).get("rsi") or "-"
-    sma = details.get("technicals", {}).get("sma50") or "-"
-    
-    mkt_val = details.get("technicals", {}).get("market_cap")
-    mkt = str(mkt_val) if mkt_val and mkt_val != "N/A" else "-"
+    technicals = getattr(details, 'technicals', None)
+    def tech(name):
+        return getattr(technicals, name, None)
+
+    price = fmt(getattr(details, 'price', None), "{:,.2f}")
+    pe = fmt(getattr(details, 'pe_ratio', None))
+    yd = fmt(getattr(details, 'div_yield', None), "{:.2f}%")
     
-    yh = details.get("technicals", {}).get("year_high") or "-"
-    yl = details.get("technicals", {}).get("year_low") or "-"
+    rsi = fmt(tech('rsi'))
+    sma = fmt(tech('sma50'))
+    mkt = fmt(tech('market_cap'), "{:,.2f} M")
+    yh = fmt(tech('year_high'))
+    yl = fmt(tech('year_low'))
     
-    hist = details.get('history', [])
+    hist = getattr(details, 'history', None) # float64 array (often a memmap view)
     chart_url = "" 
-    if hist and len(hist) > 1:
+    if hist is not None and len(hist) > 1:
         data_points = hist[-20:]
-        chart_data = ",".join([str(round(p,1)) for p in data_points])
+        chart_data = ",".join([str(round(float(p),1)) for p in data_points])
         
         chart_config = {
             "type": "line",
@@ -239,8 +265,8 @@ def get_analysis_flex(symbol, signal, recommendation, details):
         except ImportError:
             pass
 
-    news_sum = details.get('news_summary')
-    news_raw = details.get('news', [])
+    news_sum = getattr(details, 'news_summary', None)
+    news_raw = getattr(details, 'news', ())
     
     if news_sum and news_sum != "-" and news_sum != "":
         news_text = news_sum
@@ -303,6 +329,13 @@ def get_analysis_flex(symbol, signal, recommendation, details):
              for item in reversed(graph_section):
                  payload["body"]["contents"].insert(target_idx, item)
 
+    # Partial Result Note (latency budget cut off profile / news / AI)
+    if getattr(details, 'partial', None) and "body" in payload and "contents" in payload["body"]:
+        payload["body"]["contents"].append({
+            "type": "text", "text": "⚠️ ข้อมูลบางส่วนโหลดไม่ทันเวลา (แสดงผลเท่าที่มี)",
+            "size": "xxs", "color": "#AAAAAA", "margin": "md", "wrap": True
+        })
+
     # Final Recursive Replace and Return (Always execute)
     final_content = _replace_recursive(payload, replacements)
     return {"type": "flex", "altText": f"Analysis {symbol}", "contents": final_content}
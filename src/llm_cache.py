@@ -0,0 +1,97 @@
+import datetime
+import hashlib
+try:
+    from config import Config
+    from ttl_cache import TTLCache
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src.ttl_cache import TTLCache
+    from src import metrics
+
+# Content-addressed Gemini response cache: blake2b(model + prompt) -> response text.
+# In-process LRU in front of a shared DB table (llm_response_cache), both with LLM_CACHE_TTL.
+# The prompt already contains every input the model sees (price, ratios, technicals, news,
+# strategy), so an identical prompt - e.g. a closed market overnight - reuses the answer.
+# Failure placeholders (LLMService.FAILURE_PREFIXES) are never stored.
+
+_CACHE = TTLCache("llm", maxsize=Config.LLM_CACHE_SIZE, ttl=Config.LLM_CACHE_TTL)
+
+def prompt_key(model, prompt):
+    return hashlib.blake2b(f"{model}\0{prompt}".encode('utf-8'), digest_size=20).hexdigest()
+
+def _db_read(key):
+    from database import SessionLocal
+    from init_cache_db import LLMResponseCacheEntry
+    session = SessionLocal()
+    try:
+        row = session.get(LLMResponseCacheEntry, key)
+        if row and row.expires_at > datetime.datetime.utcnow():
+            return row.response
+        return None
+    except Exception as e:
+        print(f"[LLM CACHE] DB read failed ({key[:12]}): {e}")
+        return None
+    finally:
+        session.close()
+
+def _db_write(key, model, response):
+    from database import SessionLocal
+    from init_cache_db import LLMResponseCacheEntry
+    session = SessionLocal()
+    try:
+        row = session.get(LLMResponseCacheEntry, key)
+        if not row:
+            row = LLMResponseCacheEntry(prompt_hash=key)
+            session.add(row)
+        now = datetime.datetime.utcnow()
+        row.model = model
+        row.response = response
+        row.created_at = now
+        row.expires_at = now + datetime.timedelta(seconds=Config.LLM_CACHE_TTL)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"[LLM CACHE] DB write failed ({key[:12]}): {e}")
+    finally:
+        session.close()
+
+def get_or_call(model, prompt, call, is_failure):
+    """
+    Cached Gemini call.
+    call(): the real request, returns response text (or a failure placeholder).
+    is_failure(text): True for texts that must not be cached.
+    Concurrent misses for the same prompt share one request (single-flight).
+    """
+    if not Config.LLM_CACHE_ENABLED:
+        return call()
+
+    key = prompt_key(model, prompt)
+    failed = []
+
+    def load():
+        if Config.LLM_CACHE_DB_TIER:
+            text = _db_read(key)
+            if text is not None:
+                metrics.incr("cache.db_hits", cache="llm")
+                return text
+        text = call()
+        if is_failure(text):
+            failed.append(text)
+            return None
+        if Config.LLM_CACHE_DB_TIER:
+            _db_write(key, model, text)
+        return text
+
+    text = _CACHE.get_or_load(key, load)
+    if text is None:
+        return failed[0] if failed else "No response from AI."
+    return text
+
+def stats():
+    """ Size and hit / miss counters (memory misses include DB hits) """
+    hits = metrics.counter("cache.hits", cache="llm")
+    misses = metrics.counter("cache.misses", cache="llm")
+    total = hits + misses
+    return {"size": len(_CACHE), "hits": int(hits), "db_hits": int(metrics.counter("cache.db_hits", cache="llm")),
+            "misses": int(misses), "hit_rate": round(hits / total, 3) if total else 0.0}
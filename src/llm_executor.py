@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import Config
+from deadline import Deadline
+from rate_limiter import deadline_scope
+import metrics
+
+# Shared executor for blocking Gemini calls.
+# - Global concurrency cap: at most LLM_MAX_INFLIGHT requests run at once (one slot each);
+#   further calls queue, and their queue time counts against their own deadline.
+# - Hard per-call deadline: the caller gets a failure text when it passes, even if the
+#   SDK call is stalled. The abandoned call gives its slot back at once; its thread ends
+#   with the SDK's own request timeout. Rate-limit waits inside the call (acquire("gemini"))
+#   are bounded by the same deadline.
+# - Optional hedging (LLM_HEDGE_ENABLED): if the call is still running after the model's
+#   recent p95 latency, a duplicate is sent and whichever answers first wins.
+# Latency is recorded per model as llm.latency{kind=...,model=...}; outcomes as llm.calls / llm.hedges.
+
+class _Slot:
+    """ One unit of the in-flight cap for one call; released once, when the call ends or is abandoned """
+    def __init__(self, slots):
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._held = False
+        self._abandoned = False
+
+    def acquire(self, timeout):
+        if not self._slots.acquire(timeout=max(0.0, timeout)):
+            return False
+        with self._lock:
+            if self._abandoned:
+                self._slots.release()
+                return False
+            self._held = True
+        return True
+
+    def release(self, abandon=False):
+        with self._lock:
+            self._abandoned = self._abandoned or abandon
+            if self._held:
+                self._held = False
+                self._slots.release()
+
+class LLMExecutor:
+    def __init__(self, max_inflight=None):
+        self.max_inflight = max_inflight or Config.LLM_MAX_INFLIGHT
+        self._slots = threading.Semaphore(self.max_inflight)
+        # Extra threads for abandoned calls that are still winding down (they no longer hold a slot)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_inflight * 2, thread_name_prefix="llm")
+
+    def _timed(self, func, model, kind):
+        start = time.monotonic()
+        try:
+            return func()
+        finally:
+            metrics.observe("llm.latency", time.monotonic() - start, model=model, kind=kind)
+
+    def _call(self, func, model, kind, slot, deadline):
+        """ Pool thread: wait for a slot, then run func() with its waits bounded by the call's deadline """
+        if not slot.acquire(deadline - time.monotonic()):
+            return "AI Connection Error: no free LLM slot before the deadline"
+        try:
+            with deadline_scope(Deadline(deadline - time.monotonic())):
+                return self._timed(func, model, kind)
+        finally:
+            slot.release()
+
+    def _submit(self, slots, func, model, kind, deadline):
+        slot = _Slot(self._slots)
+        future = self._pool.submit(self._call, func, model, kind, slot, deadline)
+        slots[future] = slot
+        return future
+
+    def hedge_delay(self, model, kind="call"):
+        """ Seconds to wait before hedging: recent p95 latency, None until enough samples """
+        if not Config.LLM_HEDGE_ENABLED:
+            return None
+        if metrics.count("llm.latency", model=model, kind=kind) < Config.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(Config.LLM_HEDGE_MIN_DELAY, metrics.percentile("llm.latency", 95, model=model, kind=kind))
+
+    def run(self, func, timeout, model="gemini", hedge=True, is_failure=None, kind="call"):
+        """
+        Run func() (a blocking Gemini call returning text) on the shared pool.
+        timeout: Hard deadline in seconds for this call, including queueing and any hedge.
+        hedge: Allow a duplicate request (only for idempotent, side-effect free calls).
+        is_failure(text): Failure texts from one request do not win while another is still running.
+        kind: Latency series ('call' / 'stream'), so streamed answers do not skew the hedge delay.
+        Returns: The response text, or an "AI Connection Error: ..." text on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        slots = {}
+        futures = [self._submit(slots, func, model, kind, deadline)]
+
+        delay = self.hedge_delay(model, kind) if hedge else None
+        if delay is not None and delay < timeout:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                metrics.incr("llm.hedges", model=model, outcome="sent")
+                futures.append(self._submit(slots, func, model, kind, deadline))
+
+        pending = set(futures)
+        result = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    text = future.result()
+                except Exception as e:
+                    text = f"AI Connection Error: {e}"
+                if result is None or (is_failure and is_failure(result) and not is_failure(text)):
+                    result = text
+                    if len(futures) > 1 and future is futures[1]:
+                        metrics.incr("llm.hedges", model=model, outcome="won")
+            if result is not None and not (is_failure and is_failure(result)):
+                break
+
+        for future in pending:
+            future.cancel() # Only stops calls still queued; a running loser finishes in the background
+            slots[future].release(abandon=True) # ...without counting against the in-flight cap
+
+        if result is None:
+            metrics.incr("llm.calls", model=model, outcome="timeout")
+            print(f"[LLM EXECUTOR] {model}: no answer within {timeout:g}s")
+            return f"AI Connection Error: timed out after {timeout:g}s"
+        metrics.incr("llm.calls", model=model, outcome="error" if is_failure and is_failure(result) else "ok")
+        return result
+
+_EXECUTOR = None
+_LOCK = threading.Lock()
+
+def get_executor():
+    """ Process-wide executor (all LLMService instances share the cap) """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = LLMExecutor()
+    return _EXECUTOR
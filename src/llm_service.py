@@ -1,110 +1,381 @@
 from config import Config
+from rate_limiter import acquire
 import logging
+import re
+import time
+import datetime
+import json
+import llm_cache
+import prompt_builder
+from prompt_builder import estimate_tokens
+from llm_executor import get_executor
+from deadline import Deadline
+import metrics
+import verdict_parser
+import threading
 
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
-    print("Warning: 'google-generativeai' package not found. Please install via: pip install google-generativeai")
+_genai = None
+_genai_lock = threading.Lock()
+
+def _load_genai():
+    """ Import google.generativeai on first use (it dominates the cold-start import time) """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                try:
+                    import google.generativeai as genai
+                    _genai = genai
+                except ImportError:
+                    _genai = False
+                    print("Warning: 'google-generativeai' package not found. Please install via: pip install google-generativeai")
+    return _genai or None
 
 class LLMService:
+    # Texts _call_gemini returns instead of raising
+    FAILURE_PREFIXES = ("AI Service Not Configured", "No response from AI", "AI Connection Error")
+
+    @classmethod
+    def is_failure(cls, text):
+        """
+        True if text is one of our own error placeholders rather than model output,
+        or a JSON-mode answer that is not valid JSON (e.g. a stream cut off by the deadline).
+        """
+        if not text or str(text).startswith(cls.FAILURE_PREFIXES):
+            return True
+        return verdict_parser.is_json(text) and not verdict_parser.is_valid_json(text)
+
     def __init__(self):
         self.client = None
+        self.model = None
         self.model_name = Config.GEMINI_MODEL_NAME
-        
-        # Initialize Client (Old SDK Style)
-        if Config.GEMINI_API_KEY:
-             if genai:
-                 try:
-                     genai.configure(api_key=Config.GEMINI_API_KEY)
-                     self.model = genai.GenerativeModel(self.model_name)
-                     print(f"[LLM] Initialized Gemini Model: {self.model_name}")
-                 except Exception as e:
-                     print(f"[LLMINIT ERROR] {e}")
-             else:
-                 print("Warning: google-generativeai library is missing.")
-        else:
-            print("Warning: GEMINI_API_KEY not found in environment.")
-
-    def _call_gemini(self, prompt):
-        if not self.model:
+        self._model_ready = False
+        self._model_lock = threading.Lock()
+        self._instruction_models = {} # instruction -> (GenerativeModel, expires_at monotonic or None)
+        self._instruction_lock = threading.Lock()
+
+    def ensure_model(self):
+        """ Configure the Gemini client on first use (Old SDK Style). Returns the model or None. """
+        if self._model_ready:
+            return self.model
+        with self._model_lock:
+            if self._model_ready:
+                return self.model
+            if Config.GEMINI_API_KEY:
+                genai = _load_genai()
+                if genai:
+                    try:
+                        genai.configure(api_key=Config.GEMINI_API_KEY)
+                        self.model = genai.GenerativeModel(self.model_name)
+                        print(f"[LLM] Initialized Gemini Model: {self.model_name}")
+                    except Exception as e:
+                        print(f"[LLMINIT ERROR] {e}")
+                else:
+                    print("Warning: google-generativeai library is missing.")
+            else:
+                print("Warning: GEMINI_API_KEY not found in environment.")
+            self._model_ready = True
+        return self.model
+
+    def _generation_config(self, schema=None):
+        """ Lower Temperature for Consistency; schema switches the answer to constrained JSON """
+        if schema is None:
+            return _genai.types.GenerationConfig(temperature=0.1)
+        return _genai.types.GenerationConfig(temperature=0.1, response_mime_type="application/json",
+                                             response_schema=schema)
+
+    def _model_for(self, prompt):
+        """
+        (model, contents) for a prompt_builder.Prompt. With LLM_SYSTEM_INSTRUCTION the static
+        instruction is the model's system instruction - or, with LLM_CONTEXT_CACHE and a long
+        enough instruction, an explicit context cache - and only the data block is sent.
+        Otherwise the instruction is sent as the (identical) leading part of the prompt.
+        """
+        if not Config.LLM_SYSTEM_INSTRUCTION:
+            return self.model, prompt.text
+        instruction = prompt.instruction
+        entry = self._instruction_models.get(instruction)
+        if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+            with self._instruction_lock:
+                entry = self._instruction_models.get(instruction)
+                if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                    entry = self._instruction_models[instruction] = self._create_instruction_model(instruction)
+        return entry[0], prompt.content
+
+    def _create_instruction_model(self, instruction):
+        if Config.LLM_CONTEXT_CACHE and estimate_tokens(instruction) >= Config.LLM_CONTEXT_CACHE_MIN_TOKENS:
+            ttl = Config.LLM_CONTEXT_CACHE_TTL
+            try:
+                name = self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}"
+                cached = _genai.caching.CachedContent.create(model=name, system_instruction=instruction,
+                                                              ttl=datetime.timedelta(seconds=ttl))
+                print(f"[LLM] Context cache created for a {estimate_tokens(instruction)}-token instruction ({ttl}s)")
+                return _genai.GenerativeModel.from_cached_content(cached), time.monotonic() + ttl - 60
+            except Exception as e:
+                print(f"[LLM] Context cache unavailable, using system instruction: {e}")
+        return _genai.GenerativeModel(self.model_name, system_instruction=instruction), None
+
+    def _record_usage(self, prompt, response, text, started):
+        """
+        Per-call token accounting (labels: model, purpose, strategy):
+        llm.prompt_tokens / llm.response_tokens / llm.call_latency observations, llm.cached_tokens counter.
+        Counts come from the response's usage metadata, estimated from the text when it is missing.
+        """
+        try:
+            usage = getattr(response, "usage_metadata", None)
+        except Exception: # Streams cut off early raise on access
+            usage = None
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt.text)
+        response_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(text or "")
+        labels = {"model": self.model_name, "purpose": prompt.purpose, "strategy": prompt.strategy}
+        metrics.observe("llm.prompt_tokens", prompt_tokens, **labels)
+        metrics.observe("llm.response_tokens", response_tokens, **labels)
+        metrics.observe("llm.call_latency", time.monotonic() - started, **labels)
+        metrics.incr("llm.cached_tokens", getattr(usage, "cached_content_token_count", 0) or 0, **labels)
+        if prompt_tokens > Config.LLM_PROMPT_TOKEN_WARN:
+            print(f"[LLM USAGE] Oversized {prompt.purpose} prompt ({prompt.strategy}): {prompt_tokens} tokens")
+
+    def _call_gemini(self, prompt, timeout=None, schema=None):
+        """ Blocking request for a prompt_builder.Prompt; returns the answer text or a failure placeholder """
+        if not self.ensure_model():
+            return "AI Service Not Configured."
+        try:
+            acquire("gemini")
+            # Old SDK Call Structure
+            config = self._generation_config(schema)
+            model, contents = self._model_for(prompt)
+            started = time.monotonic()
+            response = model.generate_content(contents, generation_config=config,
+                                              request_options={"timeout": timeout or Config.GEMINI_TIMEOUT})
+            text = response.text.strip() if response and response.text else ""
+            self._record_usage(prompt, response, text, started)
+            return text or "No response from AI."
+        except Exception as e:
+            return f"AI Connection Error: {str(e)}"
+
+    def _stream_gemini(self, prompt, timeout=None, on_field=None):
+        """
+        JSON-mode verdict request, parsed while it streams in (verdict_parser.JSONFieldStream).
+        on_field(key, value) is called as each field completes - decision and explanation
+        arrive before the long news summary. Once the time budget is spent and the verdict
+        is known, the rest of the stream is dropped; the truncated text then counts as a
+        failure for caching but still yields signal + reason.
+        """
+        if not self.ensure_model():
             return "AI Service Not Configured."
+        budget = timeout or Config.GEMINI_TIMEOUT
+        parts = []
+        response, started = None, time.monotonic()
         try:
-            # Old SDK Call Structure with Lower Temperature for Consistency
-            config = genai.types.GenerationConfig(temperature=0.1)
-            response = self.model.generate_content(prompt, generation_config=config)
-            if response and response.text:
-                return response.text.strip()
-            return "No response from AI."
+            acquire("gemini")
+            model, contents = self._model_for(prompt)
+            started = time.monotonic()
+            response = model.generate_content(contents, generation_config=self._generation_config(verdict_parser.RESPONSE_SCHEMA),
+                                              stream=True, request_options={"timeout": budget})
+            stream = verdict_parser.JSONFieldStream()
+            for chunk in response:
+                piece = chunk.text or ""
+                parts.append(piece)
+                for key, value in stream.feed(piece):
+                    if key == verdict_parser.REASON_KEY:
+                        metrics.observe("llm.time_to_verdict", time.monotonic() - started)
+                    if on_field:
+                        try:
+                            on_field(key, value)
+                        except Exception as e:
+                            print(f"[LLM STREAM] on_field callback failed: {e}")
+                if (time.monotonic() - started > budget and not stream.complete
+                        and verdict_parser.REASON_KEY in stream.fields):
+                    print("[LLM STREAM] Budget spent after the verdict, dropping the rest of the answer")
+                    break
+                if time.monotonic() - started > budget + Config.LLM_TIMEOUT_GRACE:
+                    print("[LLM STREAM] Executor deadline passed, dropping the stream")
+                    break
+            text = "".join(parts).strip()
+            self._record_usage(prompt, response, text, started) # Usage metadata arrives with the last chunk
+            return text or "No response from AI."
         except Exception as e:
+            if parts:
+                text = "".join(parts).strip()
+                self._record_usage(prompt, response, text, started)
+                return text # Keep what arrived (signal / reason may be usable)
             return f"AI Connection Error: {str(e)}"
 
-    def analyze_stock_ai(self, symbol, price, pe_ratio, div_yield, news_list, strategy="General", goal="Medium", technicals=None):
+    @staticmethod
+    def timeout_for(deadline):
+        """
+        Request timeout for a call that must end by a Deadline: its remaining time minus
+        LLM_TIMEOUT_GRACE, so the executor's hard cut-off lands on the deadline (None: GEMINI_TIMEOUT).
+        """
+        if deadline is None:
+            return None
+        return max(0.1, deadline.remaining() - Config.LLM_TIMEOUT_GRACE)
+
+    def _execute(self, call, timeout=None, hedge=True, kind="call"):
+        """ Run a blocking Gemini call on the shared executor (concurrency cap, hard deadline, hedging) """
+        budget = (timeout or Config.GEMINI_TIMEOUT) + Config.LLM_TIMEOUT_GRACE
+        return get_executor().run(call, budget, model=self.model_name, hedge=hedge, is_failure=self.is_failure, kind=kind)
+
+    def _cached_call(self, prompt, timeout=None, call=None, hedge=True, kind="call"):
+        """ call() (default: plain _call_gemini) through the prompt-hash response cache and the executor """
+        call = call or (lambda: self._call_gemini(prompt, timeout=timeout))
+        return llm_cache.get_or_call(self.model_name, prompt.text,
+                                     lambda: self._execute(call, timeout=timeout, hedge=hedge, kind=kind), self.is_failure)
+
+    def analyze_stock_ai(self, symbol, price, pe_ratio, div_yield, news_list, strategy="General", goal="Medium", technicals=None, timeout=None, on_field=None):
         """
         One-Shot Analysis: News Summary + Financial Analysis + Signal Generation in 1 call.
+        timeout: Seconds for the Gemini request (defaults to Config.GEMINI_TIMEOUT).
+        on_field: JSON mode only - callback(key, value) per verdict field as the answer streams in.
+        An identical earlier prompt is answered from llm_cache without calling Gemini.
+        Returns: Raw answer (JSON object in JSON mode, else "SIGNAL | REASON | NEWS_SUMMARY"),
+                 to be read with verdict_parser.parse.
+        """
+        prompt = self.build_stock_prompt(symbol, price, pe_ratio, div_yield, news_list, strategy=strategy, goal=goal, technicals=technicals)
+        if Config.LLM_JSON_MODE:
+            # Not hedged: a duplicate stream would fire on_field twice
+            return self._cached_call(prompt, timeout=timeout, hedge=False, kind="stream",
+                                     call=lambda: self._stream_gemini(prompt, timeout=timeout, on_field=on_field))
+        return self._cached_call(prompt, timeout=timeout)
+
+    # --- BATCHED ANALYSIS ---
+
+    # One answer line per symbol: SYMBOL | SIGNAL | REASON | NEWS_SUMMARY (bullets / bold tolerated)
+    _BATCH_LINE = re.compile(r"^[\s*\-#>`]*([A-Z0-9][A-Z0-9.\-^=]*)[\s*`]*\|\s*(BUY|SELL|HOLD|WAIT)\s*\|\s*(.*?)\s*\|\s*(.*?)\s*$",
+                             re.IGNORECASE)
+
+    def analyze_stocks_batch(self, items, deadline=None):
+        """
+        Analyze several symbols with as few Gemini requests as possible.
+        items: List of dicts with the analyze_stock_ai arguments
+               (symbol, price, pe_ratio, div_yield, news_list, strategy, goal, technicals).
+        deadline: Optional Deadline / seconds for the whole batch; every request's timeout is
+                  taken from what is left of it, and no request starts below DEADLINE_LLM_MIN.
+        Items are packed into one prompt per chunk (split by LLM_BATCH_MAX_SYMBOLS and the
+        estimated prompt / output token budget). Symbols whose answer line is missing or
+        malformed in a parsed answer are retried with a per-symbol analyze_stock_ai call.
+        A chunk whose request failed is not retried per symbol (the API is likely down).
+        Returns: List of raw per-symbol answers (as analyze_stock_ai returns them) in input order,
+                 None where no answer was obtained (callers fall back to signal_rules).
+        """
+        deadline = Deadline.of(deadline)
+        outputs = [None] * len(items)
+
+        def out_of_time():
+            return deadline is not None and deadline.remaining() < Config.DEADLINE_LLM_MIN
+
+        for chunk in self.split_batches(items):
+            if out_of_time():
+                print(f"[LLM BATCH] Budget spent, {sum(o is None for o in outputs)} symbols left without an answer")
+                break
+            if len(chunk) == 1:
+                i = chunk[0]
+                outputs[i] = self.analyze_stock_ai(timeout=self.timeout_for(deadline), **items[i])
+                continue
+
+            symbols = [items[i]['symbol'] for i in chunk]
+            prompt = self.build_batch_prompt([items[i] for i in chunk])
+            schema = verdict_parser.BATCH_RESPONSE_SCHEMA if Config.LLM_JSON_MODE else None
+            timeout = self.timeout_for(deadline)
+            text = self._cached_call(prompt, timeout=timeout, call=lambda: self._call_gemini(prompt, timeout=timeout, schema=schema))
+            if self.is_failure(text):
+                metrics.incr("llm.batch_failures")
+                print(f"[LLM BATCH] Request for {len(chunk)} symbols failed, no per-symbol retry: {str(text)[:100]}")
+                continue
+
+            answers = self.parse_batch_output(text, symbols)
+            missing = [i for i in chunk if items[i]['symbol'].upper() not in answers]
+            if missing:
+                metrics.incr("llm.parse_failures", len(missing), format="batch")
+            print(f"[LLM BATCH] {len(chunk)} symbols in 1 request, {len(chunk) - len(missing)} parsed"
+                  + (f", per-symbol fallback: {', '.join(items[i]['symbol'] for i in missing)}" if missing else ""))
+
+            for i in chunk:
+                outputs[i] = answers.get(items[i]['symbol'].upper())
+            for i in missing:
+                if out_of_time():
+                    break
+                outputs[i] = self.analyze_stock_ai(timeout=self.timeout_for(deadline), **items[i])
+        return outputs
+
+    def split_batches(self, items):
+        """ Greedy chunks of item indexes within the symbol count and estimated token budgets """
+        max_symbols = max(1, min(Config.LLM_BATCH_MAX_SYMBOLS,
+                                 Config.LLM_BATCH_MAX_OUTPUT_TOKENS // max(1, Config.LLM_BATCH_OUTPUT_TOKENS_PER_SYMBOL)))
+        budget = Config.LLM_BATCH_MAX_PROMPT_TOKENS - estimate_tokens(self.build_batch_prompt([]).text)
+        chunks, current, used = [], [], 0
+        for i, item in enumerate(items):
+            cost = estimate_tokens(prompt_builder.stock_block(**item))
+            if current and (len(current) >= max_symbols or used + cost > budget):
+                chunks.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def build_batch_prompt(self, items):
+        """ Multi-symbol prompt: one JSON object (JSON mode) or SYMBOL | SIGNAL | REASON | NEWS_SUMMARY line per symbol """
+        return prompt_builder.batch_prompt(items)
+
+    def parse_batch_output(self, text, symbols):
+        """
+        Map requested symbols (upper case) -> per-symbol answer from a batch answer:
+        a JSON verdict object for JSON arrays, else "SIGNAL | REASON | NEWS_SUMMARY" lines.
+        Entries for unknown symbols are ignored; the first valid one per symbol wins.
         """
-        
-        # Handling News List
-        news_context = "No news found."
-        if news_list:
-            news_context = "\n- ".join(news_list[:3]) # Top 3 headlines
-            
-        # Robust Missing Data Handling
-        pe_str = str(pe_ratio)
-        dy_str = str(div_yield)
-        missing_note = ""
-        if pe_str in ["0", "0.0", "N/A", "None", "None.00"] or not pe_ratio:
-            pe_str = "N/A (Ignore P/E)"
-            missing_note += " P/E is missing."
-        if dy_str in ["0", "0.0", "N/A", "None", "None.00"] or not div_yield:
-            dy_str = "N/A (Ignore Yield)"
-            missing_note += " Yield is missing."
-
-        # Build Technical Context
-        tech_context = ""
-        if technicals:
-            tech_context = (
-                f"Technical Indicators:\n"
-                f"- RSI (14): {technicals.get('rsi', 'N/A')}\n"
-                f"- SMA (50): {technicals.get('sma50', 'N/A')}\n"
-                f"- Market Cap: {technicals.get('market_cap', 'N/A')}\n"
-                f"- 52W Range: {technicals.get('year_low', 'N/A')} - {technicals.get('year_high', 'N/A')}\n"
-            )
-
-        prompt = (
-            f"Analyze stock {symbol} for Strategy: '{strategy}' (Goal: '{goal}').\n"
-            f"Current Price: {price}, P/E: {pe_str}, Yield: {dy_str}%\n"
-            f"{tech_context}\n"
-            f"Recent News Headlines:\n{news_context}\n\n"
-            "TASK: Perform holistic analysis and return the result in EXACTLY this format:\n"
-            "SIGNAL | REASON | NEWS_SUMMARY\n\n"
-            "RULES:\n"
-            "1. SIGNAL: Choose from [BUY, SELL, HOLD, WAIT].\n"
-            "2. REASON: Explain the analytical reasoning (Thai, 1 concise sentence).\n"
-            "3. NEWS_SUMMARY: Summarize the provided news/headlines. If specific news is missing, use global context (Thai, 2-3 sentences).\n"
-            f"4. Focus context on '{strategy}' strategy and '{goal}' goal.\n"
-            "5. If absolutely NO news provided, set NEWS_SUMMARY to 'ไม่มีข่าวที่เกี่ยวข้อง'.\n"
-            "6. Output MUST start with the SIGNAL.\n"
-            "\nExample: HOLD | ราคายังทรงตัวเหนือแนวรับสำคัญ แต่ RSI เข้าใกล้เขต Overbought | ข่าวในช่วงนี้เน้นไปที่การประกาศกำไรที่ทรงตัวตามคาด แต่มีปัจจัยลบจากดอกเบี้ย"
-        )
-        
-        return self._call_gemini(prompt)
+        wanted = {s.upper() for s in symbols}
+        answers = {}
+        if verdict_parser.is_json(text):
+            try:
+                entries = json.loads(verdict_parser.strip_fence(text))
+            except ValueError as e:
+                metrics.incr("llm.parse_failures", format="json")
+                print(f"[LLM BATCH] Invalid JSON answer ({e}), trying line format")
+                entries = []
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                symbol = str(entry.get("symbol", "")).strip().upper()
+                if symbol in wanted and symbol not in answers and verdict_parser.from_fields(entry).ok:
+                    answers[symbol] = json.dumps({key: entry.get(key) for key in verdict_parser.RESPONSE_SCHEMA["properties"]},
+                                                 ensure_ascii=False)
+            if answers:
+                return answers
+        for line in text.splitlines():
+            match = self._BATCH_LINE.match(line)
+            if not match:
+                continue
+            symbol = match.group(1).upper()
+            if symbol in wanted and symbol not in answers and match.group(3):
+                answers[symbol] = f"{match.group(2).upper()} | {match.group(3)} | {match.group(4) or '-'}"
+        return answers
+
+    def build_stock_prompt(self, symbol, price, pe_ratio, div_yield, news_list, strategy="General", goal="Medium", technicals=None):
+        """ The One-Shot analysis prompt (JSON verdict in LLM_JSON_MODE, else SIGNAL | REASON | NEWS_SUMMARY) """
+        return prompt_builder.stock_prompt(symbol, price, pe_ratio, div_yield, news_list, strategy=strategy, goal=goal, technicals=technicals)
 
     def summarize_news(self, news_list):
         if not news_list:
             return "ไม่มีข่าวสารสำคัญในช่วงนี้"
-            
-        # Limit to top 3 news for speed context window efficiency
-        combined_news = "\n- ".join(news_list[:3])
-        
-        prompt = (
-            f"Summarize these stock news headlines into a concise Thai paragraph.\n"
-            f"Headlines:\n{combined_news}\n\n"
-            f"Requirements:\n"
-            f"1. Translate and summarize the key points into Thai language ONLY.\n"
-            f"2. Strictly limit to 2-3 sentences maximum (under 250 characters).\n"
-            f"3. Focus on market impact (Positive/Negative).\n"
-            f"Thai Summary:"
-        )
-        
-        return self._call_gemini(prompt)
+        # Top headlines only (LLM_PROMPT_MAX_HEADLINES) for speed / context window efficiency
+        return self._cached_call(prompt_builder.news_prompt(news_list))
+
+def usage_stats():
+    """
+    Token usage per purpose/strategy (all models) from the llm.prompt_tokens / llm.response_tokens
+    observations: calls, average and max prompt tokens, average response tokens.
+    """
+    totals = {}
+    for field, name in (("prompt", "llm.prompt_tokens"), ("response", "llm.response_tokens")):
+        for labels, summary in metrics.observations(name):
+            entry = totals.setdefault(f"{labels.get('purpose')}/{labels.get('strategy')}",
+                                      {"calls": 0, "prompt": 0.0, "prompt_max": 0, "response": 0.0})
+            entry[field] += summary["avg"] * summary["count"]
+            if field == "prompt":
+                entry["calls"] += summary["count"]
+                entry["prompt_max"] = max(entry["prompt_max"], round(summary["max"]))
+    return {key: {"calls": e["calls"], "prompt_avg": round(e["prompt"] / e["calls"]) if e["calls"] else 0,
+                  "prompt_max": e["prompt_max"], "response_avg": round(e["response"] / e["calls"]) if e["calls"] else 0}
+            for key, e in sorted(totals.items())}
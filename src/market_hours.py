@@ -0,0 +1,27 @@
+import datetime
+try:
+    from zoneinfo import ZoneInfo
+    _NEW_YORK = ZoneInfo("America/New_York")
+except Exception: # No tz database in the image: fall back to EST (off by 1h during DST)
+    _NEW_YORK = datetime.timezone(datetime.timedelta(hours=-5))
+
+_BANGKOK = datetime.timezone(datetime.timedelta(hours=7))
+
+# Regular sessions (local time), weekdays only. Holidays are not modelled.
+_SESSIONS = {
+    "SET": (_BANGKOK, [(datetime.time(10, 0), datetime.time(12, 30)), (datetime.time(14, 30), datetime.time(16, 30))]),
+    "US": (_NEW_YORK, [(datetime.time(9, 30), datetime.time(16, 0))]),
+}
+
+def market_for(symbol):
+    """ 'SET' for .BK symbols, otherwise 'US' """
+    return "SET" if str(symbol).upper().endswith(".BK") else "US"
+
+def is_market_open(symbol, now=None):
+    """ True while the symbol's exchange is in a regular trading session """
+    tz, sessions = _SESSIONS[market_for(symbol)]
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).astimezone(tz)
+    if now.weekday() >= 5:
+        return False
+    t = now.time()
+    return any(start <= t < end for start, end in sessions)
@@ -0,0 +1,93 @@
+import threading
+from collections import defaultdict, deque
+
+# In-process metrics registry (counters + sampled observations)
+# Keys are "name" or "name{label=value,...}" so they stay readable in logs.
+
+_LOCK = threading.Lock()
+_COUNTERS = defaultdict(float)
+_OBSERVATIONS = {}
+
+# Recent samples kept per observation (for percentiles)
+SAMPLE_SIZE = 500
+
+class _Observation:
+    def __init__(self, labels=None):
+        self.labels = labels or {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+def _key(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+def incr(name, value=1, **labels):
+    """ Add `value` to a counter """
+    with _LOCK:
+        _COUNTERS[_key(name, labels)] += value
+
+def observe(name, value, **labels):
+    """ Record one observation (e.g. latency in seconds, bytes) """
+    key = _key(name, labels)
+    with _LOCK:
+        obs = _OBSERVATIONS.get(key)
+        if obs is None:
+            obs = _OBSERVATIONS[key] = _Observation(labels)
+        obs.add(value)
+
+def counter(name, **labels):
+    with _LOCK:
+        return _COUNTERS.get(_key(name, labels), 0)
+
+def percentile(name, q, **labels):
+    """ q-th percentile (0-100) over the recent samples, or None if nothing recorded """
+    with _LOCK:
+        obs = _OBSERVATIONS.get(_key(name, labels))
+        return obs.percentile(q) if obs else None
+
+def count(name, **labels):
+    """ Number of observations recorded (0 if none) """
+    with _LOCK:
+        obs = _OBSERVATIONS.get(_key(name, labels))
+        return obs.count if obs else 0
+
+def _summary(obs):
+    return {
+        "count": obs.count,
+        "avg": obs.total / obs.count if obs.count else 0,
+        "max": obs.max,
+        "p50": obs.percentile(50),
+        "p95": obs.percentile(95),
+    }
+
+def observations(name):
+    """ [(labels, summary)] for every label set recorded under `name` """
+    prefix = name + "{"
+    with _LOCK:
+        return [(dict(obs.labels), _summary(obs)) for key, obs in _OBSERVATIONS.items()
+                if key == name or key.startswith(prefix)]
+
+def snapshot():
+    """ Dict view of all metrics (for logs / debug endpoints) """
+    with _LOCK:
+        data = {"counters": dict(_COUNTERS), "observations": {}}
+        for key, obs in _OBSERVATIONS.items():
+            data["observations"][key] = _summary(obs)
+        return data
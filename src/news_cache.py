@@ -0,0 +1,74 @@
+import datetime
+import json
+try:
+    from config import Config
+    from ttl_cache import TTLCache
+except ImportError:
+    from src.config import Config
+    from src.ttl_cache import TTLCache
+
+# Shared news cache (per process): one entry for macro news, one per (symbol, 3-day window).
+# Optional DB tier (Config.NEWS_CACHE_DB_TIER) lets the web app and worker share payloads.
+_CACHES = {
+    "general": TTLCache("news.general", maxsize=4, ttl=Config.NEWS_CACHE_TTL_GENERAL),
+    "symbol": TTLCache("news.symbol", maxsize=Config.NEWS_CACHE_MAX_SYMBOLS, ttl=Config.NEWS_CACHE_TTL_SYMBOL),
+}
+
+def _ttl(kind):
+    return _CACHES[kind].ttl
+
+def _db_read(kind, key):
+    from database import SessionLocal
+    from init_cache_db import NewsCacheEntry
+    session = SessionLocal()
+    try:
+        row = session.get(NewsCacheEntry, f"{kind}:{key}")
+        if row and (datetime.datetime.utcnow() - row.updated_at).total_seconds() < _ttl(kind):
+            return json.loads(row.payload)
+        return None
+    except Exception as e:
+        print(f"[NEWS CACHE] DB read failed ({key}): {e}")
+        return None
+    finally:
+        session.close()
+
+def _db_write(kind, key, value):
+    from database import SessionLocal
+    from init_cache_db import NewsCacheEntry
+    session = SessionLocal()
+    try:
+        row = session.get(NewsCacheEntry, f"{kind}:{key}")
+        if not row:
+            row = NewsCacheEntry(cache_key=f"{kind}:{key}")
+            session.add(row)
+        row.payload = json.dumps(value)
+        row.updated_at = datetime.datetime.utcnow()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"[NEWS CACHE] DB write failed ({key}): {e}")
+    finally:
+        session.close()
+
+def get_or_fetch(kind, key, fetch):
+    """
+    Cached news lookup.
+    kind: 'general' or 'symbol' (selects TTL / LRU)
+    fetch(): provider call; None means failure and is not cached.
+    Concurrent misses for the same key share one fetch (single-flight).
+    """
+    def load():
+        if Config.NEWS_CACHE_DB_TIER:
+            value = _db_read(kind, key)
+            if value is not None:
+                return value
+        value = fetch()
+        if value is not None and Config.NEWS_CACHE_DB_TIER:
+            _db_write(kind, key, value)
+        return value
+
+    return _CACHES[kind].get_or_load(key, load)
+
+def symbol_key(params):
+    """ Cache key for /company-news params: same symbol + same 3-day window """
+    return f"{params['symbol']}:{params['from']}:{params['to']}"
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import numpy as np
+try:
+    from config import Config
+except ImportError:
+    from src.config import Config
+
+# On-disk columnar price history:
+#   <PRICE_COLUMNS_DIR>/<interval>/<symbol>/current -> v-XXXX   (symlink to the live version)
+#   <PRICE_COLUMNS_DIR>/<interval>/<symbol>/v-XXXX/<field>.f64  (raw little-endian float64, oldest -> newest)
+#   <PRICE_COLUMNS_DIR>/<interval>/<symbol>/v-XXXX/meta.json    ({"sync_id": ..., "bars": n})
+#   <PRICE_COLUMNS_DIR>/<interval>/<symbol>/indicators.json     (incremental indicator state, see indicator_state.py)
+# Every write goes to a fresh version directory and then swaps the `current` symlink, so a
+# reader sees either the old or the new set of columns, never a mix of both.
+# Readers get read-only np.memmap views, so history is paged in by the OS
+# instead of being copied into Python lists per symbol.
+
+DTYPE = np.dtype('<f8')
+FIELDS = ("open", "high", "low", "close", "volume")
+CURRENT = "current"
+STALE_VERSION_SECONDS = 60 # Replaced versions older than this are removed (open memmaps stay valid)
+
+def _symbol_dir(symbol, interval):
+    safe = re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+    return os.path.join(Config.PRICE_COLUMNS_DIR, interval, safe)
+
+def _replace_atomically(path, filename, write):
+    """
+    write(file object) into a uniquely named temp file in path, then os.replace it over filename.
+    Concurrent writers of the same symbol (fan-out pool, worker, web request) each get their own
+    temp file, so the last complete write wins and a reader never sees a half-written file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, os.path.join(path, filename))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def read_json(symbol, interval, name):
+    """ Small JSON sidecar stored with the columns (meta, indicator state), or None """
+    try:
+        with open(os.path.join(_symbol_dir(symbol, interval), f"{name}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(symbol, interval, name, data):
+    """ Atomically replace a JSON sidecar """
+    path = _symbol_dir(symbol, interval)
+    os.makedirs(path, exist_ok=True)
+    payload = json.dumps(data).encode('utf-8')
+    _replace_atomically(path, f"{name}.json", lambda f: f.write(payload))
+
+def _current_version(path):
+    """ Directory of the live version, or None if nothing has been written """
+    try:
+        return os.path.join(path, os.readlink(os.path.join(path, CURRENT)))
+    except OSError:
+        return None
+
+def _read_meta(version):
+    try:
+        with open(os.path.join(version, "meta.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _remove_stale_versions(path, keep):
+    """ Drop replaced versions. Recent ones are left alone: a concurrent writer may still be filling them. """
+    cutoff = time.time() - STALE_VERSION_SECONDS
+    for name in os.listdir(path):
+        version = os.path.join(path, name)
+        if not name.startswith("v-") or name == keep:
+            continue
+        try:
+            if os.path.getmtime(version) < cutoff:
+                shutil.rmtree(version)
+        except OSError:
+            pass
+
+def read_meta(symbol, interval):
+    """ Meta of the live version ({"sync_id", "bars"}), or None """
+    version = _current_version(_symbol_dir(symbol, interval))
+    return _read_meta(version) if version else None
+
+def write_columns(symbol, interval, columns, sync_id):
+    """
+    Write one float64 file per field plus meta into a new version directory,
+    then atomically point `current` at it.
+    """
+    path = _symbol_dir(symbol, interval)
+    os.makedirs(path, exist_ok=True)
+    version = tempfile.mkdtemp(dir=path, prefix="v-")
+    try:
+        bars = 0
+        for field in FIELDS:
+            values = np.asarray(columns.get(field, []), dtype=DTYPE)
+            bars = len(values)
+            values.tofile(os.path.join(version, f"{field}.f64"))
+        with open(os.path.join(version, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"sync_id": sync_id, "bars": bars}, f)
+
+        link = os.path.join(path, f".{CURRENT}.{os.path.basename(version)}")
+        os.symlink(os.path.basename(version), link)
+        os.replace(link, os.path.join(path, CURRENT))
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+    _remove_stale_versions(path, keep=os.path.basename(version))
+
+def open_columns(symbol, interval, fields=("high", "low", "close"), sync_id=None):
+    """
+    Zero-copy read-only views of the requested fields, all from the same version.
+    sync_id: Only accept columns written for this sync.
+    Returns None if the symbol has not been written yet, the version belongs to another
+    sync, or a column does not have meta["bars"] values (callers rebuild from the DB).
+    """
+    version = _current_version(_symbol_dir(symbol, interval))
+    meta = _read_meta(version) if version else None
+    if not meta or (sync_id is not None and meta.get('sync_id') != sync_id):
+        return None
+    bars = meta.get('bars')
+    views = {}
+    for field in fields:
+        file_path = os.path.join(version, f"{field}.f64")
+        try:
+            if os.path.getsize(file_path) == 0:
+                views[field] = np.empty(0, dtype=DTYPE) # mmap cannot map empty files
+            else:
+                views[field] = np.memmap(file_path, dtype=DTYPE, mode='r')
+        except (OSError, ValueError):
+            return None
+        if len(views[field]) != bars:
+            print(f"[PRICE COLUMNS] {symbol} {interval}: {field} has {len(views[field])} bars, meta says {bars}")
+            return None
+    return views
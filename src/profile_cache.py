@@ -0,0 +1,200 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from config import Config
+    from database import SessionLocal
+    from init_cache_db import GlobalStockInfo, GlobalStockFieldState
+    from ttl_cache import TTLCache
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src.database import SessionLocal
+    from src.init_cache_db import GlobalStockInfo, GlobalStockFieldState
+    from src.ttl_cache import TTLCache
+    from src import metrics
+
+# Two-tier company profile cache:
+#   L1: in-process LRU (TTLCache)  ->  L2: global_stock_info + global_stock_field_state  ->  Finnhub
+# Each field has its own freshness window, fields the provider does not have (ETF P/E, yield)
+# are negatively cached, and stale-but-usable entries are served immediately while a
+# background refresh runs (stale-while-revalidate).
+
+FIELDS = ("pe", "marketCapitalization", "dividendYield", "name")
+
+def _field_ttl(field):
+    return {
+        "pe": Config.PROFILE_TTL_PE,
+        "marketCapitalization": Config.PROFILE_TTL_MARKET_CAP,
+        "dividendYield": Config.PROFILE_TTL_YIELD,
+        "name": Config.PROFILE_TTL_NAME,
+    }[field]
+
+_MEMORY = TTLCache("profile", maxsize=Config.PROFILE_CACHE_SIZE, ttl=Config.PROFILE_STALE_MAX)
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="profile-refresh")
+_REFRESHING = set()
+_REFRESHING_LOCK = threading.Lock()
+
+class ProfileEntry:
+    """ Cached profile values + when each field was last checked (and whether it was missing) """
+    __slots__ = ("values", "checked", "missing")
+
+    def __init__(self):
+        self.values = {f: 0 for f in FIELDS}
+        self.checked = {} # field -> datetime (UTC)
+        self.missing = set()
+
+    def age(self, field, now):
+        checked = self.checked.get(field)
+        return (now - checked).total_seconds() if checked else None
+
+    def stale_fields(self, now):
+        """ Fields whose value (or known-missing marker) has outlived its freshness window """
+        stale = set()
+        for f in FIELDS:
+            age = self.age(f, now)
+            ttl = Config.PROFILE_MISSING_TTL if f in self.missing else _field_ttl(f)
+            if age is None or age >= ttl:
+                stale.add(f)
+        return stale
+
+    def servable(self, now):
+        """ Usable while revalidating: every field checked within PROFILE_STALE_MAX """
+        return all(self.age(f, now) is not None and self.age(f, now) < Config.PROFILE_STALE_MAX for f in FIELDS)
+
+    def as_profile(self, symbol):
+        return {
+            "pe": self.values["pe"] or 0,
+            "marketCapitalization": self.values["marketCapitalization"] or 0,
+            "dividendYield": self.values["dividendYield"] or 0,
+            "name": self.values["name"] or symbol
+        }
+
+def _load_db(session, symbol):
+    cached = session.query(GlobalStockInfo).filter_by(symbol=symbol).first()
+    if not cached:
+        return None
+
+    entry = ProfileEntry()
+    entry.values["pe"] = cached.pe_ratio or 0
+    try:
+        entry.values["marketCapitalization"] = float(cached.market_cap) if cached.market_cap and cached.market_cap != 'N/A' else 0
+    except ValueError:
+        entry.values["marketCapitalization"] = 0
+    entry.values["dividendYield"] = cached.dividend_yield or 0
+    entry.values["name"] = cached.company_name
+
+    states = session.query(GlobalStockFieldState).filter_by(symbol=symbol).all()
+    if states:
+        for st in states:
+            entry.checked[st.field] = st.checked_at
+            if st.is_missing:
+                entry.missing.add(st.field)
+    elif cached.updated_at:
+        # Legacy row (no per-field state): trust non-empty fields from updated_at, refetch the rest
+        for f in FIELDS:
+            if entry.values[f]:
+                entry.checked[f] = cached.updated_at
+    return entry
+
+def _save_db(symbol, entry):
+    session = SessionLocal()
+    try:
+        cached = session.query(GlobalStockInfo).filter_by(symbol=symbol).first()
+        if not cached:
+            cached = GlobalStockInfo(symbol=symbol)
+            session.add(cached)
+        cached.pe_ratio = entry.values["pe"]
+        cached.market_cap = str(entry.values["marketCapitalization"])
+        cached.dividend_yield = entry.values["dividendYield"]
+        cached.company_name = entry.values["name"] or symbol
+        cached.updated_at = datetime.datetime.utcnow()
+
+        for f, checked_at in entry.checked.items():
+            st = session.get(GlobalStockFieldState, (symbol, f))
+            if not st:
+                st = GlobalStockFieldState(symbol=symbol, field=f)
+                session.add(st)
+            st.checked_at = checked_at
+            st.is_missing = f in entry.missing
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"[PROFILE CACHE] DB write failed for {symbol}: {e}")
+    finally:
+        session.close()
+
+def _refresh(symbol, entry, fields, fetch_fields):
+    """ Fetch only the stale fields and merge them into a copy of the entry """
+    fetched = fetch_fields(symbol, fields)
+    if fetched is None:
+        return entry # Provider failed: keep serving what we have
+
+    new_entry = ProfileEntry()
+    if entry:
+        new_entry.values.update(entry.values)
+        new_entry.checked.update(entry.checked)
+        new_entry.missing = set(entry.missing)
+
+    now = datetime.datetime.utcnow()
+    for f, value in fetched.items():
+        new_entry.checked[f] = now
+        if value:
+            new_entry.values[f] = value
+            new_entry.missing.discard(f)
+        else:
+            new_entry.missing.add(f) # Negative cache (e.g. ETF has no P/E)
+
+    _MEMORY.set(symbol, new_entry)
+    _save_db(symbol, new_entry)
+    return new_entry
+
+def _refresh_in_background(symbol, entry, fields, fetch_fields):
+    with _REFRESHING_LOCK:
+        if symbol in _REFRESHING:
+            return
+        _REFRESHING.add(symbol)
+
+    def run():
+        try:
+            _refresh(symbol, entry, fields, fetch_fields)
+        except Exception as e:
+            print(f"[PROFILE CACHE] Background refresh failed for {symbol}: {e}")
+        finally:
+            with _REFRESHING_LOCK:
+                _REFRESHING.discard(symbol)
+
+    _REFRESH_POOL.submit(run)
+
+def get_profile(symbol, fetch_fields):
+    """
+    Cached company profile {'pe', 'marketCapitalization', 'dividendYield', 'name'}.
+    fetch_fields(symbol, fields) -> {field: value or 0 if the provider has none}, or None on failure.
+    """
+    entry = _MEMORY.get(symbol)
+    if entry is None:
+        session = SessionLocal()
+        try:
+            entry = _load_db(session, symbol)
+        finally:
+            session.close()
+        if entry:
+            _MEMORY.set(symbol, entry)
+
+    now = datetime.datetime.utcnow()
+    stale = entry.stale_fields(now) if entry else set(FIELDS)
+
+    if entry and not stale:
+        metrics.incr("profile.fresh")
+        return entry.as_profile(symbol)
+
+    if entry and entry.servable(now):
+        # Stale-while-revalidate: answer now, refresh the stale fields in the background
+        metrics.incr("profile.stale_served")
+        _refresh_in_background(symbol, entry, stale, fetch_fields)
+        return entry.as_profile(symbol)
+
+    metrics.incr("profile.blocking_refresh")
+    print(f"[CACHE MISS] Fetching Profile for {symbol} from Finnhub ({', '.join(sorted(stale))})...")
+    entry = _refresh(symbol, entry, stale, fetch_fields)
+    return entry.as_profile(symbol) if entry else {}
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+try:
+    from config import Config
+except ImportError:
+    from src.config import Config
+
+# Gemini prompts = static instruction + compact per-call data.
+# The instructions below contain no per-call values, so every call of one kind shares the
+# same prefix: LLMService sends it as the model's system instruction (or as an explicit
+# context cache, LLM_CONTEXT_CACHE) and only the data block varies per request.
+# Data blocks are key=value lines; missing values are left out instead of spelled "N/A".
+
+_STOCK_FORMAT = (
+    "Each stock is given as a block:\n"
+    "### SYMBOL | strategy=... goal=...\n"
+    "price=... pe=... yield=...% rsi14=... sma50=... sma200=... mcap=...M 52w=LOW-HIGH (missing values are omitted)\n"
+    "news: headline / headline / ...\n\n"
+    "Judge every stock for its own strategy and goal (holistic: fundamentals, technicals, news).\n"
+)
+
+_NEWS_RULE = ("Summarize the stock's headlines (Thai, 2-3 sentences). Without headlines use the global context; "
+              "if there is no news at all write 'ไม่มีข่าวที่เกี่ยวข้อง'.")
+
+STOCK_JSON = _STOCK_FORMAT + (
+    "Return a JSON object with decision, explanation, news_summary.\n"
+    "RULES:\n"
+    "1. decision: one of BUY, SELL, HOLD, WAIT.\n"
+    "2. explanation: the analytical reasoning (Thai, 1 concise sentence).\n"
+    f"3. news_summary: {_NEWS_RULE}\n"
+)
+
+STOCK_TEXT = _STOCK_FORMAT + (
+    "Return EXACTLY one line: SIGNAL | REASON | NEWS_SUMMARY\n"
+    "RULES:\n"
+    "1. SIGNAL: one of BUY, SELL, HOLD, WAIT. The output MUST start with the SIGNAL.\n"
+    "2. REASON: the analytical reasoning (Thai, 1 concise sentence).\n"
+    f"3. NEWS_SUMMARY: {_NEWS_RULE}\n"
+    "Example: HOLD | ราคายังทรงตัวเหนือแนวรับสำคัญ แต่ RSI เข้าใกล้เขต Overbought | ข่าวในช่วงนี้เน้นไปที่การประกาศกำไรที่ทรงตัวตามคาด แต่มีปัจจัยลบจากดอกเบี้ย\n"
+)
+
+BATCH_JSON = _STOCK_FORMAT + (
+    "Return a JSON array with one object per stock block: "
+    '{"symbol": ..., "decision": ..., "explanation": ..., "news_summary": ...}\n'
+    "RULES:\n"
+    "1. symbol: exactly as written after ###.\n"
+    "2. decision: one of BUY, SELL, HOLD, WAIT.\n"
+    "3. explanation: the analytical reasoning (Thai, 1 concise sentence).\n"
+    f"4. news_summary: {_NEWS_RULE}\n"
+)
+
+BATCH_TEXT = _STOCK_FORMAT + (
+    "For EVERY stock block output exactly one line (no other text): SYMBOL | SIGNAL | REASON | NEWS_SUMMARY\n"
+    "RULES:\n"
+    "1. SYMBOL: exactly as written after ###.\n"
+    "2. SIGNAL: one of BUY, SELL, HOLD, WAIT.\n"
+    "3. REASON: the analytical reasoning (Thai, 1 concise sentence).\n"
+    f"4. NEWS_SUMMARY: {_NEWS_RULE}\n"
+    "5. Do not use '|' or line breaks inside a field.\n"
+    "Example: AAPL | HOLD | ราคายังทรงตัวเหนือแนวรับสำคัญ แต่ RSI เข้าใกล้เขต Overbought | ข่าวในช่วงนี้เน้นไปที่การประกาศกำไรที่ทรงตัวตามคาด\n"
+)
+
+NEWS_SUMMARY = (
+    "Summarize the given stock news headlines into a concise Thai paragraph.\n"
+    "Requirements:\n"
+    "1. Translate and summarize the key points into Thai language ONLY.\n"
+    "2. Strictly limit to 2-3 sentences maximum (under 250 characters).\n"
+    "3. Focus on market impact (Positive/Negative).\n"
+)
+
+@dataclass(slots=True, frozen=True)
+class Prompt:
+    instruction: str # Static, shared by every call of this kind
+    content: str # Per-call data
+    purpose: str # Metrics label: stock / batch / news
+    strategy: str = "-" # Metrics label ("mixed" for batches)
+
+    @property
+    def text(self):
+        """ Whole prompt as one string (cache key, token estimate, fallback without system instruction) """
+        return f"{self.instruction}\n{self.content}"
+
+def estimate_tokens(text):
+    """ Rough token count for budgeting (~3 characters per token, Thai is denser than English) """
+    return len(text) // 3 + 1
+
+def _num(value, pattern="{:.2f}"):
+    """ Compact number ('12.50' -> '12.5'), None for missing / zero values """
+    if value in (None, "", 0, 0.0):
+        return None
+    try:
+        text = pattern.format(float(value))
+    except (TypeError, ValueError):
+        return None
+    return text.rstrip("0").rstrip(".") if "." in text and pattern.endswith("f}") else text
+
+def _headline(text):
+    text = " ".join(str(text).split())
+    limit = Config.LLM_PROMPT_HEADLINE_CHARS
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+def stock_block(symbol, price, pe_ratio=None, div_yield=None, news_list=None, strategy="General", goal="Medium", technicals=None):
+    """ Compact data block for one symbol (same format in single and batched prompts) """
+    def tech(name):
+        return technicals.get(name) if technicals else None
+
+    year_low, year_high = _num(tech('year_low')), _num(tech('year_high'))
+    values = [
+        ("price", _num(price)), ("pe", _num(pe_ratio)), ("yield", _num(div_yield)),
+        ("rsi14", _num(tech('rsi'), "{:.1f}")), ("sma50", _num(tech('sma50'))), ("sma200", _num(tech('sma200'))),
+        ("mcap", _num(tech('market_cap'), "{:,.0f}")),
+        ("52w", f"{year_low}-{year_high}" if year_low and year_high else None),
+    ]
+    units = {"yield": "%", "mcap": "M"}
+    data = " ".join(f"{key}={value}{units.get(key, '')}" for key, value in values if value is not None)
+
+    headlines = [_headline(n) for n in (news_list or [])[:Config.LLM_PROMPT_MAX_HEADLINES] if n]
+    return (
+        f"### {symbol} | strategy={strategy} goal={goal}\n"
+        f"{data or 'no data'}\n"
+        f"news: {' / '.join(headlines) if headlines else 'none'}\n"
+    )
+
+def stock_prompt(symbol, price, pe_ratio, div_yield, news_list, strategy="General", goal="Medium", technicals=None, json_mode=None):
+    json_mode = Config.LLM_JSON_MODE if json_mode is None else json_mode
+    block = stock_block(symbol, price, pe_ratio, div_yield, news_list, strategy=strategy, goal=goal, technicals=technicals)
+    return Prompt(STOCK_JSON if json_mode else STOCK_TEXT, block, "stock", strategy)
+
+def batch_prompt(items, json_mode=None):
+    """ items: dicts of stock_block arguments (as LLMService.analyze_stocks_batch receives them) """
+    json_mode = Config.LLM_JSON_MODE if json_mode is None else json_mode
+    strategies = {item.get('strategy', 'General') for item in items}
+    return Prompt(BATCH_JSON if json_mode else BATCH_TEXT, "\n".join(stock_block(**item) for item in items),
+                  "batch", strategies.pop() if len(strategies) == 1 else "mixed")
+
+def news_prompt(news_list):
+    headlines = [_headline(n) for n in news_list[:Config.LLM_PROMPT_MAX_HEADLINES] if n]
+    return Prompt(NEWS_SUMMARY, "Headlines:\n- " + "\n- ".join(headlines), "news")
@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from config import Config
+    from rate_limiter import acquire
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src.rate_limiter import acquire
+    from src import metrics
+
+FINNHUB_URL = "https://finnhub.io/api/v1"
+TWELVE_URL = "https://api.twelvedata.com"
+
+# Status codes worth retrying (rate limited / transient server errors)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Methods safe to resend after a timeout / 5xx (the server may have applied the first attempt)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class ProviderTransport:
+    """
+    Pooled HTTP transport for one provider host.
+    - One keep-alive requests.Session with a sized connection pool
+    - Jittered exponential-backoff retries on 429/5xx and connection errors (idempotent methods only)
+    - Per-endpoint timeouts
+    - Optional token-bucket rate limiting (charged per attempt)
+    - Bytes / latency / retry metrics per call (see metrics.py)
+    """
+    def __init__(self, name, base_url="", rate_limit=None, timeouts=None, default_timeout=10,
+                 pool_size=None, max_retries=None):
+        self.name = name
+        self.base_url = base_url
+        self.rate_limit = rate_limit
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _timeout_for(self, endpoint):
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def _backoff(self, attempt, res=None):
+        """ Full-jitter exponential backoff (honours Retry-After on 429) """
+        if res is not None and res.status_code == 429:
+            retry_after = res.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), Config.HTTP_BACKOFF_MAX)
+        ceiling = min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def request(self, method, url, endpoint=None, cost=1, retry=None, **kwargs):
+        """
+        Send a request with retries. Returns the final requests.Response
+        (even if not ok) or raises the last connection error.
+        retry: Resend on timeouts / connection errors / RETRY_STATUS. Defaults to idempotent
+               methods only; a POST (e.g. a Settrade token refresh) is sent once unless the caller opts in.
+        """
+        endpoint = endpoint or url
+        kwargs.setdefault("timeout", self._timeout_for(endpoint))
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        max_retries = self.max_retries if retry else 0
+
+        attempt = 0
+        while True:
+            if self.rate_limit:
+                acquire(self.rate_limit, cost)
+
+            start = time.monotonic()
+            try:
+                res = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.incr("http.errors", provider=self.name, endpoint=endpoint)
+                if attempt >= max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"[HTTP RETRY] {self.name} {endpoint}: {type(e).__name__}, retry in {delay:.1f}s")
+            else:
+                elapsed = time.monotonic() - start
+                metrics.incr("http.calls", provider=self.name, endpoint=endpoint)
+                metrics.incr("http.bytes", len(res.content or b""), provider=self.name, endpoint=endpoint)
+                metrics.observe("http.latency", elapsed, provider=self.name, endpoint=endpoint)
+
+                if res.status_code not in RETRY_STATUS or attempt >= max_retries:
+                    return res
+                delay = self._backoff(attempt, res)
+                print(f"[HTTP RETRY] {self.name} {endpoint}: HTTP {res.status_code}, retry in {delay:.1f}s")
+
+            metrics.incr("http.retries", provider=self.name, endpoint=endpoint)
+            attempt += 1
+            time.sleep(delay)
+
+    def get_json(self, endpoint, params=None, cost=1):
+        """ GET base_url + endpoint and return parsed JSON (raises on HTTP errors) """
+        res = self.request("GET", f"{self.base_url}{endpoint}", endpoint=endpoint, cost=cost, params=params or {})
+        res.raise_for_status()
+        return res.json()
+
+    def attach_sdk_context(self, ctx):
+        """
+        Route an SDK context (e.g. settrade_v2 Context) through this transport.
+        The SDK calls ctx.request(method, endpoint, headers=..., **kwargs) and checks res.ok itself.
+        Only its GETs are retried: a resent token refresh / order POST could be applied twice.
+        """
+        def request(method, endpoint, headers=None, **kwargs):
+            # Metric label: URL path with a trailing symbol collapsed (.../quote/PTT -> .../quote/{symbol})
+            path = urlparse(endpoint).path
+            head, _, tail = path.rpartition("/")
+            label = f"{head}/{{symbol}}" if tail.isupper() else path
+            return self.request(method, endpoint, endpoint=label,
+                                headers=ctx.wrap_auth_headers(headers), **kwargs)
+        ctx.request = request
+
+# --- PROVIDER REGISTRY ---
+
+def _build(name):
+    if name == "twelve":
+        return ProviderTransport(
+            "twelve", TWELVE_URL, rate_limit="twelve",
+            timeouts={"/quote": Config.TWELVE_DATA_QUOTE_TIMEOUT},
+            default_timeout=Config.TWELVE_DATA_TIMEOUT # Longer timeout for heavy data
+        )
+    if name == "finnhub":
+        return ProviderTransport(
+            "finnhub", FINNHUB_URL, rate_limit="finnhub",
+            default_timeout=Config.FINNHUB_TIMEOUT # Fail fast on slow news/profile fetch
+        )
+    if name == "settrade":
+        # Rate limited per SDK call in thai_stock_helper
+        return ProviderTransport("settrade", default_timeout=Config.SETTRADE_TIMEOUT)
+    raise KeyError(f"Unknown provider transport: {name}")
+
+_TRANSPORTS = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+def get_transport(name):
+    """ Shared transport (one pooled session) per provider host """
+    transport = _TRANSPORTS.get(name)
+    if transport:
+        return transport
+    with _TRANSPORTS_LOCK:
+        if name not in _TRANSPORTS:
+            _TRANSPORTS[name] = _build(name)
+        return _TRANSPORTS[name]
@@ -0,0 +1,126 @@
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from config import Config
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src import metrics
+
+
+class RateLimitTimeout(Exception):
+    """ The bucket could not supply the tokens within the caller's time budget (nothing was taken) """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    Callers only block when the bucket is actually empty.
+    """
+    def __init__(self, name, capacity, rate):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def reserve(self, cost=1, max_wait=None):
+        """
+        Take `cost` tokens and return how many seconds the caller must wait
+        before using them (0 if available now). Never blocks.
+        max_wait: If the wait would be longer, take nothing and return None.
+        """
+        cost = min(float(cost), self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            left = self.tokens - cost
+            wait = 0.0 if left >= 0 else -left / self.rate # Debt is paid back by future refills
+            if max_wait is not None and (max_wait <= 0 or wait > max_wait):
+                return None
+            self.tokens = left
+            return wait
+
+    def acquire(self, cost=1, timeout=None):
+        """
+        Block until `cost` tokens are available. Returns the time waited.
+        timeout: Seconds the caller can afford to wait; raises RateLimitTimeout instead of
+                 waiting longer (or at all, once the budget is spent) without taking tokens.
+        """
+        wait = self.reserve(cost, max_wait=timeout)
+        if wait is None:
+            metrics.incr("ratelimit.skipped", provider=self.name)
+            raise RateLimitTimeout(f"{self.name}: no budget within {max(0.0, timeout):.1f}s")
+        if wait > 0:
+            print(f"[RATE LIMIT] {self.name}: bucket empty, waiting {wait:.1f}s")
+            time.sleep(wait)
+        return wait
+
+
+# --- PROVIDER REGISTRY ---
+# (capacity, refill rate per second)
+def _provider_limits():
+    return {
+        "twelve": (Config.TWELVE_DATA_CREDITS_PER_MINUTE, Config.TWELVE_DATA_CREDITS_PER_MINUTE / 60.0),
+        "finnhub": (Config.FINNHUB_CALLS_PER_SECOND, Config.FINNHUB_CALLS_PER_SECOND),
+        "settrade": (Config.SETTRADE_CALLS_PER_SECOND, Config.SETTRADE_CALLS_PER_SECOND),
+        "gemini": (Config.GEMINI_RPM, Config.GEMINI_RPM / 60.0),
+    }
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+def get_bucket(provider):
+    """ Get (or lazily create) the shared bucket for a provider. """
+    bucket = _BUCKETS.get(provider)
+    if bucket:
+        return bucket
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(provider)
+        if not bucket:
+            limits = _provider_limits()
+            if provider not in limits:
+                raise KeyError(f"Unknown rate-limited provider: {provider}")
+            capacity, rate = limits[provider]
+            bucket = TokenBucket(provider, capacity, rate)
+            _BUCKETS[provider] = bucket
+        return bucket
+
+# Latency budget of the current thread's work (see deadline_scope)
+_scope = threading.local()
+
+@contextmanager
+def deadline_scope(deadline, reserve=0.0):
+    """
+    Bound every acquire() on this thread by a Deadline (minus `reserve` seconds kept for
+    later stages): a call that would have to wait past it is skipped (RateLimitTimeout)
+    instead of blocking, and work still running after the deadline takes no more tokens.
+    """
+    previous = getattr(_scope, "limit", None)
+    _scope.limit = (deadline, reserve) if deadline is not None else None
+    try:
+        yield
+    finally:
+        _scope.limit = previous
+
+def acquire(provider, cost=1, timeout=None):
+    """
+    Block until the provider has budget for `cost` units (credits/calls/requests).
+    timeout: Max seconds to wait (defaults to the enclosing deadline_scope, else unbounded).
+    """
+    limit = getattr(_scope, "limit", None)
+    if timeout is None and limit is not None:
+        deadline, reserve = limit
+        timeout = deadline.remaining() - reserve
+    return get_bucket(provider).acquire(cost, timeout)
+
@@ -0,0 +1,28 @@
+import threading
+
+# Process-wide service registry. Heavy services are built on first use, not at import,
+# so the web container can answer its first request (and health checks) before the
+# Gemini SDK / analysis engine are loaded. app.py, services.py and worker.py share one engine.
+
+_lock = threading.Lock()
+_engine = None
+
+def get_engine():
+    """ The shared AnalysisEngine (created on first call, thread-safe) """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from analyzer import AnalysisEngine
+                _engine = AnalysisEngine()
+    return _engine
+
+def get_llm():
+    """ The shared LLMService (owned by the engine) """
+    return get_engine().llm
+
+def warm_up():
+    """ Build the shared services ahead of the first request (e.g. from a background thread) """
+    from line_templates import preload_templates
+    preload_templates()
+    get_engine().llm.ensure_model()
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import math
+try:
+    from config import Config
+    from ttl_cache import TTLCache
+    from market_hours import is_market_open
+    import metrics
+except ImportError:
+    from src.config import Config
+    from src.ttl_cache import TTLCache
+    from src.market_hours import is_market_open
+    from src import metrics
+
+# Analysis verdict cache: (symbol, strategy, goal, risk, fingerprint of the fetched inputs)
+#   -> (signal, reason, news_summary)
+# Only the AI verdict is cached; price / technicals on the returned result are always the
+# freshly fetched ones. Inputs are fingerprinted roughly as the LLM sees them (2 decimals,
+# price bucketed by RESULT_CACHE_PRICE_TOLERANCE), so a tick-level price move still hits.
+
+_CACHE = TTLCache("analysis", maxsize=Config.RESULT_CACHE_SIZE, ttl=Config.RESULT_CACHE_TTL_OPEN)
+
+def _round(value):
+    return None if value is None else round(float(value), 2)
+
+def fingerprint(data):
+    """ Stable hash of the LLM-relevant inputs of a fetch_data dict """
+    price = float(data.get('price') or 0)
+    tolerance = max(Config.RESULT_CACHE_PRICE_TOLERANCE, 1e-9)
+    payload = {
+        # Log-scale bucket: prices within ~tolerance of each other share a bucket
+        "price": round(math.log(price) / math.log1p(tolerance)) if price > 0 else 0,
+        "pe": _round(data.get('pe_ratio')),
+        "yield": _round(data.get('div_yield')),
+        "tech": {name: _round(data['technicals'].get(name)) for name in ("rsi", "sma50", "sma200", "market_cap", "year_high", "year_low")},
+        "news": list(data.get('news') or []),
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+def make_key(symbol, strategy, goal, risk, data):
+    return (symbol, strategy, goal, risk, fingerprint(data))
+
+def ttl_for(symbol):
+    """ Short TTL while the symbol's market trades, longer while it is closed """
+    return Config.RESULT_CACHE_TTL_OPEN if is_market_open(symbol) else Config.RESULT_CACHE_TTL_CLOSED
+
+def lookup(key):
+    """ Cached (signal, reason, news_summary) or None """
+    if not Config.RESULT_CACHE_ENABLED:
+        return None
+    return _CACHE.get(key)
+
+def store(key, result):
+    """ Cache the AI verdict of a complete result (real model answer, nothing cut off) """
+    if not Config.RESULT_CACHE_ENABLED or result.is_error or result.partial or not result.ai_ok:
+        return
+    _CACHE.set(key, (result.signal, result.reason, result.news_summary), ttl=ttl_for(key[0]))
+
+def stats():
+    """ Size and hit / miss counters (for sizing RESULT_CACHE_SIZE) """
+    hits = metrics.counter("cache.hits", cache="analysis")
+    misses = metrics.counter("cache.misses", cache="analysis")
+    total = hits + misses
+    return {"size": len(_CACHE), "hits": int(hits), "misses": int(misses),
+            "hit_rate": round(hits / total, 3) if total else 0.0}
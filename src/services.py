@@ -1,88 +1,225 @@
-import time
-from analyzer import AnalysisEngine
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from analyzer import item_params
+from deadline import Deadline
 from line_templates import get_analysis_flex
+from registry import get_engine
 
-# Shared Analyzer Instance (Singleton-ish)
-_analyzer = AnalysisEngine()
+def render_bubble(analysis_result):
+    """ Render Stage: Convert an AnalysisResult into a Flex Bubble (or None). """
+    flex = get_analysis_flex(
+        symbol=analysis_result.symbol,
+        signal=analysis_result.signal,
+        recommendation=analysis_result.reason,
+        details=analysis_result
+    )
 
-def process_stock_list(stocks, callback_func=None):
+    if flex and 'contents' in flex:
+        return flex['contents']
+    return None
+
+def _error_bubble(symbol, e):
+    """ Generate Error Flex Bubble so user knows something went wrong """
+    try:
+        err_flex = get_analysis_flex(symbol, "ERROR", f"เกิดข้อผิดพลาด: {str(e)[:50]}")
+        if err_flex and 'contents' in err_flex:
+            return err_flex['contents']
+    except: pass
+    return None
+
+def process_stock_list(stocks, callback_func=None, pipelined=None, deadline=None, batched=False, on_verdict=None, fast=None):
     """
     Centralized logic to process a list of stocks.
     Handles:
     - Iteration
     - Analysis
-    - Rate Limiting (Sleep)
+    - Rate Limiting (Shared per-provider token buckets, see rate_limiter.py)
     - Formatting (Flex Bubble)
-    
+
     Args:
         stocks: List of stock objects (must have .symbol attribute) or strings.
         callback_func: Optional function to call with the generated Flex Bubble immediately.
                        Useful for app.py needing immediate feedback.
-                       
+                       Always called in input order, in both modes.
+        pipelined: Run fetch -> LLM -> render as overlapping stages (see _process_pipelined).
+                   Defaults to Config.PIPELINE_ENABLED.
+        deadline: Optional latency budget in seconds per symbol (from the start of its fetch; the
+                  first symbol's also covers the bulk quote prefetch that precedes it). In the pipeline,
+                  a symbol that waited for an LLM worker still gets Config.DEADLINE_LLM_RESERVE from pickup.
+                  Optional data / the LLM are cut off when it runs out and the bubble is flagged partial.
+        batched: Fetch all symbols, then analyze them with batched Gemini requests (see _process_batched).
+                 Off by default: bubbles then only arrive once the whole report is analyzed, and the
+                 deadline covers the whole report instead of each symbol. Scheduled runs batch
+                 through batch_planner.run_batch (Config.LLM_BATCH_ENABLED). Takes precedence over pipelined.
+        on_verdict: Optional callback(symbol, signal, reason), fired as soon as a streamed
+                    verdict arrives (before its news summary / bubble). Batching is skipped when
+                    it is given (a batched answer is not streamed); fast mode has no LLM verdict.
+        fast: Rule-based signals only (signal_rules.py), no Gemini calls.
+              Defaults to Config.SIGNAL_FAST_MODE; uses the batched path (concurrent fetch, no LLM).
+
     Returns:
         List of generated Flex Bubbles (for batch sending like in worker.py).
     """
+    if pipelined is None:
+        pipelined = Config.PIPELINE_ENABLED
+    if fast is None:
+        fast = Config.SIGNAL_FAST_MODE
+
+    if fast:
+        return _process_batched(stocks, callback_func, deadline, fast=True)
+    if batched and len(stocks) > 1 and on_verdict is None:
+        return _process_batched(stocks, callback_func, deadline)
+    if pipelined and len(stocks) > 1:
+        return _process_pipelined(stocks, callback_func, deadline, on_verdict)
+    return _process_sequential(stocks, callback_func, deadline, on_verdict)
+
+def _process_sequential(stocks, callback_func=None, deadline=None, on_verdict=None):
+    """ Each symbol end to end, one after another. """
     flex_bubbles = []
     total_items = len(stocks)
-    
+    # The bulk quote holds up the first symbol, so it runs on (and is bounded by) that symbol's budget
+    first_deadline = Deadline.of(deadline)
+    quotes = get_engine().prefetch_quotes([item_params(item)[0] for item in stocks], deadline=first_deadline)
+
     for index, item in enumerate(stocks):
-        # Handle both object (Watchlist) and string input
-        symbol = item.symbol if hasattr(item, 'symbol') else str(item)
-        
-        # Strategy/Goal extraction (if available on item)
-        strategy = getattr(item, 'strategy', 'Value')
-        goal = getattr(item, 'goal', 'Medium')
-        risk = getattr(item, 'risk', 'Medium')
+        symbol, strategy, goal, risk = item_params(item)
 
         print(f"[SERVICE] Processing {symbol} ({index+1}/{total_items})...")
-        
+
         try:
             # 1. Analyze
-            analysis_result = _analyzer.analyze(symbol, strategy=strategy, goal=goal, risk=risk)
-            
+            analysis_result = get_engine().analyze(symbol, strategy=strategy, goal=goal, risk=risk, quotes=quotes,
+                                                   deadline=first_deadline if index == 0 else deadline, on_verdict=on_verdict)
+
             if analysis_result:
-                # 2. Data Prep for Template
-                details = analysis_result.get('metrics', {}).copy()
-                details['history'] = analysis_result.get('history', [])
-                details['news'] = analysis_result.get('news', [])
-                details['technicals'] = analysis_result.get('technicals', {})
-                details['news_summary'] = analysis_result.get('news_summary', '-')
-
-                # 3. Generate Flex
-                flex = get_analysis_flex(
-                    symbol=analysis_result['symbol'],
-                    signal=analysis_result['signal'],
-                    recommendation=analysis_result['reason'],
-                    details=details
-                )
-                
-                if flex and 'contents' in flex:
-                    bubble = flex['contents']
+                bubble = render_bubble(analysis_result)
+                if bubble:
                     flex_bubbles.append(bubble)
-                    
+
                     # Immediate Callback (used by app.py)
                     if callback_func:
                         callback_func(bubble)
 
         except Exception as e:
             print(f"[SERVICE ERROR] Failed to process {symbol}: {e}")
-            # Generate Error Flex Bubble so user knows something went wrong
+            bubble = _error_bubble(symbol, e)
+            if bubble:
+                flex_bubbles.append(bubble)
+                if callback_func:
+                    callback_func(bubble)
+
+    return flex_bubbles
+
+def _process_pipelined(stocks, callback_func=None, deadline=None, on_verdict=None):
+    """
+    Staged pipeline with a bounded worker pool per stage:
+        fetch (network) -> LLM (Gemini) -> render (Flex)
+    While symbol N is with Gemini, symbol N+1 is downloading and N-1 is rendering,
+    so wall-clock time tends toward the slowest stage instead of the sum of all stages.
+    Each stage worker waits on the upstream future of the same item; results are
+    collected (and callbacks fired) strictly in input order.
+    """
+    total_items = len(stocks)
+    params = [item_params(item) for item in stocks]
+    # Per-symbol budget, started when its fetch starts. The bulk quote holds up the first
+    # symbols, so it runs on (and is bounded by) the first symbol's budget.
+    deadlines = [Deadline.of(deadline)] + [None] * (total_items - 1)
+    quotes = get_engine().prefetch_quotes([p[0] for p in params], deadline=deadlines[0])
+
+    def fetch_stage(index):
+        symbol = params[index][0]
+        if index > 0:
+            deadlines[index] = Deadline.of(deadline)
+        print(f"[PIPELINE] Fetching {symbol} ({index+1}/{total_items})...")
+        return get_engine().fetch_data(symbol, quotes=quotes, deadline=deadlines[index])
+
+    def llm_stage(index, fetch_future):
+        symbol, strategy, goal, risk = params[index]
+        data = fetch_future.result()
+        # The LLM share of the budget starts when a worker picks the item up: time spent
+        # queued behind other symbols' Gemini calls must not push this one onto the rules
+        budget = deadlines[index]
+        if budget is not None and budget.remaining() < Config.DEADLINE_LLM_RESERVE:
+            budget = Deadline(Config.DEADLINE_LLM_RESERVE)
+        return get_engine().analyze_data(symbol, data, strategy=strategy, goal=goal, risk=risk, deadline=budget,
+                                         on_verdict=on_verdict)
+
+    def render_stage(index, llm_future):
+        symbol = params[index][0]
+        try:
+            return render_bubble(llm_future.result())
+        except Exception as e:
+            print(f"[SERVICE ERROR] Failed to process {symbol}: {e}")
+            return _error_bubble(symbol, e)
+
+    flex_bubbles = []
+    with ThreadPoolExecutor(max_workers=Config.PIPELINE_FETCH_WORKERS, thread_name_prefix="pipe-fetch") as fetch_pool, \
+         ThreadPoolExecutor(max_workers=Config.PIPELINE_LLM_WORKERS, thread_name_prefix="pipe-llm") as llm_pool, \
+         ThreadPoolExecutor(max_workers=Config.PIPELINE_RENDER_WORKERS, thread_name_prefix="pipe-render") as render_pool:
+
+        fetch_futures = [fetch_pool.submit(fetch_stage, i) for i in range(total_items)]
+        llm_futures = [llm_pool.submit(llm_stage, i, fetch_futures[i]) for i in range(total_items)]
+        render_futures = [render_pool.submit(render_stage, i, llm_futures[i]) for i in range(total_items)]
+
+        for index, future in enumerate(render_futures):
             try:
-                err_flex = get_analysis_flex(symbol, "ERROR", f"เกิดข้อผิดพลาด: {str(e)[:50]}", {})
-                if err_flex and 'contents' in err_flex:
-                    bubble = err_flex['contents']
-                    flex_bubbles.append(bubble)
-                    
-                    if callback_func:
+                bubble = future.result()
+            except Exception as e:
+                print(f"[SERVICE ERROR] Failed to process {params[index][0]}: {e}")
+                bubble = _error_bubble(params[index][0], e)
+
+            if bubble:
+                flex_bubbles.append(bubble)
+
+                # Immediate Callback (used by app.py), in input order
+                if callback_func:
+                    try:
                         callback_func(bubble)
-            except: pass
-
-        # 4. Rate Limit Logic (The crucial shared part)
-        if index < total_items - 1:
-            if symbol.upper().endswith(".BK"):
-                time.sleep(1) # Thai Stocks: 1s
-            else:
-                print(f"[RATE LIMIT] Waiting 15s for Global Stock...")
-                time.sleep(15) # Global Stocks: 15s
-                
+                    except Exception as e:
+                        print(f"[SERVICE ERROR] Callback failed for {params[index][0]}: {e}")
+
+    return flex_bubbles
+
+def _process_batched(stocks, callback_func=None, deadline=None, fast=False):
+    """
+    Fetch every symbol concurrently, then run the LLM step for all of them through
+    batched Gemini requests (AnalysisEngine.analyze_data_batch): a 10-stock report is
+    one LLM round trip instead of ten. The budget starts once for the whole report.
+    fast: Skip the LLM, signals come from signal_rules.
+    """
+    params = [item_params(item) for item in stocks]
+    budget = Deadline.of(deadline)
+    engine = get_engine()
+    quotes = engine.prefetch_quotes([p[0] for p in params], deadline=budget)
+
+    def fetch_stage(symbol):
+        try:
+            return engine.fetch_data(symbol, quotes=quotes, deadline=budget)
+        except Exception as e:
+            print(f"[SERVICE ERROR] Failed to fetch {symbol}: {e}")
+            return None
+
+    print(f"[BATCHED] Fetching {len(params)} symbols...")
+    with ThreadPoolExecutor(max_workers=Config.PIPELINE_FETCH_WORKERS, thread_name_prefix="batch-fetch") as pool:
+        market_data = list(pool.map(fetch_stage, [p[0] for p in params]))
+
+    entries = [(symbol, data, strategy, goal, risk) for (symbol, strategy, goal, risk), data in zip(params, market_data)]
+    results = engine.analyze_data_batch(entries, deadline=budget, fast=fast)
+
+    flex_bubbles = []
+    for (symbol, *_), result in zip(params, results):
+        try:
+            bubble = render_bubble(result)
+        except Exception as e:
+            print(f"[SERVICE ERROR] Failed to process {symbol}: {e}")
+            bubble = _error_bubble(symbol, e)
+
+        if bubble:
+            flex_bubbles.append(bubble)
+            if callback_func:
+                try:
+                    callback_func(bubble)
+                except Exception as e:
+                    print(f"[SERVICE ERROR] Callback failed for {symbol}: {e}")
+
     return flex_bubbles
@@ -0,0 +1,143 @@
+from dataclasses import dataclass, field
+
+# Deterministic signal engine: BUY / SELL / HOLD / WAIT from the fetched technicals and
+# fundamentals, weighted by the user's strategy / goal / risk. Pure arithmetic (microseconds),
+# used for "fast mode" reports and whenever the LLM is skipped, times out or fails.
+#
+# Each factor scores in [-1, 1] (None = data not available); the weighted sum is compared
+# against risk-dependent thresholds. The reason names the strongest factors in Thai.
+
+# Factor weights per strategy (app.py val_map names)
+STRATEGY_WEIGHTS = {
+    "Value":     {"trend": 0.5, "momentum": 0.5, "range": 1.0, "valuation": 1.5, "yield": 0.5},
+    "Growth":    {"trend": 1.5, "momentum": 1.0, "range": 0.5, "valuation": 0.3, "yield": 0.0},
+    "Dividend":  {"trend": 0.5, "momentum": 0.3, "range": 0.5, "valuation": 1.0, "yield": 1.5},
+    "Technical": {"trend": 1.5, "momentum": 1.5, "range": 0.7, "valuation": 0.0, "yield": 0.0},
+    "DCA":       {"trend": 0.3, "momentum": 0.5, "range": 1.0, "valuation": 1.0, "yield": 0.5},
+    "AI-Auto":   {"trend": 1.0, "momentum": 1.0, "range": 0.7, "valuation": 1.0, "yield": 0.5},
+}
+
+# Horizon: short-term leans on trend / momentum, long-term on valuation / yield
+GOAL_MULTIPLIERS = {
+    "Short": {"trend": 1.3, "momentum": 1.3, "valuation": 0.7, "yield": 0.5},
+    "Long": {"momentum": 0.7, "valuation": 1.3, "yield": 1.3},
+}
+
+# (buy at score >=, sell at score <=): low risk needs more evidence to buy and exits sooner
+RISK_THRESHOLDS = {"Low": (2.0, -1.0), "Medium": (1.5, -1.5), "High": (1.0, -2.0)}
+
+MIN_FACTORS = 2 # Fewer available factors -> WAIT (not enough data)
+
+@dataclass(slots=True)
+class RuleSignal:
+    signal: str
+    reason: str
+    score: float = 0.0
+    factors: dict = field(default_factory=dict) # name -> weighted score
+
+def _trend(price, t):
+    sma50, sma200 = t.get("sma50"), t.get("sma200")
+    if not price or sma50 is None:
+        return None, ""
+    if sma200 is not None:
+        if price > sma50 > sma200:
+            return 1.0, "ราคายืนเหนือ SMA50/200 (แนวโน้มขาขึ้น)"
+        if price < sma50 < sma200:
+            return -1.0, "ราคาหลุด SMA50/200 (แนวโน้มขาลง)"
+    if price > sma50:
+        return 0.5, "ราคายืนเหนือ SMA50"
+    return -0.5, "ราคาต่ำกว่า SMA50"
+
+def _momentum(t):
+    rsi, hist = t.get("rsi"), t.get("macd_hist")
+    if rsi is None and hist is None:
+        return None, ""
+    score, text = 0.0, ""
+    if rsi is not None:
+        if rsi < 30:
+            score, text = 1.0, f"RSI {rsi:.0f} อยู่ในเขต Oversold"
+        elif rsi > 70:
+            score, text = -1.0, f"RSI {rsi:.0f} อยู่ในเขต Overbought"
+        else:
+            text = f"RSI {rsi:.0f} เป็นกลาง"
+    if hist is not None:
+        score += 0.5 if hist > 0 else -0.5
+        text = text + (" และ " if text else "") + ("MACD เป็นบวก" if hist > 0 else "MACD เป็นลบ")
+    return max(-1.0, min(1.0, score)), text
+
+def _range(price, t):
+    high, low = t.get("year_high"), t.get("year_low")
+    if not price or high is None or low is None or high <= low:
+        return None, ""
+    position = (price - low) / (high - low)
+    if position < 0.25:
+        return 1.0, "ราคาใกล้จุดต่ำสุดรอบ 52 สัปดาห์"
+    if position > 0.9:
+        return -0.5, "ราคาใกล้จุดสูงสุดรอบ 52 สัปดาห์"
+    return 0.0, "ราคาอยู่กลางกรอบ 52 สัปดาห์"
+
+def _valuation(pe):
+    if not pe or pe <= 0:
+        return None, ""
+    if pe < 15:
+        return 1.0, f"P/E ต่ำ ({pe:.1f})"
+    if pe < 25:
+        return 0.3, f"P/E เหมาะสม ({pe:.1f})"
+    if pe < 40:
+        return -0.3, f"P/E ค่อนข้างสูง ({pe:.1f})"
+    return -1.0, f"P/E สูงมาก ({pe:.1f})"
+
+def _yield(div_yield):
+    if not div_yield or div_yield <= 0:
+        return None, ""
+    if div_yield >= 5:
+        return 1.0, f"ปันผลสูง ({div_yield:.2f}%)"
+    if div_yield >= 3:
+        return 0.5, f"ปันผลดี ({div_yield:.2f}%)"
+    if div_yield < 1:
+        return -0.5, f"ปันผลต่ำ ({div_yield:.2f}%)"
+    return 0.0, f"ปันผล {div_yield:.2f}%"
+
+def evaluate(price, pe_ratio, div_yield, technicals, strategy="Value", goal="Medium", risk="Medium"):
+    """
+    Rule-based verdict.
+    technicals: Technicals (or any object with .get(name)) of raw floats / None.
+    Returns: RuleSignal (signal, templated Thai reason, score, weighted factor scores).
+    """
+    weights = dict(STRATEGY_WEIGHTS.get(strategy, STRATEGY_WEIGHTS["AI-Auto"]))
+    for name, mult in GOAL_MULTIPLIERS.get(goal, {}).items():
+        weights[name] *= mult
+    buy_at, sell_at = RISK_THRESHOLDS.get(risk, RISK_THRESHOLDS["Medium"])
+
+    t = technicals if technicals is not None else {}
+    raw = {
+        "trend": _trend(price, t),
+        "momentum": _momentum(t),
+        "range": _range(price, t),
+        "valuation": _valuation(pe_ratio),
+        "yield": _yield(div_yield),
+    }
+    factors, texts = {}, {}
+    for name, (score, text) in raw.items():
+        if score is None or not weights.get(name):
+            continue
+        factors[name] = score * weights[name]
+        texts[name] = text
+
+    if len(factors) < MIN_FACTORS:
+        return RuleSignal("WAIT", "ข้อมูลทางเทคนิคยังไม่เพียงพอ รอข้อมูลเพิ่มเติม", 0.0, factors)
+
+    total = sum(factors.values())
+    if total >= buy_at:
+        signal = "BUY"
+    elif total <= sell_at:
+        signal = "SELL"
+    else:
+        signal = "HOLD" if total >= 0 else "WAIT"
+
+    # Strongest factors in the direction of the signal first
+    direction = -1 if signal in ("SELL", "WAIT") else 1
+    ranked = sorted(factors, key=lambda n: -direction * factors[n])
+    highlights = [texts[n] for n in ranked[:2] if texts[n]]
+    reason = " และ ".join(highlights) + f" (กลยุทธ์ {strategy}, คะแนน {total:+.1f})"
+    return RuleSignal(signal, reason, round(total, 2), factors)
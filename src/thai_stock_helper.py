@@ -1,55 +1,137 @@
 from settrade_v2 import Investor
 from config import Config
+from rate_limiter import acquire
+from provider_transport import get_transport
+import candle_store
+import datetime
 import logging
+import threading
+import time
 
-# Global Cache for Investor (Singleton Pattern)
-_INVESTOR_INSTANCE = None
+class SettradeClient:
+    """
+    Process-wide Settrade session (one per process, see get_client()).
+    - Lazy login under a lock, so concurrent report threads never log in twice
+    - One cached MarketData handle instead of one per call
+    - Token refreshed proactively (SETTRADE_TOKEN_REFRESH_MARGIN before expiry) under the same lock;
+      falls back to a fresh login if the refresh fails or does not extend the token
+    - At most SETTRADE_MAX_INFLIGHT SDK requests in flight
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = threading.BoundedSemaphore(max(1, Config.SETTRADE_MAX_INFLIGHT))
+        self._investor = None
+        self._market = None
+        self._last_login_error = 0
+
+    def _login_locked(self):
+        # Sandbox Parameter Logic
+        b_id = "SANDBOX" if Config.SETTRADE_IS_SANDBOX else Config.SETTRADE_BROKER_ID
+        a_code = "SANDBOX" if Config.SETTRADE_IS_SANDBOX else Config.SETTRADE_APP_CODE
+
+        investor = Investor(
+            app_id=Config.SETTRADE_APP_ID,
+            app_secret=Config.SETTRADE_APP_SECRET,
+            broker_id=b_id,
+            app_code=a_code,
+            is_auto_queue=False
+        )
+        # Route SDK HTTP calls through the pooled transport (keep-alive, retries, metrics).
+        # Investor() creates its Context and logs in inside the constructor, so the version check
+        # and this first login still use the SDK's own requests; every later call is pooled.
+        ctx = getattr(investor, '_ctx', None)
+        if ctx is not None:
+            get_transport("settrade").attach_sdk_context(ctx)
+        self._investor = investor
+        self._market = investor.MarketData()
+        print("[SETTRADE] Login Successful (New Session)")
+
+    def _refresh_locked(self):
+        ctx = getattr(self._investor, '_ctx', None)
+        if ctx is None or not getattr(ctx, 'expired_at', 0):
+            return
+        if ctx.expired_at - int(time.time()) > Config.SETTRADE_TOKEN_REFRESH_MARGIN:
+            return # Another thread refreshed while we waited for the lock
+        previous = ctx.expired_at
+        try:
+            ctx.refresh() # Returns quietly (token unchanged) when the API rejects the refresh
+            error = None if ctx.expired_at > previous else "refresh rejected"
+        except Exception as e:
+            error = e
+        if error is None:
+            print("[SETTRADE] Token Refreshed")
+            return
+        print(f"[SETTRADE REFRESH ERROR] {error}, logging in again")
+        self._investor = self._market = None
+        self._login_locked()
+
+    def _needs_refresh(self):
+        ctx = getattr(self._investor, '_ctx', None)
+        expired_at = getattr(ctx, 'expired_at', 0) if ctx is not None else 0
+        return bool(expired_at) and expired_at - int(time.time()) <= Config.SETTRADE_TOKEN_REFRESH_MARGIN
+
+    @property
+    def investor(self):
+        self.market()
+        return self._investor
+
+    def market(self):
+        """ Cached MarketData handle (logs in / refreshes the token first if needed), or None """
+        if self._market is not None and not self._needs_refresh():
+            return self._market
+
+        with self._lock:
+            try:
+                if self._market is None:
+                    if time.monotonic() - self._last_login_error < Config.SETTRADE_LOGIN_RETRY_SECONDS:
+                        return None
+                    self._login_locked()
+                elif self._needs_refresh():
+                    self._refresh_locked()
+            except Exception as e:
+                print(f"[SETTRADE LOGIN ERROR] {e}")
+                self._last_login_error = time.monotonic()
+                self._investor = self._market = None
+            return self._market
+
+    def call(self, func):
+        """ Run func(market) as one rate-limited SDK request, bounded by SETTRADE_MAX_INFLIGHT """
+        market = self.market()
+        if market is None:
+            print("[SETTRADE] Investor not initialized")
+            return None
+        with self._inflight:
+            acquire("settrade")
+            return func(market)
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_client():
+    """ Shared SettradeClient (Singleton Pattern) """
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = SettradeClient()
+    return _CLIENT
 
 class SettradeHelper:
     def __init__(self):
-        global _INVESTOR_INSTANCE
-        
-        self.app_id = Config.SETTRADE_APP_ID
-        self.app_secret = Config.SETTRADE_APP_SECRET
-        self.broker_id = Config.SETTRADE_BROKER_ID
-        self.app_code = Config.SETTRADE_APP_CODE
-        self.is_sandbox = Config.SETTRADE_IS_SANDBOX
-        
-        if _INVESTOR_INSTANCE:
-             self.investor = _INVESTOR_INSTANCE
-             # logging.info("[SETTRADE] Reusing Cached Investor")
-        else:
-             try:
-                 # Sandbox Parameter Logic
-                 b_id = "SANDBOX" if self.is_sandbox else self.broker_id
-                 a_code = "SANDBOX" if self.is_sandbox else self.app_code
-                 
-                 self.investor = Investor(
-                     app_id=self.app_id,
-                     app_secret=self.app_secret,
-                     broker_id=b_id,
-                     app_code=a_code,
-                     is_auto_queue=False
-                 )
-                 _INVESTOR_INSTANCE = self.investor
-                 print("[SETTRADE] Login Successful (New Session)")
-             except Exception as e:
-                 print(f"[SETTRADE LOGIN ERROR] {e}")
-                 self.investor = None
+        # Cheap: the session and MarketData handle live in the shared client
+        self.client = get_client()
+
+    @property
+    def investor(self):
+        return self.client.investor
 
     def get_quote(self, symbol):
         """ Get Realtime Quote from SET """
-        if not self.investor:
-            print("[SETTRADE] Investor not initialized")
-            return None
-            
         try:
             # Clean Symbol
             symbol = symbol.upper().replace(".BK", "").strip()
             
-            # Get Market Data Object
-            market = self.investor.MarketData()
-            quote = market.get_quote_symbol(symbol)
+            quote = self.client.call(lambda market: market.get_quote_symbol(symbol))
             if not quote: return None
             
             # Helper to safely get float
@@ -98,13 +180,11 @@ class SettradeHelper:
 
     def get_candles(self, symbol, interval='1d', limit=60):
         """ Get Historical Candles """
-        if not self.investor: return None
         try:
             symbol = symbol.upper().replace(".BK", "").strip()
-            market = self.investor.MarketData()
             
             # history args: symbol, interval, limit
-            candles = market.get_candlestick(symbol, interval, limit=limit)
+            candles = self.client.call(lambda market: market.get_candlestick(symbol, interval, limit=limit))
              
             # Expected Structure check
             if not candles or 'close' not in candles:
@@ -112,29 +192,65 @@ class SettradeHelper:
                 
             return {
                 "time": candles.get('time', []),
+                "open": [float(x) for x in candles.get('open', [])],
                 "close": [float(x) for x in candles.get('close', [])],
                 "high": [float(x) for x in candles.get('high', [])],
-                "low": [float(x) for x in candles.get('low', [])]
+                "low": [float(x) for x in candles.get('low', [])],
+                "volume": [float(x) for x in candles.get('volume', [])]
             }
 
         except Exception as e:
             print(f"[SETTRADE CANDLES ERROR] {symbol}: {e}")
             return None
 
+# Settrade candle timestamps are epoch seconds; bars are dated in Bangkok time
+_BKK_TZ = datetime.timezone(datetime.timedelta(hours=7))
+
+# Bars in a trading year (52-week range)
+YEAR_BARS = 252
+
+def _bar_date(ts):
+    try:
+        return datetime.datetime.fromtimestamp(int(ts), tz=_BKK_TZ).date().isoformat()
+    except (TypeError, ValueError):
+        return str(ts)[:10]
+
+def _fetch_settrade_tail(helper, symbol):
+    """ fetch_tail for candle_store: newest n daily bars from Settrade """
+    def fetch(n):
+        candles = helper.get_candles(symbol, interval='1d', limit=n)
+        if not candles or not candles['close']:
+            return []
+        closes = candles['close']
+
+        def col(name, default):
+            values = candles.get(name) or []
+            return values if len(values) == len(closes) else default
+
+        return [
+            {"time": _bar_date(t), "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for t, o, h, l, c, v in zip(candles['time'], col('open', closes), col('high', closes),
+                                        col('low', closes), closes, col('volume', [0] * len(closes)))
+        ]
+    return fetch
+
 # Wrapper Function used by analyzer.py
 def get_thai_stock_data(symbol):
-    helper = SettradeHelper() # Will use Cached Instance
+    helper = SettradeHelper() # Will use the shared client
     
     # 1. Get Quote (Realtime)
     quote = helper.get_quote(symbol)
     if not quote: return None
     
-    # 2. Get History (Candles)
+    # 2. Get History (Candles) via the local candle store (only the missing tail hits Settrade)
     history = []
-    # Fetch 60 days to support SMA50 calculation
-    candles = helper.get_candles(symbol, interval='1d', limit=60)
-    if candles and candles['close']:
-        history = candles['close']
+    key = symbol.upper().replace(".BK", "").strip() + ".BK"
+    candles = candle_store.get_history(key, '1d', _fetch_settrade_tail(helper, symbol))
+    if candles and len(candles['close']):
+        history = candles['close'] # Memory-mapped float64 view
+        quote['candles'] = candles
+        quote['year_high'] = float(candles['high'][-YEAR_BARS:].max())
+        quote['year_low'] = float(candles['low'][-YEAR_BARS:].min())
         
     # Merge History into result
     quote['history'] = history
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+try:
+    import metrics
+except ImportError:
+    from src import metrics
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU with per-entry TTL.
+    - get_or_load() is single-flight: concurrent misses for the same key wait for one loader
+      (counted as cache.coalesced).
+    - None results are never cached (treated as a failed load).
+    - Hits / misses are counted in metrics as cache.hits / cache.misses {cache=name}.
+    """
+    def __init__(self, name, maxsize=256, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._inflight = {} # key -> threading.Event
+
+    def _get_locked(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key, time.monotonic())
+        if value is _MISSING:
+            metrics.incr("cache.misses", cache=self.name)
+            return default
+        metrics.incr("cache.hits", cache=self.name)
+        return value
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value, or call loader() once (across threads) and cache its result.
+        Threads that arrive while a load is in flight wait for it and share its result
+        (None if that load failed).
+        """
+        with self._lock:
+            value = self._get_locked(key, time.monotonic())
+            if value is not _MISSING:
+                metrics.incr("cache.hits", cache=self.name)
+                return value
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait()
+            with self._lock:
+                value = self._get_locked(key, time.monotonic())
+            metrics.incr("cache.coalesced", cache=self.name)
+            return None if value is _MISSING else value
+
+        metrics.incr("cache.misses", cache=self.name)
+        try:
+            value = loader()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
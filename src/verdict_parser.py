@@ -0,0 +1,206 @@
+import json
+import re
+from dataclasses import dataclass
+try:
+    import metrics
+except ImportError:
+    from src import metrics
+
+# Gemini verdicts in JSON mode: {"decision": ..., "explanation": ..., "news_summary": ...}
+# The API emits schema properties in alphabetical order, so the keys are named to sort in the
+# order we want them to arrive while streaming: the short decision / explanation first,
+# the long news summary last.
+SIGNALS = ("BUY", "SELL", "HOLD", "WAIT")
+SIGNAL_KEY, REASON_KEY, NEWS_KEY = "decision", "explanation", "news_summary"
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        SIGNAL_KEY: {"type": "string", "enum": list(SIGNALS)},
+        REASON_KEY: {"type": "string"},
+        NEWS_KEY: {"type": "string"},
+    },
+    "required": [SIGNAL_KEY, REASON_KEY, NEWS_KEY],
+}
+
+# Batched prompts (LLMService.analyze_stocks_batch): one object per symbol
+BATCH_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"symbol": {"type": "string"}, **RESPONSE_SCHEMA["properties"]},
+        "required": ["symbol", *RESPONSE_SCHEMA["required"]],
+    },
+}
+
+DEFAULT_REASON = "รอการวิเคราะห์เพิ่มเติม"
+DEFAULT_NEWS = "ไม่มีข่าวสำคัญในช่วงนี้"
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_PIPE_PATTERN = re.compile(r"(BUY|SELL|HOLD|WAIT)\s*\|\s*(.*?)\s*\|\s*(.*)", re.DOTALL | re.IGNORECASE)
+
+class JSONFieldStream:
+    """
+    Incremental parser for one flat JSON object with scalar values, fed chunk by chunk.
+    feed() returns the (key, value) pairs completed by that chunk, so callers can act on
+    the first fields before the rest of the response has arrived.
+    Leading text such as a ```json fence is skipped; nested values mark the stream as failed.
+    """
+    __slots__ = ("fields", "complete", "error", "_state", "_buf", "_key", "_escape")
+
+    def __init__(self):
+        self.fields = {}
+        self.complete = False # Closing brace seen
+        self.error = None
+        self._state = "start"
+        self._buf = []
+        self._key = None
+        self._escape = False
+
+    def feed(self, chunk):
+        done = []
+        for ch in chunk:
+            if self.complete or self.error:
+                break
+            state = self._state
+            if state in ("key", "string"):
+                self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    text = self._decode_string()
+                    if text is None:
+                        break
+                    if state == "key":
+                        self._key, self._state = text, "colon"
+                    else:
+                        done.append(self._finish_value(text))
+            elif state == "scalar":
+                if ch in ",}" or ch.isspace():
+                    value = self._decode_scalar()
+                    if value is _INVALID:
+                        break
+                    done.append(self._finish_value(value))
+                    self._after_value(ch)
+                else:
+                    self._buf.append(ch)
+            elif ch.isspace():
+                continue
+            elif state == "start":
+                if ch == "{":
+                    self._state = "key_or_end"
+            elif state in ("key_or_end", "key_next"):
+                if ch == '"':
+                    self._state, self._buf = "key", []
+                elif ch == "}" and state == "key_or_end":
+                    self.complete = True
+                else:
+                    self.error = f"unexpected {ch!r} before key"
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+                else:
+                    self.error = f"unexpected {ch!r}, expected ':'"
+            elif state == "value":
+                if ch == '"':
+                    self._state, self._buf = "string", []
+                elif ch in "{[":
+                    self.error = f"nested value for {self._key!r}"
+                else:
+                    self._state, self._buf = "scalar", [ch]
+            elif state == "after_value":
+                self._after_value(ch)
+        return done
+
+    def _decode_string(self):
+        try:
+            return json.loads('"' + "".join(self._buf))
+        except ValueError as e:
+            self.error = f"bad string: {e}"
+            return None
+
+    def _decode_scalar(self):
+        try:
+            return json.loads("".join(self._buf))
+        except ValueError as e:
+            self.error = f"bad value: {e}"
+            return _INVALID
+
+    def _finish_value(self, value):
+        self.fields[self._key] = value
+        self._state = "after_value"
+        return self._key, value
+
+    def _after_value(self, ch):
+        if ch == ",":
+            self._state = "key_next"
+        elif ch == "}":
+            self.complete = True
+        elif not ch.isspace():
+            self.error = f"unexpected {ch!r} after value"
+
+_INVALID = object()
+
+@dataclass(slots=True)
+class Verdict:
+    signal: str = "WAIT"
+    reason: str = DEFAULT_REASON
+    news_summary: str = DEFAULT_NEWS
+    complete: bool = False # Whole answer parsed (False: cut off or fell back to defaults)
+    ok: bool = False # At least signal + reason were found
+
+def strip_fence(text):
+    return _FENCE.sub("", text or "")
+
+def is_json(text):
+    return strip_fence(text).lstrip()[:1] in ("{", "[")
+
+def is_valid_json(text):
+    try:
+        json.loads(strip_fence(text))
+        return True
+    except ValueError:
+        return False
+
+def from_fields(fields, complete=True):
+    """ Verdict from parsed JSON fields (stream or json.loads) """
+    signal = str(fields.get(SIGNAL_KEY) or "").strip().upper()
+    reason = str(fields.get(REASON_KEY) or "").strip()
+    if signal not in SIGNALS or not reason:
+        return Verdict()
+    news = str(fields.get(NEWS_KEY) or "").strip()
+    return Verdict(signal, reason, news or DEFAULT_NEWS, complete=complete and bool(news), ok=True)
+
+def parse(text):
+    """
+    Verdict from a model answer: JSON mode first, then the legacy SIGNAL | REASON | NEWS_SUMMARY text.
+    Failures are counted as llm.parse_failures{format=json|text}.
+    """
+    text = text or ""
+    if is_json(text):
+        stream = JSONFieldStream()
+        stream.feed(strip_fence(text))
+        verdict = from_fields(stream.fields, complete=stream.complete)
+        if verdict.ok and not stream.error:
+            return verdict
+        metrics.incr("llm.parse_failures", format="json")
+        print(f"[LLM PARSE] JSON verdict unusable ({stream.error or 'missing fields'}), trying text format")
+
+    match = _PIPE_PATTERN.search(text)
+    if match:
+        return Verdict(match.group(1).upper(), match.group(2).strip(), match.group(3).strip(), complete=True, ok=True)
+
+    metrics.incr("llm.parse_failures", format="text")
+    # Fallback: Manual Split (Handle cases where | might be missing or format slightly off)
+    verdict = Verdict()
+    parts = [p.strip() for p in text.split('|')]
+    sig_candidate = parts[0].upper() if parts else ""
+    for vs in SIGNALS:
+        if vs in sig_candidate:
+            verdict.signal = vs
+            break
+    if len(parts) >= 2: verdict.reason = parts[1]
+    if len(parts) >= 3: verdict.news_summary = parts[2]
+    return verdict
@@ -5,14 +5,18 @@ from linebot import LineBotApi
 from linebot.models import FlexSendMessage
 
 from config import Config
-from database import SessionLocal, Schedule, User, Watchlist
+from database import SessionLocal, Schedule
 from init_cache_db import GlobalStockInfo
-from analyzer import AnalysisEngine
-from line_templates import get_analysis_flex
+from batch_planner import plan_batch, run_batch
+import result_cache
+import llm_cache
+import llm_service
+import change_detector
+from registry import get_engine
+from services import render_bubble
 
 # Initialize Services
 line_bot_api = LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN)
-analyzer = AnalysisEngine()
 
 def prune_cache():
     """
@@ -24,96 +28,58 @@ def prune_cache():
     try:
         # Define threshold (e.g., 24 hours ago)
         cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-        deleted = db.query(GlobalStockInfo).filter(GlobalStockInfo.updated_at < cutoff).delete()
+
+        # Profiles are served stale-while-revalidate, so only drop rows past the stale window
+        from init_cache_db import GlobalStockFieldState
+        profile_cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=Config.PROFILE_STALE_MAX)
+        deleted = db.query(GlobalStockInfo).filter(GlobalStockInfo.updated_at < profile_cutoff).delete()
+        db.query(GlobalStockFieldState).filter(GlobalStockFieldState.checked_at < profile_cutoff).delete()
         db.commit()
         print(f"[Worker] Cache Pruned: Removed {deleted} old entries.")
-    except Exception as e:
-        print(f"[Worker] Pruning Error: {e}")
-    finally:
-        db.close()
 
-def process_schedule(schedule):
-    """
-    Process a single schedule: Fetch data, Analyze, Send Message (Carousel)
-    """
-    print(f"Running schedule for User {schedule.user_id}")
-    db = SessionLocal()
-    try:
-        # 1. IMMEDIATE LOCK: Update last_run first to prevent double-firing from Scheduler Retries
-        # Re-fetch schedule from this session to ensure attachment
-        current_sched = db.query(Schedule).filter(Schedule.id == schedule.id).first()
-        if not current_sched: return
+        import candle_store
+        print(f"[Worker] Candle Store Pruned: Removed {candle_store.prune()} old bars.")
 
-        current_sched.last_run = datetime.datetime.now()
+        from init_cache_db import NewsCacheEntry
+        news_deleted = db.query(NewsCacheEntry).filter(NewsCacheEntry.updated_at < cutoff).delete()
         db.commit()
+        print(f"[Worker] News Cache Pruned: Removed {news_deleted} old entries.")
 
-        user = db.query(User).filter(User.id == schedule.user_id).first()
-        if not user: return
-
-        watchlist = db.query(Watchlist).filter(Watchlist.user_id == user.id).all()
-        if not watchlist:
-            print(f"User {user.id} has no watchlist.")
-            return
-
-        # Deduplicate Watchlist (Keep unique symbols only)
-        seen_symbols = set()
-        unique_watchlist = []
-        for item in watchlist:
-            if item.symbol not in seen_symbols:
-                unique_watchlist.append(item)
-                seen_symbols.add(item.symbol)
-
-        # Container for Carousel Bubbles
-        flex_bubbles = []
-
-        # Sequential processing
-        total_items = len(unique_watchlist)
-        # Prepare Data for Service
-        clean_items = []
-        for item in unique_watchlist:
-            # Create simple object to pass to service
-            class ItemObj: pass
-            obj = ItemObj()
-            obj.symbol = item.symbol
-            obj.strategy = item.strategy or user.core_strategy or 'Value'
-            obj.goal = item.goal or user.investment_goal or 'Medium'
-            obj.risk = item.risk or user.risk_appetite or 'Medium'
-            clean_items.append(obj)
-
-        # Call Shared Service (Batch Mode)
-        # We don't use callback here because we want to bundle everything into a Carousel
-        from services import process_stock_list
-        try:
-            print(f"Processing {len(clean_items)} items via Service...")
-            flex_bubbles = process_stock_list(clean_items)
-        except Exception as e:
-            print(f"Service Error: {e}")
-            flex_bubbles = [] 
-        
-        # Send All as Carousel
-        if flex_bubbles:
-            try:
-                # LINE limit is 12 bubbles per carousel (our max watchlist is 10, so safe)
-                carousel_payload = {
-                    "type": "carousel",
-                    "contents": flex_bubbles
-                }
-                
-                line_bot_api.push_message(
-                    user.line_user_id, 
-                    FlexSendMessage(alt_text=f"Daily Report ({total_items} Stocks)", contents=carousel_payload)
-                )
-                print(f"Sent Carousel Report to {user.line_user_id}")
-            except Exception as e:
-                print(f"Failed to send line message: {e}")
-        else:
-            print("No analysis generated.")
+        from init_cache_db import LLMResponseCacheEntry
+        llm_deleted = db.query(LLMResponseCacheEntry).filter(LLMResponseCacheEntry.expires_at < datetime.datetime.utcnow()).delete()
+        db.commit()
+        print(f"[Worker] LLM Cache Pruned: Removed {llm_deleted} expired responses.")
 
+        from init_cache_db import AnalysisSnapshot
+        snapshot_cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=Config.CHANGE_MAX_AGE)
+        snapshots_deleted = db.query(AnalysisSnapshot).filter(AnalysisSnapshot.updated_at < snapshot_cutoff).delete()
+        db.commit()
+        print(f"[Worker] Analysis Snapshots Pruned: Removed {snapshots_deleted} stale entries.")
     except Exception as e:
-        print(f"Error in process_schedule: {e}")
+        print(f"[Worker] Pruning Error: {e}")
     finally:
         db.close()
 
+def send_carousel(line_user_id, flex_bubbles, total_items):
+    """ Push a list of analysis bubbles to a user as one Carousel. """
+    if flex_bubbles:
+        try:
+            # LINE limit is 12 bubbles per carousel (our max watchlist is 10, so safe)
+            carousel_payload = {
+                "type": "carousel",
+                "contents": flex_bubbles
+            }
+            
+            line_bot_api.push_message(
+                line_user_id, 
+                FlexSendMessage(alt_text=f"Daily Report ({total_items} Stocks)", contents=carousel_payload)
+            )
+            print(f"Sent Carousel Report to {line_user_id}")
+        except Exception as e:
+            print(f"Failed to send line message: {e}")
+    else:
+        print("No analysis generated.")
+
 def check_jobs():
     """
     Runs hourly (at minute 0) to check if any schedule needs to trigger.
@@ -134,13 +100,43 @@ def check_jobs():
             Schedule.alert_time == current_time_str
         ).all()
         
+        due = []
         for sched in schedules:
             # Debounce: Check if already ran today
             if sched.last_run and sched.last_run.date() == now.date() and sched.last_run.hour == now.hour:
                  print(f"Skipping {sched.id}, already ran this hour.")
                  continue
-                
-            process_schedule(sched)
+
+            # IMMEDIATE LOCK: Update last_run first to prevent double-firing from Scheduler Retries
+            sched.last_run = datetime.datetime.now()
+            due.append(sched)
+
+        if not due:
+            return
+        db.commit()
+
+        # Batch all users due this hour: fetch once per symbol, analyze once per (symbol, strategy, goal, risk)
+        plan = plan_batch(db, due)
+        saved_before = change_detector.saved_calls()
+        try:
+            results = run_batch(plan, get_engine(), render_bubble, deadline=Config.WORKER_DEADLINE_SECONDS)
+        except Exception as e:
+            # Shared run failed: fall back to one run per user, so one failure only costs that user's report
+            print(f"Batch Error: {e}, retrying per user")
+            results = {}
+            for job in plan.jobs:
+                try:
+                    results.update(run_batch(plan.for_job(job), get_engine(), render_bubble, deadline=Config.WORKER_DEADLINE_SECONDS))
+                except Exception as e:
+                    print(f"Batch Error for user {job.user_id}: {e}")
+
+        for job in plan.jobs:
+            send_carousel(job.line_user_id, results.get(job.schedule_id, []), len(job.keys))
+        saved = change_detector.saved_calls() - saved_before
+        print(f"[CHANGE DETECTION] Run saved {saved} of {len(plan.analyses)} LLM calls (unchanged inputs), {change_detector.stats()}")
+        print(f"[RESULT CACHE] {result_cache.stats()}")
+        print(f"[LLM CACHE] {llm_cache.stats()}")
+        print(f"[LLM USAGE] {llm_service.usage_stats()}")
             
     finally:
         db.close()
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The app imports its modules flat from src/ (python src/app.py, gunicorn --chdir src)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def cache_session():
+    """ Session factory on a fresh in-memory SQLite database with the cache tables (init_cache_db) """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from init_cache_db import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
@@ -0,0 +1,86 @@
+import json
+
+from llm_service import LLMService
+
+
+def _parse(text, symbols):
+    return LLMService().parse_batch_output(text, symbols)
+
+
+def test_json_array_maps_requested_symbols():
+    text = json.dumps([
+        {"symbol": "aapl", "decision": "BUY", "explanation": "ดี", "news_summary": "ข่าว"},
+        {"symbol": "MSFT", "decision": "HOLD", "explanation": "รอ", "news_summary": "-"},
+        {"symbol": "TSLA", "decision": "SELL", "explanation": "ไม่ได้ขอ", "news_summary": "-"},
+    ], ensure_ascii=False)
+    answers = _parse(text, ["AAPL", "MSFT"])
+    assert set(answers) == {"AAPL", "MSFT"}
+    assert json.loads(answers["AAPL"]) == {"decision": "BUY", "explanation": "ดี", "news_summary": "ข่าว"}
+
+
+def test_json_first_valid_entry_wins_and_invalid_entries_are_skipped():
+    text = json.dumps([
+        {"symbol": "AAPL", "decision": "MAYBE", "explanation": "x", "news_summary": "-"},
+        "not an object",
+        {"symbol": "AAPL", "decision": "BUY", "explanation": "first", "news_summary": "-"},
+        {"symbol": "AAPL", "decision": "SELL", "explanation": "second", "news_summary": "-"},
+    ])
+    assert json.loads(_parse(text, ["AAPL"])["AAPL"])["explanation"] == "first"
+
+
+def test_line_format_tolerates_bullets_and_bold():
+    text = (
+        "Here you go:\n"
+        "- **PTT.BK** | buy | ราคาฟื้นตัว | ข่าวดี\n"
+        "* AAPL | HOLD | ทรงตัว |\n"
+        "MSFT | WAIT |  | ไม่มีเหตุผล\n"
+    )
+    answers = _parse(text, ["PTT.BK", "AAPL", "MSFT"])
+    assert answers["PTT.BK"] == "BUY | ราคาฟื้นตัว | ข่าวดี"
+    assert answers["AAPL"] == "HOLD | ทรงตัว | -"
+    assert "MSFT" not in answers # empty reason -> per-symbol fallback
+
+
+def test_invalid_json_falls_back_to_lines():
+    text = '[{"symbol": "AAPL", "decision": "BUY"\nAAPL | SELL | เหตุผล | ข่าว'
+    assert _parse(text, ["AAPL"]) == {"AAPL": "SELL | เหตุผล | ข่าว"}
+
+
+class _StubLLM(LLMService):
+    """ Batch answers come from `batch_text`; per-symbol calls are recorded instead of sent """
+    def __init__(self, batch_text):
+        super().__init__()
+        self.batch_text = batch_text
+        self.single_calls = []
+
+    def _cached_call(self, prompt, timeout=None, call=None, hedge=True, kind="call"):
+        return self.batch_text
+
+    def analyze_stock_ai(self, symbol, *args, timeout=None, **kwargs):
+        self.single_calls.append((symbol, timeout))
+        return f"HOLD | single {symbol} | -"
+
+
+def _items(*symbols):
+    return [{"symbol": s, "price": 10.0, "pe_ratio": 0, "div_yield": 0, "news_list": [],
+             "strategy": "Value", "goal": "Medium", "technicals": None} for s in symbols]
+
+
+def test_failed_batch_is_not_retried_per_symbol():
+    llm = _StubLLM("AI Connection Error: timed out after 92s")
+    assert llm.analyze_stocks_batch(_items("AAPL", "MSFT", "NVDA"), deadline=90) == [None, None, None]
+    assert llm.single_calls == []
+
+
+def test_missing_symbols_are_retried_within_the_deadline():
+    llm = _StubLLM("AAPL | BUY | เหตุผล | ข่าว")
+    outputs = llm.analyze_stocks_batch(_items("AAPL", "MSFT"), deadline=60)
+    assert outputs == ["BUY | เหตุผล | ข่าว", "HOLD | single MSFT | -"]
+    [(symbol, timeout)] = llm.single_calls
+    assert symbol == "MSFT" and timeout <= 60
+
+
+def test_spent_deadline_sends_nothing():
+    llm = _StubLLM("AAPL | BUY | เหตุผล | ข่าว")
+    assert llm.analyze_stocks_batch(_items("AAPL", "MSFT"), deadline=0) == [None, None]
+    assert llm.single_calls == []
@@ -0,0 +1,141 @@
+import threading
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import batch_planner
+from config import Config
+from database import Base, User, Watchlist, Schedule
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _user(db, line_id, symbols, strategy="Value", goal="Medium", risk="Medium"):
+    user = User(line_user_id=line_id, core_strategy=strategy, investment_goal=goal, risk_appetite=risk)
+    db.add(user)
+    db.flush()
+    for item in symbols:
+        symbol, item_strategy = item if isinstance(item, tuple) else (item, None) # (symbol, strategy override)
+        db.add(Watchlist(user_id=user.id, symbol=symbol, strategy=item_strategy))
+    schedule = Schedule(user_id=user.id, alert_time="09:00")
+    db.add(schedule)
+    db.commit()
+    return schedule
+
+
+def test_plan_deduplicates_symbols_and_analyses_across_users(db):
+    a = _user(db, "U1", ["AAPL", "PTT.BK", "AAPL"]) # Repeated row is ignored
+    b = _user(db, "U2", ["PTT.BK", "AAPL"])
+    c = _user(db, "U3", [("AAPL", "Growth")])
+    plan = batch_planner.plan_batch(db, [a, b, c])
+
+    assert plan.symbols == ["AAPL", "PTT.BK"]
+    assert plan.analyses == [("AAPL", "Value", "Medium", "Medium"), ("PTT.BK", "Value", "Medium", "Medium"),
+                             ("AAPL", "Growth", "Medium", "Medium")]
+    assert [job.keys for job in plan.jobs] == [
+        [("AAPL", "Value", "Medium", "Medium"), ("PTT.BK", "Value", "Medium", "Medium")],
+        [("PTT.BK", "Value", "Medium", "Medium"), ("AAPL", "Value", "Medium", "Medium")], # Own watchlist order
+        [("AAPL", "Growth", "Medium", "Medium")],
+    ]
+    assert plan.total_rows == 5
+
+
+def test_user_without_watchlist_gets_no_job(db):
+    empty = _user(db, "U1", [])
+    plan = batch_planner.plan_batch(db, [empty])
+    assert plan.jobs == [] and plan.symbols == []
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.fetches = Counter()
+        self.analyses = Counter()
+        self.lock = threading.Lock()
+
+    def prefetch_quotes(self, symbols, deadline=None):
+        return {}
+
+    def fetch_data(self, symbol, quotes=None, compute_indicators=True, deadline=None):
+        with self.lock:
+            self.fetches[symbol] += 1
+        return {"symbol": symbol}
+
+    def compute_indicators(self, market_data):
+        pass
+
+    def analyze_data_batch(self, entries, deadline=None, change_detection=False):
+        with self.lock:
+            self.analyses.update((s, st, g, r) for s, _, st, g, r in entries)
+        return [f"{s}/{st}" for s, _, st, _, _ in entries]
+
+    def analyze_data(self, symbol, data, strategy="Value", goal="Medium", risk="Medium", deadline=None, change_detection=False):
+        return self.analyze_data_batch([(symbol, data, strategy, goal, risk)])[0]
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_run_batch_fetches_and_analyzes_once_and_fans_out(db, monkeypatch, batched):
+    monkeypatch.setattr(Config, "LLM_BATCH_ENABLED", batched)
+    monkeypatch.setattr(Config, "LLM_BATCH_MAX_SYMBOLS", 2)
+    a = _user(db, "U1", ["AAPL", "PTT.BK"])
+    b = _user(db, "U2", ["PTT.BK", "AAPL"])
+    c = _user(db, "U3", [("AAPL", "Growth")])
+    plan = batch_planner.plan_batch(db, [a, b, c])
+    analyzer = FakeAnalyzer()
+
+    results = batch_planner.run_batch(plan, analyzer, lambda result: f"bubble:{result}")
+
+    assert analyzer.fetches == {"AAPL": 1, "PTT.BK": 1}
+    assert set(analyzer.analyses.values()) == {1} and len(analyzer.analyses) == 3
+    assert results == {
+        a.id: ["bubble:AAPL/Value", "bubble:PTT.BK/Value"],
+        b.id: ["bubble:PTT.BK/Value", "bubble:AAPL/Value"],
+        c.id: ["bubble:AAPL/Growth"],
+    }
+
+
+class FailingAnalyzer(FakeAnalyzer):
+    """ Analysis of one symbol raises, in a batch request as well as on its own """
+    def __init__(self, bad):
+        super().__init__()
+        self.bad = bad
+
+    def analyze_data_batch(self, entries, deadline=None, change_detection=False):
+        if any(entry[0] == self.bad for entry in entries):
+            raise RuntimeError(f"{self.bad} broke the request")
+        return super().analyze_data_batch(entries, deadline=deadline, change_detection=change_detection)
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_failing_symbol_only_drops_its_own_bubble(db, monkeypatch, batched):
+    monkeypatch.setattr(Config, "LLM_BATCH_ENABLED", batched)
+    monkeypatch.setattr(Config, "LLM_BATCH_MAX_SYMBOLS", 10)
+    a = _user(db, "U1", ["AAPL", "BAD", "MSFT"])
+    b = _user(db, "U2", ["MSFT"])
+    plan = batch_planner.plan_batch(db, [a, b])
+
+    results = batch_planner.run_batch(plan, FailingAnalyzer("BAD"), lambda result: f"bubble:{result}")
+
+    assert results == {
+        a.id: ["bubble:AAPL/Value", "bubble:MSFT/Value"],
+        b.id: ["bubble:MSFT/Value"],
+    }
+
+
+def test_plan_for_one_job(db):
+    a = _user(db, "U1", ["AAPL", "PTT.BK"])
+    b = _user(db, "U2", [("AAPL", "Growth")])
+    plan = batch_planner.plan_batch(db, [a, b])
+
+    single = plan.for_job(plan.jobs[1])
+    assert [job.schedule_id for job in single.jobs] == [b.id]
+    assert single.symbols == ["AAPL"]
+    assert single.analyses == [("AAPL", "Growth", "Medium", "Medium")]
@@ -0,0 +1,116 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import candle_store
+import indicators
+from config import Config
+
+
+def _weekdays(count, end):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+def _bar(time, close):
+    return {"time": time, "open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 1000}
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path, cache_session):
+    monkeypatch.setattr(candle_store, "SessionLocal", cache_session)
+    monkeypatch.setattr(Config, "PRICE_COLUMNS_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "CANDLE_REFRESH_SECONDS", 0) # Always sync
+    monkeypatch.setattr(Config, "CANDLE_LOOKBACK", 60)
+    return candle_store
+
+
+class Provider:
+    def __init__(self, bars):
+        self.bars = bars
+        self.requests = []
+
+    def __call__(self, n):
+        self.requests.append(n)
+        return self.bars[-n:]
+
+
+def test_first_sync_requests_the_whole_lookback(store):
+    days = _weekdays(40, datetime.date.today() - datetime.timedelta(days=7))
+    provider = Provider([_bar(d, 100.0 + i) for i, d in enumerate(days)])
+    history = store.get_history("AAPL", "1day", provider)
+    assert provider.requests == [60]
+    assert history["close"].tolist() == [100.0 + i for i in range(40)]
+
+
+def test_tail_sync_replaces_the_last_bar_and_appends(store):
+    last = datetime.date.today() - datetime.timedelta(days=7)
+    days = _weekdays(40, last)
+    store.get_history("AAPL", "1day", Provider([_bar(d, 100.0 + i) for i, d in enumerate(days)]))
+
+    # The provider now has a revised close for the last stored bar plus newer bars
+    new_days = _weekdays(3, last + datetime.timedelta(days=5))
+    tail = [_bar(days[-1], 200.0)] + [_bar(d, 201.0 + i) for i, d in enumerate(d for d in new_days if d > days[-1])]
+    provider = Provider(tail)
+    history = store.get_history("AAPL", "1day", provider)
+
+    # Only the missing tail (weekdays since the last bar, plus that bar) is asked for
+    assert provider.requests == [candle_store._bars_since(days[-1]) + 1]
+    expected = [100.0 + i for i in range(39)] + [bar["close"] for bar in tail]
+    assert history["close"].tolist() == expected
+    # Indicators follow the merged history
+    ref = indicators.summarize([np.array(expected)], [np.array(expected) + 1], [np.array(expected) - 1])[0]
+    assert history["indicators"]["rsi"] == pytest.approx(ref["rsi"])
+    assert history["indicators"]["sma50"] is None and ref["sma50"] is None
+
+
+def test_recent_sync_skips_the_provider(store, monkeypatch):
+    days = _weekdays(20, datetime.date.today())
+    store.get_history("AAPL", "1day", Provider([_bar(d, 50.0) for d in days]))
+    monkeypatch.setattr(Config, "CANDLE_REFRESH_SECONDS", 3600)
+    provider = Provider([])
+    history = store.get_history("AAPL", "1day", provider)
+    assert provider.requests == []
+    assert len(history["close"]) == 20
+
+
+def test_failed_first_fetch_returns_none(store):
+    def failing(n):
+        raise RuntimeError("429")
+    assert store.get_history("AAPL", "1day", failing) is None
+
+
+def test_tail_sync_appends_to_the_columns_without_reading_the_window(store, cache_session):
+    last = datetime.date.today() - datetime.timedelta(days=7)
+    days = _weekdays(40, last)
+    store.get_history("AAPL", "1day", Provider([_bar(d, 100.0 + i) for i, d in enumerate(days)]))
+
+    # Rows the tail merge must not need: only the column files still hold them
+    session = cache_session()
+    session.query(candle_store.OHLCVCandle).filter(candle_store.OHLCVCandle.bar_time < days[-1]).delete()
+    session.commit()
+    session.close()
+
+    new_days = [d for d in _weekdays(3, last + datetime.timedelta(days=5)) if d > days[-1]]
+    tail = [_bar(days[-1], 200.0)] + [_bar(d, 201.0 + i) for i, d in enumerate(new_days)]
+    history = store.get_history("AAPL", "1day", Provider(tail))
+
+    expected = [100.0 + i for i in range(39)] + [bar["close"] for bar in tail]
+    assert history["close"].tolist() == expected
+    ref = indicators.summarize([np.array(expected)], [np.array(expected) + 1], [np.array(expected) - 1])[0]
+    assert history["indicators"]["rsi"] == pytest.approx(ref["rsi"])
+
+
+def test_inconsistent_columns_are_rebuilt_from_the_database(store, monkeypatch):
+    days = _weekdays(30, datetime.date.today() - datetime.timedelta(days=7))
+    store.get_history("AAPL", "1day", Provider([_bar(d, 100.0 + i) for i, d in enumerate(days)]))
+    monkeypatch.setattr(candle_store.price_columns, "open_columns", lambda *args, **kwargs: None)
+
+    history = store.get_history("AAPL", "1day", Provider([_bar(days[-1], 300.0)]))
+    assert history["close"].tolist() == [100.0 + i for i in range(29)] + [300.0]
@@ -0,0 +1,71 @@
+import pytest
+
+import change_detector
+import database
+from analysis_result import AnalysisResult, Technicals
+from config import Config
+from ttl_cache import TTLCache
+
+
+def _inputs(price=100.0, rsi=50.0, news=("h1", "h2")):
+    return {"price": price, "rsi": rsi, "news": sorted(news)}
+
+
+def _data(price=100.0, rsi=50.0, news=("h1", "h2")):
+    return {"price": price, "pe_ratio": 15.0, "div_yield": 2.0, "technicals": Technicals(rsi=rsi), "news": list(news)}
+
+
+def _answer(ai_ok=True, partial=()):
+    return AnalysisResult(symbol="AAPL", signal="BUY", reason="เหตุผล", news_summary="ข่าว", ai_ok=ai_ok, partial=list(partial))
+
+
+def test_small_price_move_is_not_material():
+    assert change_detector.material_change(_inputs(), _inputs(price=100.0 * (1 + Config.CHANGE_PRICE_DELTA / 2))) is None
+
+
+def test_price_move_past_the_delta_is_material():
+    assert change_detector.material_change(_inputs(), _inputs(price=100.0 * (1 - Config.CHANGE_PRICE_DELTA * 1.1))) == "price"
+
+
+def test_missing_price_is_material():
+    assert change_detector.material_change(_inputs(price=0), _inputs()) == "price"
+
+
+def test_rsi_only_matters_when_it_crosses_a_band_edge():
+    assert change_detector.material_change(_inputs(rsi=40.0), _inputs(rsi=65.0)) is None
+    assert change_detector.material_change(_inputs(rsi=65.0), _inputs(rsi=72.0)) == "rsi"
+    assert change_detector.material_change(_inputs(rsi=None), _inputs(rsi=50.0)) == "rsi"
+
+
+def test_new_headlines_are_material_dropped_ones_are_not():
+    assert change_detector.material_change(_inputs(), _inputs(news=("h1", "h2", "h3"))) == "news"
+    assert change_detector.material_change(_inputs(), _inputs(news=("h2",))) is None
+
+
+@pytest.fixture
+def detector(monkeypatch, cache_session):
+    monkeypatch.setattr(change_detector, "_CACHE", TTLCache("snapshots-test", maxsize=100, ttl=Config.CHANGE_MAX_AGE))
+    monkeypatch.setattr(database, "SessionLocal", cache_session) # DB tier (imported when used)
+    monkeypatch.setattr(Config, "CHANGE_DETECTION_ENABLED", True)
+    monkeypatch.setattr(Config, "CHANGE_DB_TIER", True)
+    return change_detector
+
+
+def test_unchanged_inputs_reuse_the_recorded_verdict(detector):
+    assert detector.lookup("AAPL", "Value", "Medium", "Medium", _data()) is None
+    detector.record("AAPL", "Value", "Medium", "Medium", _data(), _answer())
+    assert detector.lookup("AAPL", "Value", "Medium", "Medium", _data(price=100.5)) == ("BUY", "เหตุผล", "ข่าว")
+    assert detector.lookup("AAPL", "Growth", "Medium", "Medium", _data()) is None # Other settings
+    assert detector.lookup("AAPL", "Value", "Medium", "Medium", _data(price=110.0)) is None
+
+
+def test_partial_or_fallback_answers_are_not_recorded(detector):
+    detector.record("AAPL", "Value", "Medium", "Medium", _data(), _answer(partial=["news_summary"]))
+    detector.record("AAPL", "Value", "Medium", "Medium", _data(), _answer(ai_ok=False))
+    assert detector.lookup("AAPL", "Value", "Medium", "Medium", _data()) is None
+
+
+def test_snapshot_survives_a_restart_through_the_db_tier(detector, monkeypatch):
+    detector.record("AAPL", "Value", "Medium", "Medium", _data(), _answer())
+    monkeypatch.setattr(detector, "_CACHE", TTLCache("snapshots-cold", maxsize=100, ttl=Config.CHANGE_MAX_AGE))
+    assert detector.lookup("AAPL", "Value", "Medium", "Medium", _data()) == ("BUY", "เหตุผล", "ข่าว")
@@ -0,0 +1,96 @@
+import pytest
+
+import global_stock_helper
+from analyzer import AnalysisEngine
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """ Stub the Twelve Data / Finnhub helpers; records which symbols needed a per-symbol quote """
+    calls = []
+
+    def get_quote(symbol):
+        calls.append(symbol)
+        return {"c": 101.0}
+
+    monkeypatch.setattr(global_stock_helper, "get_quote", get_quote)
+    monkeypatch.setattr(global_stock_helper, "get_candles_and_indicators", lambda symbol, compute=True: None)
+    monkeypatch.setattr(global_stock_helper, "get_company_profile", lambda symbol: {})
+    monkeypatch.setattr(global_stock_helper, "get_market_news", lambda symbol: [])
+    monkeypatch.setattr(global_stock_helper, "get_general_market_news", lambda: [])
+    return calls
+
+
+def test_prefetched_quote_skips_the_per_symbol_call(providers):
+    data = AnalysisEngine.__new__(AnalysisEngine).fetch_data("AAPL", quotes={"AAPL": {"c": 190.0}})
+    assert data["price"] == 190.0
+    assert providers == []
+
+
+def test_not_found_bulk_entry_is_not_asked_again(providers):
+    # get_quotes puts None for symbols Twelve Data does not know
+    data = AnalysisEngine.__new__(AnalysisEngine).fetch_data("AAPL", quotes={"AAPL": None})
+    assert data is None
+    assert providers == []
+
+
+def test_symbol_missing_from_prefetch_falls_back_to_get_quote(providers):
+    data = AnalysisEngine.__new__(AnalysisEngine).fetch_data("MSFT", quotes={"AAPL": {"c": 190.0}})
+    assert data["price"] == 101.0
+    assert providers == ["MSFT"]
+
+
+def test_prefetch_does_not_wait_past_its_deadline(monkeypatch):
+    import rate_limiter
+
+    drained = rate_limiter.TokenBucket("twelve", capacity=8, rate=8 / 60.0)
+    drained.reserve(8)
+    monkeypatch.setitem(rate_limiter._BUCKETS, "twelve", drained)
+    monkeypatch.setattr(global_stock_helper, "TWELVE_KEY", "test-key")
+
+    def no_sleep(seconds):
+        raise AssertionError(f"waited {seconds:.1f}s for Twelve Data credits")
+    monkeypatch.setattr(rate_limiter.time, "sleep", no_sleep)
+
+    quotes = AnalysisEngine.__new__(AnalysisEngine).prefetch_quotes(["AAPL", "MSFT", "PTT.BK"], deadline=25)
+    # Skipped chunk: left out, fetched per symbol later (within each symbol's own budget)
+    assert quotes == {}
+
+
+@pytest.fixture
+def twelve(monkeypatch):
+    """ Stub _get_twelve with scripted /quote answers keyed by the requested symbol list """
+    answers, requests = {}, []
+
+    def get_twelve(endpoint, params=None, credits=1, keep_errors=False):
+        requests.append(params["symbol"])
+        return answers.get(params["symbol"])
+
+    monkeypatch.setattr(global_stock_helper, "_get_twelve", get_twelve)
+    monkeypatch.setattr(global_stock_helper.Config, "TWELVE_DATA_BATCH_SIZE", 2)
+    return answers, requests
+
+
+def test_get_quotes_marks_unknown_symbols_and_leaves_out_failed_chunks(twelve):
+    answers, requests = twelve
+    answers["AAPL,PTT"] = {
+        "AAPL": {"close": "190", "previous_close": "188"},
+        "PTT": {"code": 404, "status": "error", "message": "symbol not found"},
+    }
+    answers["MSFT"] = None # Chunk failed
+
+    quotes = global_stock_helper.get_quotes(["AAPL", "PTT", "MSFT"])
+
+    assert requests == ["AAPL,PTT", "MSFT"]
+    assert quotes["AAPL"]["c"] == 190.0
+    assert quotes["PTT"] is None
+    assert "MSFT" not in quotes
+
+
+def test_get_quotes_single_symbol_errors(twelve):
+    answers, _ = twelve
+    answers["PTT"] = {"code": 404, "status": "error", "message": "symbol not found"}
+    answers["AAPL"] = {"code": 429, "status": "error", "message": "out of credits"}
+
+    assert global_stock_helper.get_quotes(["PTT"]) == {"PTT": None}
+    assert global_stock_helper.get_quotes(["AAPL"]) == {} # Rate limited: ask again later
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import indicators
+from indicator_state import IndicatorState
+
+
+def _bars(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, n))
+    high = close + rng.uniform(0, 2, n)
+    low = close - rng.uniform(0, 2, n)
+    return high, low, close
+
+
+def _streamed(high, low, close):
+    state = IndicatorState()
+    for i in range(len(close)):
+        state.push(f"2024-{i:05d}", high[i], low[i], close[i])
+    return state.summary()
+
+
+def _assert_same(expected, actual):
+    assert expected.keys() <= actual.keys()
+    for name, value in expected.items():
+        if value is None:
+            assert actual[name] is None, name
+        else:
+            assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+@pytest.mark.parametrize("length", [300, 60, 10])
+def test_streaming_state_matches_batch_summary(length):
+    high, low, close = _bars(length)
+    expected = indicators.summarize([close], [high], [low])[0]
+    _assert_same(expected, _streamed(high, low, close))
+
+
+def test_pending_bar_is_replaced_not_appended():
+    high, low, close = _bars(80)
+    state = IndicatorState()
+    for i in range(len(close)):
+        state.push(f"2024-{i:05d}", high[i], low[i], close[i])
+    # The newest bar is still forming: re-sending it with a new price replaces it
+    state.push(f"2024-{len(close) - 1:05d}", high[-1] + 5, low[-1], close[-1] + 3)
+    close2, high2 = close.copy(), high.copy()
+    close2[-1] += 3
+    high2[-1] += 5
+    _assert_same(indicators.summarize([close2], [high2], [low])[0], state.summary())
+
+
+def test_state_round_trips_through_checkpoint():
+    high, low, close = _bars(120)
+    state = IndicatorState()
+    for i in range(100):
+        state.push(f"2024-{i:05d}", high[i], low[i], close[i])
+    restored = IndicatorState(state.to_dict())
+    for i in range(100, 120):
+        restored.push(f"2024-{i:05d}", high[i], low[i], close[i])
+    _assert_same(indicators.summarize([close], [high], [low])[0], restored.summary())
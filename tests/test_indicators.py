@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import indicators
+
+
+def _bars(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, n))
+    high = close + rng.uniform(0, 2, n)
+    low = close - rng.uniform(0, 2, n)
+    return high, low, close
+
+
+def _assert_same(expected, actual):
+    assert expected.keys() <= actual.keys()
+    for name, value in expected.items():
+        if value is None:
+            assert actual[name] is None, name
+        else:
+            assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+def test_stack_right_aligns_and_pads_with_nan():
+    out = indicators.stack([[1, 2, 3], [4], None])
+    assert out.shape == (3, 3)
+    assert out[0].tolist() == [1, 2, 3]
+    assert np.isnan(out[1, :2]).all() and out[1, 2] == 4
+    assert np.isnan(out[2]).all()
+
+
+def test_sma_and_ema_match_plain_loops():
+    _, _, close = _bars(60)
+    assert indicators.sma(close, 50)[0, -1] == pytest.approx(close[-50:].mean())
+
+    # EMA seeded with the SMA of the first n bars
+    n, alpha = 20, 2.0 / 21
+    value = close[:n].mean()
+    for v in close[n:]:
+        value += alpha * (v - value)
+    assert indicators.ema(close, n)[0, -1] == pytest.approx(value)
+
+
+def test_rsi_edges():
+    assert indicators.rsi(np.arange(1.0, 31.0))[0, -1] == 100.0 # Gains only
+    assert indicators.rsi(np.full(30, 5.0))[0, -1] == 50.0 # Flat
+
+
+def test_not_enough_bars_is_none():
+    high, low, close = _bars(30)
+    summary = indicators.summarize([close], [high], [low])[0]
+    assert summary["sma200"] is None
+    assert summary["rsi"] is not None
+
+
+def test_summarize_handles_ragged_batches():
+    a, b = _bars(250, seed=1), _bars(40, seed=2)
+    batch = indicators.summarize([a[2], b[2]], [a[0], b[0]], [a[1], b[1]])
+    _assert_same(indicators.summarize([b[2]], [b[0]], [b[1]])[0], batch[1])
+    _assert_same(indicators.summarize([a[2]], [a[0]], [a[1]])[0], batch[0])
@@ -0,0 +1,39 @@
+import threading
+import time
+
+import rate_limiter
+from llm_executor import LLMExecutor
+
+
+def test_abandoned_call_gives_its_slot_back():
+    executor = LLMExecutor(max_inflight=1)
+    release = threading.Event()
+
+    def stalled():
+        release.wait(2)
+        return "late"
+
+    try:
+        assert executor.run(stalled, 0.1, hedge=False).startswith("AI Connection Error")
+        started = time.monotonic()
+        assert executor.run(lambda: "ok", 0.5, hedge=False) == "ok"
+        assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+
+
+def test_rate_limit_waits_are_bounded_by_the_call_deadline(monkeypatch):
+    drained = rate_limiter.TokenBucket("gemini", capacity=1, rate=1 / 60.0)
+    drained.reserve(1)
+    monkeypatch.setitem(rate_limiter._BUCKETS, "gemini", drained)
+
+    def call():
+        try:
+            rate_limiter.acquire("gemini")
+        except rate_limiter.RateLimitTimeout:
+            return "AI Connection Error: rate limited"
+        return "ok"
+
+    started = time.monotonic()
+    assert LLMExecutor(max_inflight=1).run(call, 0.2, hedge=False) == "AI Connection Error: rate limited"
+    assert time.monotonic() - started < 0.2
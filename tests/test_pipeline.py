@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+import services
+
+
+class FakeEngine:
+    """ Later symbols fetch faster, so stages finish out of input order """
+    def __init__(self, symbols, fail=()):
+        self.delays = {s: 0.01 * (len(symbols) - i) for i, s in enumerate(symbols)}
+        self.fail = set(fail)
+
+    def prefetch_quotes(self, symbols, deadline=None):
+        return {}
+
+    def fetch_data(self, symbol, quotes=None, deadline=None):
+        time.sleep(self.delays[symbol])
+        return {"symbol": symbol}
+
+    def analyze_data(self, symbol, data, **kwargs):
+        if symbol in self.fail:
+            raise RuntimeError("boom")
+        return data["symbol"]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    def setup(symbols, **kwargs):
+        engine = FakeEngine(symbols, **kwargs)
+        monkeypatch.setattr(services, "get_engine", lambda: engine)
+        monkeypatch.setattr(services, "render_bubble", lambda result: f"bubble:{result}")
+        monkeypatch.setattr(services, "_error_bubble", lambda symbol, e: f"error:{symbol}")
+        return engine
+    return setup
+
+
+def test_bubbles_and_callbacks_follow_input_order(pipeline):
+    symbols = ["AAPL", "MSFT", "NVDA", "PTT.BK", "TSLA"]
+    pipeline(symbols)
+    seen = []
+    bubbles = services.process_stock_list(symbols, callback_func=seen.append, pipelined=True, fast=False)
+    assert bubbles == [f"bubble:{s}" for s in symbols]
+    assert seen == bubbles
+
+
+def test_failed_symbol_keeps_its_slot(pipeline):
+    symbols = ["AAPL", "MSFT", "NVDA"]
+    pipeline(symbols, fail={"MSFT"})
+    seen = []
+    services.process_stock_list(symbols, callback_func=seen.append, pipelined=True, fast=False)
+    assert seen == ["bubble:AAPL", "error:MSFT", "bubble:NVDA"]
+
+
+def test_failing_callback_does_not_stop_later_bubbles(pipeline):
+    symbols = ["AAPL", "MSFT", "NVDA"]
+    pipeline(symbols)
+    seen = []
+
+    def callback(bubble):
+        seen.append(bubble)
+        if bubble == "bubble:AAPL":
+            raise RuntimeError("push failed")
+
+    services.process_stock_list(symbols, callback_func=callback, pipelined=True, fast=False)
+    assert seen == ["bubble:AAPL", "bubble:MSFT", "bubble:NVDA"]
+
+
+class SlowLLMEngine(FakeEngine):
+    """ Instant fetches, one slow Gemini call per symbol; records whether each symbol got the LLM """
+    def __init__(self, symbols):
+        super().__init__(symbols)
+        self.delays = {s: 0 for s in symbols}
+        self.used_llm = {}
+
+    def analyze_data(self, symbol, data, deadline=None, **kwargs):
+        self.used_llm[symbol] = deadline.remaining() >= services.Config.DEADLINE_LLM_MIN
+        time.sleep(0.1)
+        return data["symbol"]
+
+
+def test_symbol_queued_for_the_llm_still_gets_it(monkeypatch):
+    symbols = ["AAPL", "MSFT", "NVDA", "TSLA"]
+    engine = SlowLLMEngine(symbols)
+    monkeypatch.setattr(services, "get_engine", lambda: engine)
+    monkeypatch.setattr(services, "render_bubble", lambda result: f"bubble:{result}")
+    monkeypatch.setattr(services.Config, "PIPELINE_LLM_WORKERS", 1)
+    monkeypatch.setattr(services.Config, "DEADLINE_LLM_RESERVE", 0.1)
+    monkeypatch.setattr(services.Config, "DEADLINE_LLM_MIN", 0.05)
+
+    # TSLA waits ~0.3s for the single LLM worker, longer than its whole 0.2s budget
+    services.process_stock_list(symbols, pipelined=True, fast=False, deadline=0.2)
+    assert engine.used_llm == {s: True for s in symbols}
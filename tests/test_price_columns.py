@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pytest
+
+import price_columns
+from config import Config
+
+
+@pytest.fixture
+def columns_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "PRICE_COLUMNS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _columns(closes):
+    return {f: [float(c) for c in closes] for f in price_columns.FIELDS}
+
+
+def test_round_trip(columns_dir):
+    price_columns.write_columns("AAPL", "1day", _columns([1, 2, 3]), "s1")
+    views = price_columns.open_columns("AAPL", "1day", sync_id="s1")
+    assert views["close"].tolist() == [1.0, 2.0, 3.0]
+    assert price_columns.read_meta("AAPL", "1day") == {"sync_id": "s1", "bars": 3}
+
+
+def test_other_sync_is_rejected(columns_dir):
+    price_columns.write_columns("AAPL", "1day", _columns([1, 2, 3]), "s1")
+    assert price_columns.open_columns("AAPL", "1day", sync_id="s2") is None
+
+
+def test_column_length_mismatch_is_rejected(columns_dir):
+    price_columns.write_columns("AAPL", "1day", _columns([1, 2, 3]), "s1")
+    version = os.path.join(price_columns._symbol_dir("AAPL", "1day"), os.readlink(
+        os.path.join(price_columns._symbol_dir("AAPL", "1day"), price_columns.CURRENT)))
+    np.asarray([9.0, 9.0], dtype=price_columns.DTYPE).tofile(os.path.join(version, "low.f64"))
+    assert price_columns.open_columns("AAPL", "1day") is None
+
+
+def test_rewrite_swaps_versions_and_keeps_open_views(columns_dir, monkeypatch):
+    price_columns.write_columns("AAPL", "1day", _columns([1, 2, 3]), "s1")
+    old = price_columns.open_columns("AAPL", "1day")
+
+    monkeypatch.setattr(price_columns, "STALE_VERSION_SECONDS", -1) # Remove replaced versions at once
+    price_columns.write_columns("AAPL", "1day", _columns([2, 3, 4, 5]), "s2")
+
+    assert price_columns.open_columns("AAPL", "1day", sync_id="s2")["close"].tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert old["close"].tolist() == [1.0, 2.0, 3.0]
+    versions = [n for n in os.listdir(price_columns._symbol_dir("AAPL", "1day")) if n.startswith("v-")]
+    assert len(versions) == 1
@@ -0,0 +1,112 @@
+import datetime
+
+import pytest
+
+import profile_cache
+from config import Config
+from ttl_cache import TTLCache
+
+
+class Provider:
+    def __init__(self, **values):
+        self.values = {"pe": 20.0, "marketCapitalization": 3000.0, "dividendYield": 0.5, "name": "Apple", **values}
+        self.requests = []
+        self.fail = False
+
+    def __call__(self, symbol, fields):
+        self.requests.append(set(fields))
+        if self.fail:
+            return None
+        return {f: self.values[f] for f in fields}
+
+
+class ManualPool:
+    """ Holds background refreshes until the test runs them """
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn):
+        self.jobs.append(fn)
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job()
+
+
+@pytest.fixture
+def cache(monkeypatch, cache_session):
+    monkeypatch.setattr(profile_cache, "SessionLocal", cache_session)
+    monkeypatch.setattr(profile_cache, "_MEMORY", TTLCache("profile-test", maxsize=100, ttl=Config.PROFILE_STALE_MAX))
+    monkeypatch.setattr(profile_cache, "_REFRESH_POOL", ManualPool())
+    return profile_cache
+
+
+def _age(cache, symbol, field, seconds):
+    """ Pretend `field` was last checked `seconds` ago """
+    entry = cache._MEMORY.get(symbol)
+    entry.checked[field] = datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)
+
+
+def test_miss_fetches_every_field_then_serves_from_memory(cache):
+    provider = Provider()
+    assert cache.get_profile("AAPL", provider)["pe"] == 20.0
+    assert cache.get_profile("AAPL", provider)["name"] == "Apple"
+    assert provider.requests == [set(cache.FIELDS)]
+
+
+def test_second_tier_survives_a_cold_memory(cache, monkeypatch):
+    provider = Provider()
+    cache.get_profile("AAPL", provider)
+    monkeypatch.setattr(cache, "_MEMORY", TTLCache("profile-cold", maxsize=100, ttl=Config.PROFILE_STALE_MAX))
+    assert cache.get_profile("AAPL", provider)["marketCapitalization"] == 3000.0
+    assert len(provider.requests) == 1
+
+
+def test_stale_field_is_served_now_and_refreshed_in_background(cache):
+    provider = Provider()
+    cache.get_profile("AAPL", provider)
+    _age(cache, "AAPL", "pe", Config.PROFILE_TTL_PE + 60)
+    provider.values["pe"] = 25.0
+
+    assert cache.get_profile("AAPL", provider)["pe"] == 20.0 # Stale value, no blocking call
+    assert len(provider.requests) == 1
+    cache._REFRESH_POOL.run_all()
+    assert provider.requests[-1] == {"pe"} # Only the stale field
+    assert cache.get_profile("AAPL", provider)["pe"] == 25.0
+
+
+def test_one_background_refresh_per_symbol(cache):
+    provider = Provider()
+    cache.get_profile("AAPL", provider)
+    _age(cache, "AAPL", "pe", Config.PROFILE_TTL_PE + 60)
+    cache.get_profile("AAPL", provider)
+    cache.get_profile("AAPL", provider)
+    assert len(cache._REFRESH_POOL.jobs) == 1
+
+
+def test_failed_refresh_keeps_serving_the_stale_entry(cache):
+    provider = Provider()
+    cache.get_profile("AAPL", provider)
+    _age(cache, "AAPL", "pe", Config.PROFILE_TTL_PE + 60)
+    provider.fail = True
+    cache.get_profile("AAPL", provider)
+    cache._REFRESH_POOL.run_all()
+    assert cache.get_profile("AAPL", provider)["pe"] == 20.0
+
+
+def test_entry_past_the_stale_window_blocks_on_the_provider(cache):
+    provider = Provider()
+    cache.get_profile("AAPL", provider)
+    _age(cache, "AAPL", "pe", Config.PROFILE_STALE_MAX + 60)
+    provider.values["pe"] = 30.0
+    assert cache.get_profile("AAPL", provider)["pe"] == 30.0
+    assert cache._REFRESH_POOL.jobs == []
+
+
+def test_missing_field_is_negatively_cached(cache):
+    provider = Provider(pe=0, dividendYield=0) # ETF
+    cache.get_profile("SPY", provider)
+    _age(cache, "SPY", "pe", Config.PROFILE_TTL_PE + 60) # Past the value TTL, within PROFILE_MISSING_TTL
+    assert cache.get_profile("SPY", provider)["pe"] == 0
+    assert len(provider.requests) == 1 and cache._REFRESH_POOL.jobs == []
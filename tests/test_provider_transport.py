@@ -0,0 +1,53 @@
+import pytest
+import requests
+
+import provider_transport
+from provider_transport import ProviderTransport
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status_code = status
+        self.content = b"{}"
+        self.headers = {}
+
+
+class FakeSession:
+    """ Answers from a script of status codes / exceptions, recording each attempt """
+    def __init__(self, *script):
+        self.script = list(script)
+        self.methods = []
+
+    def request(self, method, url, **kwargs):
+        self.methods.append(method)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    monkeypatch.setattr(provider_transport.time, "sleep", lambda seconds: None)
+    return ProviderTransport("test", "https://example.invalid", max_retries=2)
+
+
+def test_get_is_retried_on_5xx_and_timeouts(transport):
+    transport.session = FakeSession(503, requests.Timeout("slow"), 200)
+    assert transport.request("GET", "https://example.invalid/quote").status_code == 200
+    assert transport.session.methods == ["GET", "GET", "GET"]
+
+
+def test_post_is_sent_once_by_default(transport):
+    transport.session = FakeSession(503)
+    assert transport.request("POST", "https://example.invalid/refresh").status_code == 503
+    transport.session = FakeSession(requests.Timeout("slow"))
+    with pytest.raises(requests.Timeout):
+        transport.request("POST", "https://example.invalid/refresh")
+    assert transport.session.methods == ["POST"]
+
+
+def test_post_retries_when_the_caller_opts_in(transport):
+    transport.session = FakeSession(503, 200)
+    assert transport.request("POST", "https://example.invalid/search", retry=True).status_code == 200
+    assert transport.session.methods == ["POST", "POST"]
@@ -0,0 +1,76 @@
+import pytest
+
+import rate_limiter
+from deadline import Deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake)
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    return fake
+
+
+def test_full_bucket_serves_capacity_without_waiting(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=3, rate=1.0)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_empty_bucket_goes_into_debt(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=2, rate=0.5)
+    bucket.reserve(2)
+    assert bucket.reserve() == pytest.approx(2.0) # 1 token at 0.5/s
+    assert bucket.reserve() == pytest.approx(4.0) # queued behind the first debt
+
+
+def test_refill_pays_back_debt_and_caps_at_capacity(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=2, rate=1.0)
+    bucket.reserve(2)
+    bucket.reserve(1) # 1 token of debt
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(1.0) # debt paid, bucket empty again
+    clock.now += 100.0
+    bucket.reserve(0)
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_cost_above_capacity_is_clamped(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=2, rate=1.0)
+    assert bucket.reserve(10) == 0.0
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_max_wait_refuses_without_taking_tokens(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=1, rate=0.1)
+    bucket.reserve()
+    assert bucket.reserve(max_wait=5) is None # would need 10s
+    assert bucket.tokens == pytest.approx(0.0)
+    assert bucket.reserve(max_wait=0) is None # budget spent: nothing, even if tokens were free
+
+
+def test_acquire_timeout_raises(clock):
+    bucket = rate_limiter.TokenBucket("t", capacity=1, rate=0.1)
+    bucket.acquire()
+    with pytest.raises(rate_limiter.RateLimitTimeout):
+        bucket.acquire(timeout=1)
+    assert bucket.acquire(timeout=20) == pytest.approx(10.0)
+
+
+def test_deadline_scope_bounds_acquire(clock, monkeypatch):
+    bucket = rate_limiter.TokenBucket("scoped", capacity=1, rate=0.1)
+    monkeypatch.setitem(rate_limiter._BUCKETS, "scoped", bucket)
+    deadline = Deadline(5) # same (patched) monotonic clock
+    with rate_limiter.deadline_scope(deadline):
+        rate_limiter.acquire("scoped")
+        with pytest.raises(rate_limiter.RateLimitTimeout):
+            rate_limiter.acquire("scoped")
+    assert rate_limiter.acquire("scoped") == pytest.approx(10.0) # unbounded outside the scope
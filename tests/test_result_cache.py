@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+import result_cache
+from analysis_result import Technicals
+from config import Config
+
+
+def _data(price, news=("h1",), rsi=55.123):
+    return {"price": price, "pe_ratio": 12.0, "div_yield": 3.0,
+            "technicals": Technicals(rsi=rsi, sma50=100.0), "news": list(news)}
+
+
+@pytest.fixture
+def center_price():
+    """ A price in the middle of its log-scale bucket, so small moves stay inside it """
+    step = math.log1p(Config.RESULT_CACHE_PRICE_TOLERANCE)
+    return math.exp(2000 * step)
+
+
+def test_tiny_price_move_shares_the_bucket(center_price):
+    tolerance = Config.RESULT_CACHE_PRICE_TOLERANCE
+    assert result_cache.fingerprint(_data(center_price)) == result_cache.fingerprint(_data(center_price * (1 + tolerance / 4)))
+
+
+def test_price_move_beyond_tolerance_changes_the_key(center_price):
+    tolerance = Config.RESULT_CACHE_PRICE_TOLERANCE
+    assert result_cache.fingerprint(_data(center_price)) != result_cache.fingerprint(_data(center_price * (1 + 2 * tolerance)))
+
+
+def test_inputs_are_compared_at_two_decimals(center_price):
+    assert result_cache.fingerprint(_data(center_price, rsi=55.121)) == result_cache.fingerprint(_data(center_price, rsi=55.124))
+    assert result_cache.fingerprint(_data(center_price, rsi=55.12)) != result_cache.fingerprint(_data(center_price, rsi=55.2))
+
+
+def test_news_changes_the_key(center_price):
+    assert result_cache.fingerprint(_data(center_price)) != result_cache.fingerprint(_data(center_price, news=("h1", "h2")))
+
+
+def test_zero_price_is_stable():
+    assert result_cache.fingerprint(_data(0)) == result_cache.fingerprint(_data(None))
+
+
+def test_key_includes_settings(center_price):
+    data = _data(center_price)
+    assert result_cache.make_key("AAPL", "Value", "Long", "Low", data) != result_cache.make_key("AAPL", "Growth", "Long", "Low", data)
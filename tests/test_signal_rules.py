@@ -0,0 +1,49 @@
+import signal_rules
+from analysis_result import Technicals
+
+UPTREND = {"sma50": 90.0, "sma200": 80.0, "rsi": 25.0, "macd_hist": 0.4, "year_high": 150.0, "year_low": 95.0}
+DOWNTREND = {"sma50": 110.0, "sma200": 120.0, "rsi": 78.0, "macd_hist": -0.4, "year_high": 102.0, "year_low": 60.0}
+
+
+def test_strong_setup_is_buy():
+    rule = signal_rules.evaluate(100.0, 12.0, 4.0, UPTREND, strategy="Value")
+    assert rule.signal == "BUY"
+    assert rule.score > 0
+    assert "Value" in rule.reason
+
+
+def test_weak_setup_is_sell():
+    rule = signal_rules.evaluate(100.0, 60.0, 0.5, DOWNTREND, strategy="Growth")
+    assert rule.signal == "SELL"
+    assert rule.score < 0
+
+
+def test_not_enough_data_is_wait():
+    rule = signal_rules.evaluate(100.0, 0, 0, {"rsi": 50.0})
+    assert rule.signal == "WAIT"
+    assert rule.factors.keys() <= {"momentum"}
+
+
+def test_risk_sets_the_buy_threshold():
+    # Price above SMA50 only (no SMA200) + reasonable P/E: a modest score
+    technicals = {"sma50": 95.0, "rsi": 55.0, "macd_hist": 0.2}
+    scores = {risk: signal_rules.evaluate(100.0, 20.0, 0, technicals, strategy="Technical", risk=risk) for risk in ("Low", "High")}
+    assert scores["Low"].score == scores["High"].score
+    assert scores["High"].signal == "BUY"
+    assert scores["Low"].signal == "HOLD"
+
+
+def test_strategy_weights_change_the_verdict():
+    # High yield, flat technicals: matters to Dividend, ignored by Technical
+    technicals = {"sma50": 99.0, "rsi": 50.0, "macd_hist": 0.1, "year_high": 140.0, "year_low": 98.0}
+    dividend = signal_rules.evaluate(100.0, 14.0, 6.0, technicals, strategy="Dividend")
+    technical = signal_rules.evaluate(100.0, 14.0, 6.0, technicals, strategy="Technical")
+    assert "yield" in dividend.factors and "yield" not in technical.factors
+    assert dividend.score > technical.score
+
+
+def test_accepts_technicals_objects_and_is_deterministic():
+    technicals = Technicals()
+    technicals.update(UPTREND)
+    first = signal_rules.evaluate(100.0, 12.0, 4.0, technicals)
+    assert first == signal_rules.evaluate(100.0, 12.0, 4.0, dict(UPTREND))
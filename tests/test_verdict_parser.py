@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import verdict_parser
+from verdict_parser import JSONFieldStream
+
+ANSWER = {"decision": "BUY", "explanation": "แนวโน้ม \"ขาขึ้น\"\nชัดเจน", "news_summary": "กำไรโต 10%"}
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, 10_000])
+def test_stream_yields_fields_in_order_for_any_chunking(size):
+    stream = JSONFieldStream()
+    seen = []
+    for chunk in _chunks(json.dumps(ANSWER, ensure_ascii=False), size):
+        seen.extend(stream.feed(chunk))
+    assert seen == list(ANSWER.items())
+    assert stream.complete and stream.error is None
+
+
+def test_field_is_reported_by_the_chunk_that_closes_it():
+    stream = JSONFieldStream()
+    assert stream.feed('{"decision": "SE') == []
+    assert stream.feed('LL", "explanation": "x') == [("decision", "SELL")]
+    assert stream.feed('"') == [("explanation", "x")]
+    assert not stream.complete
+
+
+def test_escaped_quote_split_across_chunks():
+    stream = JSONFieldStream()
+    stream.feed('{"explanation": "a\\')
+    assert stream.feed('"b"}') == [("explanation", 'a"b')]
+    assert stream.complete
+
+
+def test_fence_and_scalars():
+    stream = JSONFieldStream()
+    fields = stream.feed('```json\n{"n": 12.5, "ok": true, "none": null}\n```')
+    assert fields == [("n", 12.5), ("ok", True), ("none", None)]
+    assert stream.complete
+
+
+def test_nested_value_is_an_error():
+    stream = JSONFieldStream()
+    stream.feed('{"decision": {"x": 1}}')
+    assert stream.error and not stream.complete
+
+
+def test_parse_json_and_truncated_json():
+    verdict = verdict_parser.parse(json.dumps(ANSWER, ensure_ascii=False))
+    assert (verdict.signal, verdict.ok, verdict.complete) == ("BUY", True, True)
+
+    truncated = verdict_parser.parse('{"decision": "HOLD", "explanation": "รอ", "news_summary": "ข่าว')
+    assert (truncated.signal, truncated.reason, truncated.ok, truncated.complete) == ("HOLD", "รอ", True, False)
+
+
+def test_parse_pipe_format_and_garbage():
+    verdict = verdict_parser.parse("sell | ราคาหลุดแนวรับ | ข่าวลบ")
+    assert (verdict.signal, verdict.reason, verdict.news_summary, verdict.ok) == ("SELL", "ราคาหลุดแนวรับ", "ข่าวลบ", True)
+    assert verdict_parser.parse("no idea").ok is False
+
+
+def test_unknown_signal_is_not_ok():
+    assert verdict_parser.from_fields({"decision": "MAYBE", "explanation": "x"}).ok is False